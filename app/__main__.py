@@ -1,16 +1,349 @@
-from .main import Scraper, IconType, ContentType
-
-
-if __name__ == "__main__":
-  Scraper(
-      'https://thelivingvalley.earthbornegames.com',
-      [
-          '/docs/category/campaign-guides',
-          '/docs/rules_glossary',
-          '/docs/one_day_missions',
-          '/docs/category/updates',
-          '/docs/faq',
-      ],
-      IconType.ELEMENT,
-      ContentType.XHTML,
-  ).scrape()
+import argparse
+import pathlib
+
+from . import merkle, narrations, profiles, snapshots, sync
+from .main import ContentType, IconType, Scraper, new_session, scrape_sites
+
+
+def scraper(
+  content_types: list[ContentType],
+  threaded: bool,
+  mirror_assets: bool,
+  glossary_links: bool = False,
+  sync_delta: bool = False,
+  pipelined: bool = True,
+):
+  return Scraper(
+    profiles.DEFAULT_PROFILE,
+    IconType.ELEMENT,
+    content_types,
+    threaded,
+    mirror_assets,
+    glossary_links,
+    sync_delta,
+    pipelined,
+  )
+
+
+def add_format_argument(parser: argparse.ArgumentParser):
+  parser.add_argument(
+    '--format',
+    dest='formats',
+    action='append',
+    type=ContentType,
+    choices=list(ContentType),
+    help='content format to build, can be repeated (default: xhtml)',
+  )
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+  add_format_argument(parser)
+  parser.add_argument(
+    '--threaded',
+    action='store_true',
+    help='serialize and write each format on its own thread',
+  )
+  parser.add_argument(
+    '--glossary-links',
+    action='store_true',
+    help='link the first mention of each rules glossary term in a resource',
+  )
+  parser.add_argument(
+    '--delta',
+    dest='sync_delta',
+    action='store_true',
+    help='pack the files changed since the previous output into output/sync/delta.zip',
+  )
+
+
+def snapshot(args: argparse.Namespace):
+  store = snapshots.SnapshotStore(args.store)
+  if args.snapshot_command == 'save':
+    sources = [('output', pathlib.Path('output'), '*')]
+    if args.cache:
+      sources.append(('cache/docs', pathlib.Path('cache', 'docs'), '*.html'))
+    saved = store.save(sources, args.name)
+    print(f'saved snapshot {saved["name"]} with {len(saved["files"])} files')
+  elif args.snapshot_command == 'list':
+    snapshots.print_history(store.history())
+  elif args.snapshot_command == 'materialize':
+    store.materialize(args.name, args.path)
+  elif args.snapshot_command == 'remove':
+    store.remove(args.name)
+  elif args.snapshot_command == 'gc':
+    stats = store.gc()
+    print(
+      f'removed {stats.removed} blobs, freed {stats.freed:,} bytes, {stats.blobs} blobs in use'
+    )
+
+
+def sync_local(args: argparse.Namespace):
+  if args.sync_command == 'apply':
+    patch, applied = sync.apply_delta(args.local, args.delta, args.prefix)
+    print(f'{args.local}: applied {applied} changes, now at {patch["new"]}')
+  elif args.sync_command == 'verify':
+    mismatched = sync.verify(args.local, sync.read_manifest(args.manifest), args.prefix)
+    for path in mismatched:
+      print(path)
+    if mismatched:
+      raise SystemExit(1)
+
+
+def sites(args: argparse.Namespace):
+  selected = [
+    profile
+    for profile in profiles.read_profiles(args.profiles)
+    if not args.names or profile.name in args.names
+  ]
+  if unknown := set(args.names or ()) - {profile.name for profile in selected}:
+    raise SystemExit(f'{args.profiles}: no profile named {", ".join(sorted(unknown))}')
+
+  # One session for every site, so sites on the same host share its
+  # connections and its rate
+  session = new_session()
+  results = scrape_sites(
+    [
+      Scraper(
+        profile,
+        IconType.ELEMENT,
+        args.formats or [ContentType.XHTML],
+        args.threaded,
+        False,
+        args.glossary_links,
+        args.sync_delta,
+        args.pipelined,
+        session,
+      )
+      for profile in selected
+    ]
+  )
+  for result in results:
+    if result.build is None:
+      print(f'{result.profile.name}: failed after {result.wall:.2f}s: {result.error!r}')
+    else:
+      print(
+        f'{result.profile.name}: {len(result.build.pages)} pages in {result.wall:.2f}s'
+        f' to {result.profile.output_dir}'
+      )
+  if any(result.build is None for result in results):
+    raise SystemExit(1)
+
+
+def main():
+  parser = argparse.ArgumentParser(prog='app')
+  commands = parser.add_subparsers(dest='command')
+  scrape_parser = commands.add_parser(
+    'scrape', help='scrape the site into ./output/ (default)'
+  )
+  add_output_arguments(scrape_parser)
+  scrape_parser.add_argument(
+    '--assets',
+    dest='mirror_assets',
+    action='store_true',
+    help='mirror images into output/assets/ and point content at the local copies',
+  )
+  scrape_parser.add_argument(
+    '--sequential',
+    dest='pipelined',
+    action='store_false',
+    help='fetch every page, then parse them all, then write them all',
+  )
+  sites_parser = commands.add_parser(
+    'sites',
+    help='scrape every site in a profiles file at once, each into its own output',
+  )
+  sites_parser.add_argument('profiles', type=pathlib.Path)
+  sites_parser.add_argument(
+    '--site',
+    dest='names',
+    action='append',
+    help='profile to build, can be repeated (default: every profile)',
+  )
+  add_output_arguments(sites_parser)
+  sites_parser.add_argument(
+    '--sequential',
+    dest='pipelined',
+    action='store_false',
+    help='fetch every page, then parse them all, then write them all',
+  )
+  shard_parser = commands.add_parser(
+    'shard', help='parse part of the site into a shard file'
+  )
+  shard_parser.add_argument('path', type=pathlib.Path)
+  shard_parser.add_argument(
+    '--root',
+    dest='roots',
+    action='append',
+    help='page to start from, can be repeated (default: every root page)',
+  )
+  shard_parser.add_argument(
+    '--skip',
+    action='append',
+    default=[],
+    help='page to leave out along with its children, can be repeated',
+  )
+  merge_parser = commands.add_parser('merge', help='write ./output/ from shard files')
+  merge_parser.add_argument('paths', nargs='+', type=pathlib.Path)
+  add_output_arguments(merge_parser)
+  watch_parser = commands.add_parser(
+    'watch',
+    help='scrape, then rebuild the resources of pages changed in ./cache/',
+  )
+  add_output_arguments(watch_parser)
+  watch_parser.add_argument(
+    '--interval',
+    type=float,
+    default=0.5,
+    help='seconds between checks of ./cache/ (default: 0.5)',
+  )
+  stream_parser = commands.add_parser(
+    'stream',
+    help='write each resource and narration as a line of JSON as soon as it is built',
+  )
+  stream_parser.add_argument(
+    'path',
+    nargs='?',
+    default='-',
+    help='file or FIFO to write to (default: stdout)',
+  )
+  add_format_argument(stream_parser)
+  diff_parser = commands.add_parser(
+    'diff', help='list resources changed between two manifests'
+  )
+  diff_parser.add_argument('old', type=pathlib.Path)
+  diff_parser.add_argument('new', type=pathlib.Path)
+  narrations_parser = commands.add_parser(
+    'narrations',
+    help='list narrations added, changed or removed between two narrations.json files',
+  )
+  narrations_parser.add_argument('old', type=pathlib.Path)
+  narrations_parser.add_argument('new', type=pathlib.Path)
+  snapshot_parser = commands.add_parser(
+    'snapshot',
+    help='keep the history of ./output/ in a deduplicated snapshot store',
+  )
+  snapshot_parser.add_argument(
+    '--store',
+    type=pathlib.Path,
+    default=pathlib.Path('snapshots'),
+    help='snapshot store directory (default: ./snapshots/)',
+  )
+  snapshot_commands = snapshot_parser.add_subparsers(
+    dest='snapshot_command', required=True
+  )
+  save_parser = snapshot_commands.add_parser(
+    'save', help='record ./output/ as a new snapshot'
+  )
+  save_parser.add_argument(
+    '--name', help='snapshot name (default: the current UTC time)'
+  )
+  save_parser.add_argument(
+    '--cache',
+    action='store_true',
+    help='also record the pages in ./cache/',
+  )
+  snapshot_commands.add_parser(
+    'list', help='list snapshots with their size and new content'
+  )
+  materialize_parser = snapshot_commands.add_parser(
+    'materialize',
+    help='write the files of a snapshot to an empty directory',
+  )
+  materialize_parser.add_argument('name')
+  materialize_parser.add_argument('path', type=pathlib.Path)
+  remove_parser = snapshot_commands.add_parser(
+    'remove', help='forget a snapshot, run gc to free its content'
+  )
+  remove_parser.add_argument('name')
+  snapshot_commands.add_parser('gc', help='delete content no snapshot refers to')
+  sync_parser = commands.add_parser(
+    'sync', help='update or check a local copy of the output'
+  )
+  sync_commands = sync_parser.add_subparsers(dest='sync_command', required=True)
+  apply_parser = sync_commands.add_parser(
+    'apply', help='apply a delta.zip to a local copy'
+  )
+  apply_parser.add_argument('local', type=pathlib.Path)
+  apply_parser.add_argument('delta', type=pathlib.Path)
+  verify_parser = sync_commands.add_parser(
+    'verify', help='list the files of a local copy that differ from a manifest'
+  )
+  verify_parser.add_argument('local', type=pathlib.Path)
+  verify_parser.add_argument('manifest', type=pathlib.Path)
+  for command_parser in (apply_parser, verify_parser):
+    command_parser.add_argument(
+      '--prefix',
+      default='',
+      help='output directory the local copy is of, e.g. data/ (default: the whole output)',
+    )
+  parser.set_defaults(
+    formats=None,
+    threaded=False,
+    mirror_assets=False,
+    glossary_links=False,
+    sync_delta=False,
+    pipelined=True,
+  )
+  args = parser.parse_args()
+
+  if args.command == 'diff':
+    merkle.print_diff(
+      merkle.diff_manifests(
+        merkle.read_manifest(args.old),
+        merkle.read_manifest(args.new),
+      )
+    )
+  elif args.command == 'narrations':
+    narrations.print_feed(
+      narrations.diff_stores(
+        narrations.read_store(args.old),
+        narrations.read_store(args.new),
+      )
+    )
+  elif args.command == 'snapshot':
+    snapshot(args)
+  elif args.command == 'sync':
+    sync_local(args)
+  elif args.command == 'sites':
+    sites(args)
+  elif args.command == 'watch':
+    scraper(
+      args.formats or [ContentType.XHTML],
+      args.threaded,
+      False,
+      args.glossary_links,
+      args.sync_delta,
+      args.pipelined,
+    ).watch(args.interval)
+  elif args.command == 'stream':
+    if ContentType.BINARY in (args.formats or []):
+      parser.error("binary resources can't be streamed as lines of JSON")
+    scraper(
+      args.formats or [ContentType.XHTML],
+      False,
+      False,
+    ).stream(args.path)
+  elif args.command == 'shard':
+    app = scraper([], False, False)
+    app.shard(args.path, args.roots or app.page_urls, set(args.skip))
+  elif args.command == 'merge':
+    scraper(
+      args.formats or [ContentType.XHTML],
+      args.threaded,
+      False,
+      args.glossary_links,
+      args.sync_delta,
+    ).merge(args.paths)
+  else:
+    scraper(
+      args.formats or [ContentType.XHTML],
+      args.threaded,
+      args.mirror_assets,
+      args.glossary_links,
+      args.sync_delta,
+      args.pipelined,
+    ).scrape()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import mimetypes
+import os
+import pathlib
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+from urllib.parse import urldefrag, urlparse
+
+import requests
+
+
+class AssetEntry(TypedDict):
+  hash: str
+  ext: str
+  etag: str | None
+  last_modified: str | None
+
+
+def asset_name(entry: AssetEntry):
+  return f'{entry["hash"]}{entry["ext"]}'
+
+
+def guess_ext(url: str, content_type: str | None):
+  ext = pathlib.PurePosixPath(urlparse(url).path).suffix.lower()
+  if ext:
+    return ext
+
+  if content_type:
+    return mimetypes.guess_extension(content_type.split(';')[0].strip()) or ''
+
+  return ''
+
+
+class AssetMirror:
+  session: requests.Session
+  store_dir: pathlib.Path
+  index_path: pathlib.Path
+  workers: int
+
+  index: dict[str, AssetEntry]
+
+  def __init__(
+    self,
+    session: requests.Session,
+    store_dir: pathlib.Path,
+    workers: int = 8,
+  ):
+    self.session = session
+    self.store_dir = store_dir
+    self.index_path = store_dir / 'index.json'
+    self.workers = workers
+
+    self.index = {}
+    if self.index_path.exists():
+      self.index = json.loads(self.index_path.read_text('utf8'))
+
+  def blob(self, entry: AssetEntry):
+    return self.store_dir / asset_name(entry)
+
+  # The entry of a url that was mirrored before, if its blob is still there
+  def stored(self, url: str):
+    entry = self.index.get(url)
+    return entry if entry and self.blob(entry).exists() else None
+
+  def fetch(self, url: str) -> AssetEntry | None:
+    entry = self.stored(url)
+    headers = dict[str, str]()
+    if entry:
+      if entry['etag']:
+        headers['if-none-match'] = entry['etag']
+      if entry['last_modified']:
+        headers['if-modified-since'] = entry['last_modified']
+
+    try:
+      response = self.session.get(url, headers=headers, timeout=30)
+    except requests.RequestException as e:
+      print(f'failed to fetch {url}: {e}')
+      return entry
+
+    if response.status_code == 304 and entry:
+      return entry
+
+    if not response.ok:
+      print(f'failed to fetch {url}: {response.status_code}')
+      return entry
+
+    print(f'fetched {url}...')
+    entry = AssetEntry(
+      hash=hashlib.sha256(response.content).hexdigest(),
+      ext=guess_ext(url, response.headers.get('content-type')),
+      etag=response.headers.get('etag'),
+      last_modified=response.headers.get('last-modified'),
+    )
+    blob = self.blob(entry)
+    if not blob.exists():
+      blob.parent.mkdir(exist_ok=True, parents=True)
+      tmp = blob.with_name(f'{blob.name}.tmp')
+      tmp.write_bytes(response.content)
+      os.replace(tmp, blob)
+
+    return entry
+
+  def mirror(self, srcs: Iterable[str]):
+    urls = sorted({urldefrag(src).url for src in srcs})
+    with ThreadPoolExecutor(self.workers, thread_name_prefix='assets') as executor:
+      entries = dict(zip(urls, executor.map(self.fetch, urls)))
+
+    for url, entry in entries.items():
+      if entry:
+        self.index[url] = entry
+
+    self.store_dir.mkdir(exist_ok=True, parents=True)
+    tmp = self.index_path.with_name(f'{self.index_path.name}.tmp')
+    tmp.write_text(json.dumps(dict(sorted(self.index.items())), indent=2), 'utf8')
+    os.replace(tmp, self.index_path)
+
+    return {url: entry for url, entry in entries.items() if entry}
+
+  def local_src(self, src: str, entries: dict[str, AssetEntry]):
+    url, fragment = urldefrag(src)
+    entry = entries.get(url)
+    if not entry:
+      return src
+
+    path = f'assets/{asset_name(entry)}'
+    return f'{path}#{fragment}' if fragment else path
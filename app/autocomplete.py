@@ -0,0 +1,197 @@
+from collections.abc import Container, Generator, Iterable, Mapping, Sequence
+from typing import TypedDict
+
+from . import util
+
+AUTOCOMPLETE_VERSION = 1
+PREFIX_LENGTH = 2
+TOP_RESULTS = 10
+
+
+class Result(TypedDict):
+  id: str
+  anchor: str | None
+  title: str
+  parents: list[str]
+
+
+class Shard(TypedDict):
+  version: int
+  results: list[Result]
+  # [key, score, result], sorted by key then score
+  keys: list[tuple[str, int, int]]
+
+
+class AutocompleteIndex(TypedDict):
+  version: int
+  prefix_length: int
+  shards: list[str]
+  # Ranked results for every prefix shorter than a shard's
+  top: dict[str, list[Result]]
+
+
+# Keys are normalized like resource ids, a title can be found from the start
+# of any of its words and a match on a later word scores lower
+def title_keys(title: str) -> Generator[tuple[str, int]]:
+  words = util.to_id(title).split('_')
+  for i in range(len(words)):
+    if words[i]:
+      yield '_'.join(words[i:]), i
+
+
+class AutocompleteBuilder:
+  results: list[Result]
+  keys: list[tuple[str, int, int]]
+
+  def __init__(self):
+    self.results = []
+    self.keys = []
+
+  def add(self, result: Result, texts: list[str], score: int):
+    index = len(self.results)
+    self.results.append(result)
+    for text in texts:
+      for key, word in title_keys(text):
+        self.keys.append((key, score + word * 2, index))
+
+  def ranked(self, keys: list[tuple[str, int, int]]):
+    best = dict[int, int]()
+    for _, score, index in keys:
+      best[index] = min(score, best.get(index, score))
+
+    return sorted(
+      best,
+      key=lambda index: (
+        best[index],
+        len(self.results[index]['title']),
+        self.results[index]['title'],
+      ),
+    )
+
+  # Only the shards and top results of the prefixes given are built, the
+  # rest of the top results are taken from the previous index
+  def build(
+    self,
+    prefixes: Container[str] | None = None,
+    old_top: Mapping[str, list[Result]] | None = None,
+  ):
+    def rebuilt(prefix: str):
+      return prefixes is None or prefix in prefixes
+
+    names = {
+      key[:PREFIX_LENGTH] for key, _, _ in self.keys if len(key) >= PREFIX_LENGTH
+    }
+    shards = dict[str, list[tuple[str, int, int]]]()
+    top = dict[str, list[tuple[str, int, int]]]()
+    for entry in sorted(
+      entry
+      for entry in self.keys
+      if any(rebuilt(entry[0][:length]) for length in range(1, PREFIX_LENGTH + 1))
+    ):
+      key = entry[0]
+      if len(key) >= PREFIX_LENGTH and rebuilt(key[:PREFIX_LENGTH]):
+        shards.setdefault(key[:PREFIX_LENGTH], []).append(entry)
+      for length in range(1, min(len(key) + 1, PREFIX_LENGTH)):
+        if rebuilt(key[:length]):
+          top.setdefault(key[:length], []).append(entry)
+
+    top_results = {
+      prefix: results
+      for prefix, results in (old_top or {}).items()
+      if not rebuilt(prefix)
+    }
+    for prefix, keys in top.items():
+      top_results[prefix] = [self.results[i] for i in self.ranked(keys)[:TOP_RESULTS]]
+
+    index = AutocompleteIndex(
+      version=AUTOCOMPLETE_VERSION,
+      prefix_length=PREFIX_LENGTH,
+      shards=sorted(names),
+      top=dict(sorted(top_results.items())),
+    )
+    return index, {prefix: self.shard(keys) for prefix, keys in shards.items()}
+
+  # Each shard carries its own copy of the results it refers to, so a client
+  # only has to load one file per query
+  def shard(self, keys: list[tuple[str, int, int]]):
+    results = dict[int, int]()
+    for _, _, index in keys:
+      results.setdefault(index, len(results))
+
+    return Shard(
+      version=AUTOCOMPLETE_VERSION,
+      results=[self.results[index] for index in results],
+      keys=[(key, score, results[index]) for key, score, index in keys],
+    )
+
+
+def parent_titles(resource_ids: Mapping[str, str], resource_id: str):
+  parts = resource_id.split('/')
+  return [
+    resource_ids[parent_id]
+    for parent_id in ('/'.join(parts[:i]) for i in range(1, len(parts)))
+    if parent_id in resource_ids
+  ]
+
+
+# The prefixes whose shards and top results a change to these texts can
+# change
+def key_prefixes(texts: Iterable[str]):
+  return {
+    key[:length]
+    for text in texts
+    for key, _ in title_keys(text)
+    for length in range(1, min(len(key), PREFIX_LENGTH) + 1)
+  }
+
+
+# Pages are found by their title and the titles of their anchors, and entry
+# numbers from the catalog lead to the resource they point at
+def build_index(
+  pages: Iterable[tuple[util.Page, Iterable[util.Link]]],
+  resource_ids: Mapping[str, str],
+  entries: Mapping[str, Sequence[util.Occurrence]],
+  prefixes: Container[str] | None = None,
+  old_top: Mapping[str, list[Result]] | None = None,
+):
+  builder = AutocompleteBuilder()
+  for page, anchors in pages:
+    parents = parent_titles(resource_ids, page.resource_id)
+    builder.add(
+      Result(id=page.resource_id, anchor=None, title=page.title, parents=parents),
+      [page.title],
+      0,
+    )
+    for anchor in anchors:
+      builder.add(
+        Result(
+          id=page.resource_id,
+          anchor=anchor['id'],
+          title=anchor['title'],
+          parents=[*parents, page.title],
+        ),
+        [anchor['title']],
+        1,
+      )
+
+  # Unless the resource's title already starts with the number
+  targets = dict[tuple[str, str], None]()
+  for name, occurrences in entries.items():
+    for occurrence in occurrences:
+      target = occurrence.get('target')
+      if target and not util.to_id(resource_ids[target]).startswith(util.to_id(name)):
+        targets[target, name] = None
+
+  for target, name in targets:
+    builder.add(
+      Result(
+        id=target,
+        anchor=None,
+        title=resource_ids[target],
+        parents=parent_titles(resource_ids, target),
+      ),
+      [name],
+      0,
+    )
+
+  return builder.build(prefixes, old_top)
@@ -0,0 +1,348 @@
+import mmap
+import pathlib
+import struct
+from collections.abc import Generator, Iterator
+from contextlib import contextmanager
+from dataclasses import fields
+from typing import Any, NamedTuple
+
+from . import compact, tags, util
+
+MAGIC = b'LVTB'
+BINARY_VERSION = 1
+
+# Everything is little endian and every index is into the table it names,
+# -1 when there is none
+# magic, version, flags, id, title, url, then the number of nodes, anchors,
+# narrations, links, lookup links and strings
+HEADER = struct.Struct('<4sHH3i6I')
+# type, two attributes, first child, next sibling
+NODE = struct.Struct('<B3x4i')
+# id, title, node
+ANCHOR = struct.Struct('<3i')
+# id, node
+NARRATION = struct.Struct('<2i')
+# id, title
+LINK = struct.Struct('<2i')
+# offset into the heap, length in bytes
+STRING = struct.Struct('<2I')
+
+HAS_CONTENT = 1
+
+TYPES = list(compact.TAG_CLASSES)
+TYPE_CODES = {tag_type: code for code, tag_type in enumerate(TYPES)}
+ATTRIBUTES = {
+  tag_type: [field.name for field in fields(cls) if field.name not in ('type', 'items')]
+  for tag_type, cls in compact.TAG_CLASSES.items()
+}
+ITEMS_TYPES = {
+  tag_type
+  for tag_type, cls in compact.TAG_CLASSES.items()
+  if issubclass(cls, tags.TagWithItems)
+}
+MAX_ATTRIBUTES = 2
+assert all(len(names) <= MAX_ATTRIBUTES for names in ATTRIBUTES.values())
+
+
+class Node(NamedTuple):
+  item_index: int
+  type: str
+  attributes: tuple[int, int]
+  first_child: int
+  next_sibling: int
+
+
+class Anchor(NamedTuple):
+  id: str
+  title: str
+  node: int
+
+
+class BinaryEncoder:
+  strings: dict[str, int]
+  nodes: list[list[int]]
+  # Title and blockquote ids to their node
+  titles: dict[str, int]
+  narrations: list[tuple[int, int]]
+
+  def __init__(self):
+    self.strings = {}
+    self.nodes = []
+    self.titles = {}
+    self.narrations = []
+
+  def string(self, value: str | None):
+    if value is None:
+      return -1
+    return self.strings.setdefault(value, len(self.strings))
+
+  def add_node(self, tag: tags.Tag[Any]):
+    index = len(self.nodes)
+    attributes = [self.string(getattr(tag, name)) for name in ATTRIBUTES[tag.type]]
+    attributes += [-1] * (MAX_ATTRIBUTES - len(attributes))
+    self.nodes.append([TYPE_CODES[tag.type], *attributes, -1, -1])
+    if isinstance(tag, tags.TagTitle) and tag.id:
+      self.titles.setdefault(f'#{tag.id}', index)
+    elif isinstance(tag, tags.TagBlockquote) and tag.id:
+      self.narrations.append((self.string(tag.id), index))
+    return index
+
+  # Nodes are numbered in document order, so a subtree is one run of nodes
+  def add_items(self, items: list[tags.Tag[Any]]):
+    # [items, parent, previous sibling]
+    stack: list[list[Any]] = [[iter(items), -1, -1]]
+    while stack:
+      frame = stack[-1]
+      item = next(frame[0], None)
+      if item is None:
+        stack.pop()
+        continue
+
+      index = self.add_node(item)
+      if frame[2] >= 0:
+        self.nodes[frame[2]][4] = index
+      elif frame[1] >= 0:
+        self.nodes[frame[1]][3] = index
+      frame[2] = index
+      if isinstance(item, tags.TagWithItems):
+        stack.append([iter(item.items), index, -1])
+
+  def links(self, links: list[util.Link]):
+    return [(self.string(link['id']), self.string(link['title'])) for link in links]
+
+  def encode(self, resource: util.Resource, content: list[tags.Tag[Any]] | None):
+    header = (
+      self.string(resource['id']),
+      self.string(resource['title']),
+      self.string(resource['url']),
+    )
+    if content is not None:
+      self.add_items(content)
+    anchors = [
+      (
+        self.string(anchor['id']),
+        self.string(anchor['title']),
+        self.titles.get(anchor['id'], -1),
+      )
+      for anchor in resource['anchors']
+    ]
+    links = self.links(resource['links'])
+    lookup = self.links(resource['lookup'])
+
+    heap = bytearray()
+    strings = bytearray()
+    for value in self.strings:
+      data = value.encode('utf8')
+      strings += STRING.pack(len(heap), len(data))
+      heap += data
+
+    return b''.join(
+      (
+        HEADER.pack(
+          MAGIC,
+          BINARY_VERSION,
+          HAS_CONTENT if content is not None else 0,
+          *header,
+          len(self.nodes),
+          len(anchors),
+          len(self.narrations),
+          len(links),
+          len(lookup),
+          len(self.strings),
+        ),
+        b''.join(NODE.pack(*node) for node in self.nodes),
+        b''.join(ANCHOR.pack(*anchor) for anchor in anchors),
+        b''.join(NARRATION.pack(*narration) for narration in self.narrations),
+        b''.join(LINK.pack(*link) for link in links),
+        b''.join(LINK.pack(*link) for link in lookup),
+        bytes(strings),
+        bytes(heap),
+      )
+    )
+
+
+def encode_resource(resource: util.Resource, content: list[tags.Tag[Any]] | None):
+  return BinaryEncoder().encode(resource, content)
+
+
+# Reads single nodes and strings straight out of the buffer, nothing is
+# decoded until it's asked for
+class BinaryResource:
+  data: Any
+  flags: int
+  header: tuple[int, int, int]
+
+  def __init__(self, data: bytes | mmap.mmap):
+    magic, version, self.flags, *values = HEADER.unpack_from(data)
+    if magic != MAGIC:
+      raise ValueError('not a binary resource')
+    if version != BINARY_VERSION:
+      raise ValueError(f'unsupported binary resource version {version}')
+
+    self.data = data
+    resource_id, title, url, nodes, anchors, narrations, links, lookup, strings = values
+    self.header = (resource_id, title, url)
+    self.node_count = nodes
+    self.nodes_offset = HEADER.size
+    self.anchors_offset = self.nodes_offset + nodes * NODE.size
+    self.anchor_count = anchors
+    self.narrations_offset = self.anchors_offset + anchors * ANCHOR.size
+    self.narration_count = narrations
+    self.links_offset = self.narrations_offset + narrations * NARRATION.size
+    self.link_count = links
+    self.lookup_offset = self.links_offset + links * LINK.size
+    self.lookup_count = lookup
+    self.strings_offset = self.lookup_offset + lookup * LINK.size
+    self.heap_offset = self.strings_offset + strings * STRING.size
+
+  def string(self, index: int) -> str | None:
+    if index < 0:
+      return None
+
+    offset, length = STRING.unpack_from(
+      self.data, self.strings_offset + index * STRING.size
+    )
+    start = self.heap_offset + offset
+    return str(self.data[start : start + length], 'utf8')
+
+  @property
+  def id(self):
+    return self.string(self.header[0]) or ''
+
+  @property
+  def title(self):
+    return self.string(self.header[1]) or ''
+
+  @property
+  def url(self):
+    return self.string(self.header[2]) or ''
+
+  @property
+  def has_content(self):
+    return bool(self.flags & HAS_CONTENT)
+
+  def node(self, index: int):
+    code, first, second, first_child, next_sibling = NODE.unpack_from(
+      self.data,
+      self.nodes_offset + index * NODE.size,
+    )
+    return Node(index, TYPES[code], (first, second), first_child, next_sibling)
+
+  def attributes(self, node: Node):
+    return {
+      name: self.string(value)
+      for name, value in zip(ATTRIBUTES[node.type], node.attributes)
+    }
+
+  def siblings(self, index: int) -> Generator[Node]:
+    while index >= 0:
+      node = self.node(index)
+      yield node
+      index = node.next_sibling
+
+  def roots(self):
+    return self.siblings(0 if self.node_count else -1)
+
+  def children(self, node: Node):
+    return self.siblings(node.first_child)
+
+  def descendants(self, node: Node) -> Iterator[Node]:
+    stack = [node.first_child]
+    while stack:
+      index = stack.pop()
+      if index < 0:
+        continue
+
+      child = self.node(index)
+      yield child
+      stack.append(child.next_sibling)
+      stack.append(child.first_child)
+
+  def text(self, node: Node):
+    if node.type == 'text':
+      return self.string(node.attributes[0]) or ''
+
+    return ''.join(
+      self.string(child.attributes[0]) or ''
+      for child in self.descendants(node)
+      if child.type == 'text'
+    )
+
+  def anchors(self) -> Generator[Anchor]:
+    for i in range(self.anchor_count):
+      anchor_id, title, node = ANCHOR.unpack_from(
+        self.data, self.anchors_offset + i * ANCHOR.size
+      )
+      yield Anchor(self.string(anchor_id) or '', self.string(title) or '', node)
+
+  def anchor(self, anchor_id: str):
+    return next((anchor for anchor in self.anchors() if anchor.id == anchor_id), None)
+
+  # The nodes of an anchor's section, up to the next title with an id at
+  # the same level
+  def section(self, anchor_id: str) -> Generator[Node]:
+    anchor = self.anchor(anchor_id)
+    if anchor is None or anchor.node < 0:
+      return
+
+    for node in self.siblings(anchor.node):
+      if (
+        node.item_index != anchor.node
+        and node.type in ('h1', 'h2', 'choice', 'branch', 'imgfooter')
+        and self.attributes(node)['id']
+      ):
+        return
+      yield node
+
+  def narrations(self) -> Generator[tuple[str, Node]]:
+    for i in range(self.narration_count):
+      narration_id, node = NARRATION.unpack_from(
+        self.data, self.narrations_offset + i * NARRATION.size
+      )
+      yield self.string(narration_id) or '', self.node(node)
+
+  def narration(self, narration_id: str):
+    return next(
+      (node for name, node in self.narrations() if name == narration_id), None
+    )
+
+  def read_links(self, offset: int, count: int):
+    return [
+      util.Link(id=self.string(link_id) or '', title=self.string(title) or '')
+      for link_id, title in (
+        LINK.unpack_from(self.data, offset + i * LINK.size) for i in range(count)
+      )
+    ]
+
+  def links(self):
+    return self.read_links(self.links_offset, self.link_count)
+
+  def lookup(self):
+    return self.read_links(self.lookup_offset, self.lookup_count)
+
+  # Builds the tags of a subtree, children before their parents so deep
+  # trees don't need recursion
+  def tag(self, node: Node) -> tags.Tag[Any]:
+    order = [node, *self.descendants(node)]
+    built = dict[int, tags.Tag[Any]]()
+    for current in reversed(order):
+      kwargs: dict[str, Any] = self.attributes(current)
+      if current.type in ITEMS_TYPES:
+        kwargs['items'] = [
+          built.pop(child.item_index) for child in self.children(current)
+        ]
+      built[current.item_index] = compact.TAG_CLASSES[current.type](
+        current.type, **kwargs
+      )
+    return built[node.item_index]
+
+  def content(self):
+    if not self.has_content:
+      return None
+    return [self.tag(node) for node in self.roots()]
+
+
+@contextmanager
+def open_resource(path: pathlib.Path):
+  with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+    yield BinaryResource(data)
@@ -0,0 +1,49 @@
+import json
+import pathlib
+from collections.abc import Iterable
+from typing import Any, BinaryIO, NotRequired, TypedDict
+
+BUNDLE_VERSION = 1
+
+
+class BundleIndex(TypedDict):
+  version: int
+  entries: dict[str, tuple[int, int]]
+  # Whatever the entries of a format share, like the compact string table
+  tables: NotRequired[Any]
+
+
+# The first line is a JSON offset table, each entry is [offset, length] in
+# bytes from the start of the line after it. Entries are stored exactly as
+# the resource files are written, or need no more than the tables in the
+# index, so a client can slice one out and parse it on its own.
+def build_bundle(entries: Iterable[tuple[str, bytes]], tables: Any = None):
+  index = BundleIndex(version=BUNDLE_VERSION, entries={})
+  body = list[bytes]()
+  offset = 0
+  for resource_id, data in entries:
+    index['entries'][resource_id] = (offset, len(data))
+    body.append(data)
+    offset += len(data)
+  if tables is not None:
+    index['tables'] = tables
+
+  header = json.dumps(index, separators=(',', ':')).encode('utf8')
+  return b''.join((header, b'\n', *body))
+
+
+def read_index(f: BinaryIO) -> tuple[BundleIndex, int]:
+  header = f.readline()
+  index: BundleIndex = json.loads(header)
+  if index.get('version') != BUNDLE_VERSION:
+    raise ValueError(f'unsupported bundle version {index.get("version")}')
+
+  return index, len(header)
+
+
+def read_entry(path: pathlib.Path, resource_id: str) -> bytes:
+  with path.open('rb') as f:
+    index, start = read_index(f)
+    offset, length = index['entries'][resource_id]
+    f.seek(start + offset)
+    return f.read(length)
@@ -0,0 +1,108 @@
+import re
+from collections.abc import Callable, Container, Generator, Iterable, Mapping
+from typing import Any
+
+from . import tags, util
+
+KINDS: dict[type[tags.Tag[Any]], str] = {
+  tags.TagMission: 'missions',
+  tags.TagEvent: 'events',
+  tags.TagEntry: 'entries',
+  tags.TagReward: 'rewards',
+}
+
+ENTRY_TITLE = re.compile(r'^(\d+\.\d+\w?)\b')
+
+
+def text(item: tags.Tag[Any]):
+  parts = list[str]()
+  stack = [item]
+  while stack:
+    item = stack.pop()
+    if isinstance(item, tags.TagText):
+      parts.append(item.text)
+    elif isinstance(item, tags.TagWithItems):
+      stack.extend(reversed(item.items))
+  return ''.join(parts)
+
+
+# Every entity with the anchor of the section it is in and the link around
+# it, a title sets the anchor for the rest of its siblings
+def find_entities(items: list[tags.Tag[Any]]) -> Generator[util.Entity]:
+  # [items, anchor, href]
+  stack: list[list[Any]] = [[iter(items), None, None]]
+  while stack:
+    frame = stack[-1]
+    item = next(frame[0], None)
+    if item is None:
+      stack.pop()
+      continue
+
+    if isinstance(item, tags.TagTitle):
+      frame[1] = item.id
+    if kind := KINDS.get(type(item)):
+      yield util.Entity(kind, text(item), frame[1], frame[2])
+    elif isinstance(item, tags.TagWithItems):
+      href = item.href if isinstance(item, tags.TagLink) else frame[2]
+      stack.append([iter(item.items), frame[1], href])
+
+
+# Entry numbers are only unique within a campaign, so they are resolved
+# against the titles of their own lookup group
+def entry_ids(
+  pages: Iterable[util.Page], get_lookup_group: Callable[[str], str | None]
+):
+  ids = dict[tuple[str | None, str], str]()
+  for page in pages:
+    if match := ENTRY_TITLE.match(page.title):
+      ids.setdefault((get_lookup_group(page.resource_id), match[1]), page.resource_id)
+  return ids
+
+
+# One occurrence per entity, with every section of the page it turns up in
+def page_postings(
+  page: util.Page,
+  entities: Iterable[util.Entity],
+  resource_ids: Container[str],
+  entry_ids: Mapping[tuple[str | None, str], str],
+  lookup_group: str | None,
+):
+  postings = dict[tuple[str, str], util.Posting]()
+  entries = dict[str, util.EntryOccurrence]()
+  for kind, name, anchor, href in entities:
+    posting = postings.get((kind, name))
+    if not posting:
+      if kind == 'entries':
+        occurrence = entries[name] = util.EntryOccurrence(
+          id=page.resource_id, anchors=[], count=0, target=None
+        )
+      else:
+        occurrence = util.Occurrence(id=page.resource_id, anchors=[], count=0)
+      posting = postings[kind, name] = util.Posting(kind, name, occurrence)
+
+    occurrence = posting.occurrence
+    occurrence['count'] += 1
+    if (anchor := f'#{anchor}' if anchor else None) not in occurrence['anchors']:
+      occurrence['anchors'].append(anchor)
+
+    entry = entries.get(name) if kind == 'entries' else None
+    if entry and not entry['target']:
+      # A link names the entry's resource, otherwise go by its title
+      target = href.partition('#')[0] if href else None
+      if target is None or target not in resource_ids:
+        target = entry_ids.get((lookup_group, name))
+      entry['target'] = target
+
+  return list(postings.values())
+
+
+def merge_postings(pages: Iterable[Iterable[util.Posting]]):
+  catalog = {kind: dict[str, list[util.Occurrence]]() for kind in KINDS.values()}
+  for postings in pages:
+    for kind, name, occurrence in postings:
+      catalog[kind].setdefault(name, []).append(occurrence)
+
+  return {
+    kind: dict(sorted(names.items(), key=lambda x: x[0]))
+    for kind, names in catalog.items()
+  }
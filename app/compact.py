@@ -0,0 +1,131 @@
+from collections.abc import Iterable
+from dataclasses import fields
+from typing import Any, TypedDict, get_args
+
+from . import tags
+
+COMPACT_VERSION = 1
+
+TAG_CLASSES: dict[str, type[tags.Tag[Any]]] = {
+  tag_type: cls
+  for cls, literal in (
+    (tags.EmptyTag, tags.EmptyType),
+    (tags.TagText, tags.TextType),
+    (tags.TagTitle, tags.TitleType),
+    (tags.TagFormattedText, tags.FormattedTextType),
+    (tags.TagBlockquote, tags.BlockquoteType),
+    (tags.TagIcon, tags.IconType),
+    (tags.TagHighlight, tags.HighlightType),
+    (tags.TagLink, tags.LinkType),
+    (tags.TagImg, tags.ImgType),
+    (tags.TagMission, tags.MissionType),
+    (tags.TagEvent, tags.EventType),
+    (tags.TagReward, tags.RewardType),
+    (tags.TagEntry, tags.EntryType),
+  )
+  for tag_type in get_args(literal)
+}
+
+
+# Each node is `[type, value, ...]`. `types` lists the tag type and the names
+# of the fields that follow for every type index, so a null field is left out
+# by giving the node a type without it. Field values are indexes into
+# `strings`, except `items`, which is a list of nodes.
+class CompactTables(TypedDict):
+  version: int
+  types: list[list[str]]
+  strings: list[str]
+
+
+class CompactContent(CompactTables):
+  nodes: list[list[Any]]
+
+
+# Content in a bundle, which shares one set of tables between its resources
+class CompactNodes(TypedDict):
+  nodes: list[list[Any]]
+
+
+class ContentEncoder:
+  types: dict[tuple[str, ...], int]
+  strings: dict[str, int]
+
+  def __init__(self):
+    self.types = {}
+    self.strings = {}
+
+  def string(self, value: str):
+    return self.strings.setdefault(value, len(self.strings))
+
+  def node(self, tag: tags.Tag[Any]) -> list[Any]:
+    names = [tag.type]
+    values = list[Any]()
+    for field in fields(tag):
+      value = getattr(tag, field.name)
+      if field.name == 'type' or value is None:
+        continue
+
+      names.append(field.name)
+      values.append(
+        [self.node(item) for item in value]
+        if field.name == 'items'
+        else self.string(value)
+      )
+
+    return [self.types.setdefault(tuple(names), len(self.types)), *values]
+
+  def nodes(self, items: list[tags.Tag[Any]]):
+    return [self.node(item) for item in items]
+
+  def tables(self):
+    return CompactTables(
+      version=COMPACT_VERSION,
+      types=[list(names) for names in self.types],
+      strings=list(self.strings),
+    )
+
+  def encode(self, items: list[tags.Tag[Any]]):
+    nodes = self.nodes(items)
+    return CompactContent(**self.tables(), nodes=nodes)
+
+
+def encode_content(items: list[tags.Tag[Any]]):
+  return ContentEncoder().encode(items)
+
+
+# Encodes the content of every resource of a bundle again against one set of
+# tables, so names and colours used all over a campaign are only stored once
+def share_tables(contents: Iterable[CompactContent | None]):
+  encoder = ContentEncoder()
+  nodes = [
+    CompactNodes(nodes=encoder.nodes(decode_content(content))) if content else None
+    for content in contents
+  ]
+  return encoder.tables(), nodes
+
+
+def decode_nodes(tables: CompactTables, nodes: list[list[Any]]) -> list[tags.Tag[Any]]:
+  if tables.get('version') != COMPACT_VERSION:
+    raise ValueError(f'unsupported compact content version {tables.get("version")}')
+
+  types = tables['types']
+  strings = tables['strings']
+  none = {
+    tag_type: {field.name: None for field in fields(cls) if field.name != 'type'}
+    for tag_type, cls in TAG_CLASSES.items()
+  }
+
+  def node(value: list[Any]) -> tags.Tag[Any]:
+    tag_type, *names = types[value[0]]
+    kwargs: dict[str, Any] = dict(none[tag_type])
+    for name, item in zip(names, value[1:]):
+      kwargs[name] = (
+        [node(subitem) for subitem in item] if name == 'items' else strings[item]
+      )
+    return TAG_CLASSES[tag_type](tag_type, **kwargs)
+
+  return [node(value) for value in nodes]
+
+
+def decode_content(content: CompactContent):
+  return decode_nodes(content, content['nodes'])
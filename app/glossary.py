@@ -0,0 +1,213 @@
+import re
+from collections import deque
+from collections.abc import Generator, Iterable, Sequence
+from typing import Any, TypeGuard
+from urllib.parse import urlparse
+
+from . import tags, util
+
+GLOSSARY_GROUP = 'rules_glossary'
+# Words and single punctuation marks, whitespace only separates them
+TOKEN = re.compile(r'\w+|[^\w\s]')
+# "Ambush (Keyword)" and "Powered [X]" are mentioned without the qualifier
+QUALIFIER = re.compile(r'\s*(\([^)]*\)|\[[^\]]*\])\s*$')
+MIN_TERM_LENGTH = 3
+
+# Existing links, entries and titles are left as they are, and so are the
+# names the annotation modifiers have already tagged
+SKIP_TAGS = {
+  tags.TagLink,
+  tags.TagTitle,
+  tags.TagEntry,
+  tags.TagMission,
+  tags.TagEvent,
+  tags.TagReward,
+}
+# Every node of every page is visited, and isinstance checks against the
+# TagWithItems ABC are slow, so the concrete classes are looked up instead
+ITEMS_TAGS: set[type[tags.Tag[Any]]] = {
+  cls
+  for cls in vars(tags).values()
+  if isinstance(cls, type)
+  and issubclass(cls, tags.TagWithItems)
+  and cls is not tags.TagWithItems
+}
+LINK_TAGS = ITEMS_TAGS - SKIP_TAGS
+
+
+def has_items(item: tags.Tag[Any]) -> TypeGuard[tags.TagWithItems[Any]]:
+  return type(item) in ITEMS_TAGS
+
+
+def can_link(item: tags.Tag[Any]) -> TypeGuard[tags.TagWithItems[Any]]:
+  return type(item) in LINK_TAGS
+
+
+def term_tokens(text: str):
+  return tuple(token.lower() for token in TOKEN.findall(text))
+
+
+def glossary_terms(resource_ids: dict[str, str]):
+  terms = dict[tuple[str, ...], str]()
+  for resource_id, title in resource_ids.items():
+    # The letter pages in between are too short to be terms
+    if not resource_id.startswith(f'{GLOSSARY_GROUP}/'):
+      continue
+
+    term = QUALIFIER.sub('', title)
+    if len(term) >= MIN_TERM_LENGTH:
+      terms.setdefault(term_tokens(term), resource_id)
+  return terms
+
+
+# An Aho-Corasick automaton over word tokens rather than characters, text is
+# tokenized once by the regex engine and every token is one transition, so a
+# search is linear in the length of the text however many terms there are
+class Automaton:
+  goto: list[dict[str, int]]
+  fail: list[int]
+  # The length of the term that ends at each state, or 0
+  lengths: list[int]
+  # The next state along the fail links that ends a term
+  outputs: list[int]
+
+  def __init__(self, patterns: Iterable[tuple[str, ...]]):
+    self.goto = [{}]
+    self.lengths = [0]
+    for pattern in patterns:
+      state = 0
+      for token in pattern:
+        next_state = self.goto[state].get(token)
+        if next_state is None:
+          next_state = len(self.goto)
+          self.goto[state][token] = next_state
+          self.goto.append({})
+          self.lengths.append(0)
+        state = next_state
+      self.lengths[state] = len(pattern)
+
+    self.fail = [0] * len(self.goto)
+    self.outputs = [0] * len(self.goto)
+    queue = deque(self.goto[0].values())
+    while queue:
+      state = queue.popleft()
+      for token, next_state in self.goto[state].items():
+        queue.append(next_state)
+        fail = self.fail[state]
+        while fail and token not in self.goto[fail]:
+          fail = self.fail[fail]
+        fail = self.goto[fail].get(token, 0)
+        self.fail[next_state] = fail
+        self.outputs[next_state] = fail if self.lengths[fail] else self.outputs[fail]
+
+  def step(self, state: int, token: str):
+    while state and token not in self.goto[state]:
+      state = self.fail[state]
+    return self.goto[state].get(token, 0)
+
+  # Yields the first and last token index of every match, longest first for
+  # matches that end on the same token
+  def search(self, tokens: Sequence[str]) -> Generator[tuple[int, int, int]]:
+    state = 0
+    for i, token in enumerate(tokens):
+      state = self.step(state, token)
+      match = state if self.lengths[state] else self.outputs[state]
+      while match:
+        yield i - self.lengths[match] + 1, i, match
+        match = self.outputs[match]
+
+
+def find_linked(items: Sequence[tags.Tag[Any]]):
+  linked = set[str]()
+  stack = list(items)
+  while stack:
+    item = stack.pop()
+    if type(item) is tags.TagLink:
+      linked.add(urlparse(item.href).path)
+    if has_items(item):
+      stack.extend(item.items)
+  return linked
+
+
+class GlossaryLinker:
+  terms: dict[tuple[str, ...], str]
+  automaton: Automaton
+  # The resource of the term that ends at each final state of the automaton
+  targets: dict[int, str]
+  # Tokens a term can start with, most text has none of them
+  first_tokens: frozenset[str]
+
+  def __init__(self, terms: dict[tuple[str, ...], str]):
+    self.terms = terms
+    self.automaton = Automaton(terms)
+    self.targets = {}
+    for term, resource_id in terms.items():
+      state = 0
+      for token in term:
+        state = self.automaton.goto[state][token]
+      self.targets[state] = resource_id
+    self.first_tokens = frozenset(self.automaton.goto[0])
+
+  # Only the first mention of a term in a resource is linked, and not at all
+  # if the resource already links to it or is the term's own page
+  def link(self, resource_id: str, items: list[tags.Tag[Any]]):
+    linked = find_linked(items)
+    linked.add(resource_id)
+    return self.link_items(items, linked)
+
+  def link_items(
+    self, items: list[tags.Tag[Any]], linked: set[str]
+  ) -> list[tags.Tag[Any]]:
+    result = list[tags.Tag[Any]]()
+    for item in items:
+      if type(item) is tags.TagText:
+        result.extend(self.link_text(item, linked))
+      elif can_link(item):
+        result.append(util.replace_items(item, self.link_items(item.items, linked)))
+      else:
+        result.append(item)
+    return result
+
+  def link_text(self, item: tags.TagText, linked: set[str]) -> list[tags.Tag[Any]]:
+    if self.first_tokens.isdisjoint(TOKEN.findall(item.text.lower())):
+      return [item]
+
+    matches = list(TOKEN.finditer(item.text))
+    tokens = [match.group().lower() for match in matches]
+    # Leftmost longest, a match can't start inside the previous one
+    found = sorted(
+      (start, -end, state) for start, end, state in self.automaton.search(tokens)
+    )
+
+    result = list[tags.Tag[Any]]()
+    position = 0
+    last = -1
+    for start, end, state in found:
+      end = -end
+      if start <= last:
+        continue
+
+      # A term that is already linked still hides the shorter terms inside it
+      last = end
+      resource_id = self.targets[state]
+      if resource_id in linked:
+        continue
+
+      linked.add(resource_id)
+      text_start = matches[start].start()
+      text_end = matches[end].end()
+      if text_start > position:
+        result.append(tags.TagText('text', item.text[position:text_start]))
+      result.append(
+        tags.TagLink(
+          'a', resource_id, [tags.TagText('text', item.text[text_start:text_end])]
+        )
+      )
+      position = text_end
+
+    if not result:
+      return [item]
+
+    if position < len(item.text):
+      result.append(tags.TagText('text', item.text[position:]))
+    return result
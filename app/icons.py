@@ -0,0 +1,132 @@
+import pathlib
+import re
+from collections.abc import Generator, Iterable
+from typing import TypedDict
+
+from lxml import etree
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+SVG_PARSER = etree.XMLParser(
+  remove_blank_text=True, remove_comments=True, resolve_entities=False
+)
+
+# Elements that never affect how an icon renders
+SKIP_ELEMENTS = {'title', 'desc', 'metadata'}
+
+PATH_TOKEN = re.compile(
+  r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+)
+
+
+class IconSymbol(TypedDict):
+  id: str
+  viewBox: str
+  width: int | float
+  height: int | float
+
+
+def symbol_id(name: str):
+  return f'icon-{name}'
+
+
+def parse_number(value: str):
+  number = float(value)
+  return int(number) if number.is_integer() else number
+
+
+def minify_number(token: str):
+  if 'e' in token or 'E' in token:
+    return token
+  if '.' in token:
+    token = token.rstrip('0').rstrip('.')
+  sign = '-' if token.startswith('-') else ''
+  token = token.lstrip('+-')
+  if token.startswith('0.'):
+    token = token[1:]
+  return f'{sign}{token or "0"}'
+
+
+def minify_path(d: str):
+  # Arc flags may be written without separators, which the tokenizer can't tell
+  # apart from numbers, so only collapse whitespace in paths with arcs
+  if re.search(r'[Aa]', d):
+    return ' '.join(d.split())
+
+  result = list[str]()
+  previous = ''
+  for token in PATH_TOKEN.findall(d):
+    if not token[0].isalpha():
+      token = minify_number(token)
+      if (
+        previous
+        and not previous[-1].isalpha()
+        and not token.startswith('-')
+        and not (token.startswith('.') and '.' in previous)
+      ):
+        result.append(' ')
+    result.append(token)
+    previous = token
+  return ''.join(result)
+
+
+def local_name(e: etree._Element):
+  return etree.QName(e).localname
+
+
+def minify_element(e: etree._Element) -> etree._Element:
+  element = etree.Element(etree.QName(SVG_NS, local_name(e)))
+  for key, value in e.attrib.items():
+    value = ' '.join(value.split())
+    if key == 'd':
+      value = minify_path(value)
+    element.set(key, value)
+  for child in e:
+    if isinstance(child.tag, str) and local_name(child) not in SKIP_ELEMENTS:
+      element.append(minify_element(child))
+  return element
+
+
+def view_box(svg: etree._Element):
+  value = svg.get('viewBox')
+  if value:
+    return ' '.join(value.replace(',', ' ').split())
+  return f'0 0 {svg.get("width", "0").removesuffix("px")} {svg.get("height", "0").removesuffix("px")}'
+
+
+def read_icons(icons_dir: pathlib.Path) -> Generator[tuple[str, etree._Element]]:
+  for path in sorted(icons_dir.glob('*.svg')):
+    yield path.stem, etree.parse(str(path), SVG_PARSER).getroot()
+
+
+def build_sprite(icons: Iterable[tuple[str, etree._Element]]):
+  sprite = etree.Element(etree.QName(SVG_NS, 'svg'), nsmap={None: SVG_NS})
+  symbols = dict[str, IconSymbol]()
+  for name, svg in icons:
+    box = view_box(svg)
+    _, _, width, height = (parse_number(value) for value in box.split())
+    symbol = etree.SubElement(sprite, etree.QName(SVG_NS, 'symbol'))
+    symbol.set('id', symbol_id(name))
+    symbol.set('viewBox', box)
+    # Presentation attributes on the root, such as fill, still apply
+    for key, value in svg.attrib.items():
+      if (
+        key not in ('viewBox', 'width', 'height', 'version', 'x', 'y')
+        and '}' not in key
+      ):
+        symbol.set(key, value)
+    for child in svg:
+      if isinstance(child.tag, str) and local_name(child) not in SKIP_ELEMENTS:
+        symbol.append(minify_element(child))
+
+    symbols[name] = IconSymbol(
+      id=symbol_id(name),
+      viewBox=box,
+      width=width,
+      height=height,
+    )
+
+  return etree.tostring(sprite, encoding='unicode'), symbols
+
+
+def missing_symbols(symbols: dict[str, IconSymbol], names: Iterable[str | None]):
+  return sorted({name for name in names if name and name not in symbols})
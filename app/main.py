@@ -1,19 +1,48 @@
+import asyncio
 import enum
 import html
+import json
 import pathlib
 import re
-from collections.abc import Generator, Iterable, Sequence
-from dataclasses import asdict, replace
-from shutil import rmtree
-from typing import Any
-from urllib.parse import urljoin
+import sys
+import time
+from collections import deque
+from collections.abc import Container, Generator, Iterable, Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, redirect_stdout
+from dataclasses import asdict, fields, replace
+from typing import Any, NamedTuple
+from urllib.parse import urljoin, urlparse
 
 import requests
 from lxml.html import HtmlElement
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
 
-from . import constants, tags, util
+from . import (
+  assets,
+  autocomplete,
+  binary,
+  bundle,
+  catalog,
+  compact,
+  constants,
+  glossary,
+  icons,
+  memo,
+  merkle,
+  narrations,
+  nav,
+  pagecache,
+  pipeline,
+  profiles,
+  ratelimit,
+  shard,
+  stream,
+  sync,
+  tags,
+  util,
+  watch,
+  writer,
+)
 
 
 class IconType(enum.StrEnum):
@@ -24,95 +53,272 @@ class IconType(enum.StrEnum):
 class ContentType(enum.StrEnum):
   XHTML = enum.auto()
   JSON = enum.auto()
+  TEXT = enum.auto()
+  COMPACT = enum.auto()
+  BINARY = enum.auto()
+
+
+def new_session():
+  session = requests.Session()
+  session.headers = {
+    'user-agent': constants.USER_AGENT,
+  }
+  # Anything that isn't a site's own pages, like images on another host
+  adapter = ratelimit.new_adapter(ratelimit.RateController())
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  return session
+
+
+# Each host gets its own rate, so sites that share a session don't slow each
+# other down unless they are on the same host
+def site_rate(session: requests.Session, base_url: str):
+  scheme, netloc, *_ = urlparse(base_url)
+  prefix = f'{scheme}://{netloc}/'
+  adapter = session.adapters.get(prefix)
+  if not isinstance(adapter, ratelimit.RateLimitedAdapter):
+    adapter = ratelimit.new_adapter(ratelimit.RateController())
+    session.mount(prefix, adapter)
+  return adapter.controller
 
 
 class Scraper:
-  TAG_CLASSES = dict[str, set[str]]()
-  TAG_ITEMS_TYPES = dict[str, set[str]]()
-  TAG_URLS = set[str]()
-  TAG_ICONS = dict[str, str | None]()
-  RESOURCE_NARRATION_IDS = dict[str, int]()
+  STATS = (
+    'TAG_CLASSES',
+    'TAG_ITEMS_TYPES',
+    'TAG_URLS',
+    'TAG_ICONS',
+    'MISSIONS',
+    'EVENTS',
+    'ENTRIES',
+    'REWARDS',
+  )
+  ANNOTATION_STATS = ('MISSIONS', 'EVENTS', 'ENTRIES', 'REWARDS')
 
+  profile: profiles.SiteProfile
+  layout: profiles.SiteLayout
   base_url: str
   page_urls: list[str]
   session: requests.Session
+  rate: ratelimit.RateController
 
   output_dir: pathlib.Path
   log_dir: pathlib.Path
+  cache_dir: pathlib.Path
+  icons_dir: pathlib.Path
 
   icon_type: IconType
-  content_type: ContentType
+  content_types: list[ContentType]
+  threaded: bool
+
+  CONTENT_DIRS: dict[ContentType, str] = {
+    ContentType.XHTML: 'data',
+    ContentType.JSON: 'json',
+    ContentType.TEXT: 'text',
+    ContentType.COMPACT: 'compact',
+    ContentType.BINARY: 'binary',
+  }
+
+  asset_mirror: assets.AssetMirror | None
+  asset_srcs: dict[str, str]
+  # Links as they are written, kept apart from TAG_URLS as pages can be
+  # rendered while another page is being parsed
+  link_urls: set[str]
+
+  glossary_links: bool
+  glossary_linker: glossary.GlossaryLinker | None
+
+  sync_delta: bool
+
+  nav_index: nav.NavIndex
+  FETCH_WORKERS = 8
+
+  pipelined: bool
+  PIPELINE_QUEUE = 16
+  pipeline_stats: dict[str, pipeline.StageStats] | None
+
+  page_cache: pagecache.PageCache
+
+  MEMO_SIZE = 8192
+  annotation_memo: memo.LRUCache[
+    tuple[str, str | None],
+    tuple[list[tags.Tag[Any]], dict[str, set[str]]],
+  ]
+  xhtml_memo: memo.LRUCache[tuple[str, str | None], str]
 
   def __init__(
     self,
-    base_url: str,
-    page_urls: list[str],
+    profile: profiles.SiteProfile,
     icon_type: IconType,
-    content_type: ContentType,
+    content_types: list[ContentType],
+    threaded: bool = False,
+    mirror_assets: bool = False,
+    glossary_links: bool = False,
+    sync_delta: bool = False,
+    pipelined: bool = True,
+    session: requests.Session | None = None,
   ):
-    self.base_url = base_url
-    self.page_urls = page_urls
-
-    self.session = requests.Session()
-    self.session.mount(
-      'https://',
-      HTTPAdapter(
-        max_retries=Retry(
-          total=5,
-          backoff_factor=2,
-          status_forcelist=[429, 500, 502, 503, 504],
-        )
-      ),
-    )
-    self.session.headers = {
-      'user-agent': constants.USER_AGENT,
-    }
-    self.output_dir = pathlib.Path('.', 'output')
-    self.log_dir = pathlib.Path('.', 'log')
+    self.profile = profile
+    self.layout = profile.layout
+    self.base_url = profile.base_url
+    self.page_urls = profile.page_urls
+
+    self.session = session or new_session()
+    self.rate = site_rate(self.session, self.base_url)
+    self.output_dir = profile.output_dir
+    self.log_dir = profile.log_dir
+    self.cache_dir = profile.cache_dir
+    self.icons_dir = profile.icons_dir
+
+    # Sites built at the same time each keep their own
+    self.TAG_CLASSES = dict[str, set[str]]()
+    self.TAG_ITEMS_TYPES = dict[str, set[str]]()
+    self.TAG_URLS = set[str]()
+    self.TAG_ICONS = dict[str, str | None]()
+    self.RESOURCE_NARRATION_IDS = dict[str, int]()
+    self.MISSIONS = set[str]()
+    self.EVENTS = set[str]()
+    self.ENTRIES = set[str]()
+    self.REWARDS = set[str]()
 
     self.icon_type = icon_type
-    self.content_type = content_type
+    self.content_types = content_types
+    self.threaded = threaded
+
+    self.asset_mirror = (
+      assets.AssetMirror(self.session, self.cache_dir / 'assets')
+      if mirror_assets
+      else None
+    )
+    self.asset_srcs = {}
+    self.link_urls = set()
+
+    self.glossary_links = glossary_links
+    self.glossary_linker = None
+
+    self.sync_delta = sync_delta
+    self.pipelined = pipelined
+    self.pipeline_stats = None
+
+    self.nav_index = nav.NavIndex()
+    self.page_cache = pagecache.PageCache(
+      self.cache_dir / 'parsed',
+      pagecache.parser_version(
+        self.base_url,
+        repr(self.layout),
+        [pathlib.Path(module.__file__ or '') for module in (constants, tags, util)]
+        + [pathlib.Path(__file__)],
+      ),
+    )
+    self.annotation_memo = memo.LRUCache(self.MEMO_SIZE)
+    self.xhtml_memo = memo.LRUCache(self.MEMO_SIZE)
 
   def narration_id(self, resource_id: str):
     narration_id = self.RESOURCE_NARRATION_IDS.setdefault(resource_id, 0) + 1
     self.RESOURCE_NARRATION_IDS[resource_id] = narration_id
     return f'narration_{narration_id}'
 
-  def get_nav_parents(self, e: HtmlElement) -> Generator[str]:
-    for item in e.xpath(constants.NAV_PARENT_URLS):
-      yield from self.next_nav_parent(item)
-
-  def next_nav_parent(self, e: HtmlElement) -> Generator[str]:
-    for item in e.xpath(constants.NEXT_NAV_PARENT):
-      yield from self.next_nav_parent(item)
-    yield util.to_id(e.text or '')
-
-  def list_nav_items(self, e: HtmlElement) -> Generator[tuple[str, str, str]]:
-    for item in e.xpath(constants.NAV_ITEM_URLS):
-      yield util.to_id(item.text), str(item.text), util.clean_url(item.get('href'))
-
-  def scrape_page(
-    self, url: str
-  ) -> Generator[tuple[str, str, str, list[tuple[str, str, str]], Any | None]]:
-    data = util.get_content(self.session, self.base_url, url)
+  def parse_page(self, url: str, data: str, entry: nav.NavEntry):
     if not data:
       print(url)
     tree = util.parse_html(data)
 
-    title = str(next(iter(tree.xpath(constants.PAGE_TITLE))))
-    resource_id = '/'.join(self.get_nav_parents(tree))
-    items = list(self.list_nav_items(tree))
-    content = next(iter(tree.xpath(constants.SECTION_MARKDOWN)), None)
-    yield url, resource_id, title, items, content
+    title = str(next(iter(tree.xpath(self.layout.page_title))))
+    resource_id, _, items = entry
+    content = next(iter(tree.xpath(self.layout.section_markdown)), None)
+    return util.Page(
+      url,
+      resource_id,
+      title,
+      items or [],
+      (
+        self.parse_element_items(
+          resource_id,
+          content,
+          None,
+        )
+        if content is not None
+        else None
+      ),
+    )
 
-    for item in items:
-      yield from self.scrape_page(item[2])
+  def read_sidebar(self, data: str):
+    self.nav_index.merge(nav.parse_sidebar(util.parse_html(data), self.layout))
+
+  def load_page(self, url: str, refresh_nav: bool = False):
+    data = util.get_content(self.session, self.base_url, self.cache_dir, url)
+    if refresh_nav or not self.nav_index.known(url):
+      self.read_sidebar(data)
+    entry = self.nav_index.get(url)
+
+    key = self.page_cache.key(data)
+    parsed = self.page_cache.get(key)
+    if (
+      parsed
+      and parsed.page.url == url
+      and parsed.page.resource_id == entry.resource_id
+      and parsed.page.items == entry.items
+      and parsed.narrations[0]
+      == self.RESOURCE_NARRATION_IDS.get(parsed.page.resource_id, 0)
+    ):
+      self.page_cache.hits += 1
+      shard.merge_stats(self.stats(), parsed.stats)
+      self.RESOURCE_NARRATION_IDS[parsed.page.resource_id] = parsed.narrations[1]
+      return parsed.page
+
+    self.page_cache.misses += 1
+    narration_ids = self.RESOURCE_NARRATION_IDS.copy()
+    seen = self.stats()
+    for name, value in seen.items():
+      setattr(self, name, type(value)())
+    try:
+      page = self.parse_page(url, data, entry)
+      stats = self.stats()
+    finally:
+      for name, value in seen.items():
+        setattr(self, name, value)
+
+    shard.merge_stats(seen, stats)
+    self.page_cache.put(
+      key,
+      pagecache.ParsedPage(
+        page,
+        stats,
+        (
+          narration_ids.get(page.resource_id, 0),
+          self.RESOURCE_NARRATION_IDS.get(page.resource_id, 0),
+        ),
+      ),
+    )
+    return page
 
-  def parse_element(
-    self, resource_id: str, e: HtmlElement, urls: dict[str, str], icon_color: str | None
-  ) -> Generator[tags.Tag[Any]]:
+  # Lists the pages under url in nav order. Only the sidebars of collapsed
+  # categories have to be read, every other page is known from its parent's
+  def plan_pages(self, url: str, skip: Container[str] = ()) -> Generator[str]:
+    if url in skip:
+      return
+
+    if not self.nav_index.known(url):
+      self.read_sidebar(
+        util.get_content(self.session, self.base_url, self.cache_dir, url)
+      )
+    yield url
+
+    for _, _, item_url in self.nav_index.get(url).items or []:
+      yield from self.plan_pages(item_url, skip)
+
+  def fetch_pages(self, urls: list[str]):
+    missing = [url for url in urls if not util.cache_path(self.cache_dir, url).exists()]
+    with ThreadPoolExecutor(self.FETCH_WORKERS, thread_name_prefix='fetch') as executor:
+      for _ in executor.map(
+        lambda url: util.get_content(self.session, self.base_url, self.cache_dir, url),
+        missing,
+      ):
+        pass
+
+  def open_element(self, e: HtmlElement, icon_color: str | None):
     tag = str(e.tag)
-    tag = constants.REPLACE_TAG.get(tag, tag)
+    tag = self.layout.replace_tag.get(tag, tag)
 
     classes = list(e.classes)
 
@@ -123,22 +329,30 @@ class Scraper:
 
     color = util.get_color_for_class(
       classes,
-      colors=constants.CSS_TEXT_COLORS,
+      colors=self.layout.text_colors,
     )
-
-    items: list[tags.Tag[Any]] = list(
-      self.parse_element_items(
-        resource_id,
-        e,
-        urls,
-        util.get_color_for_class(
-          classes,
-          constants.CSS_ICON_COLORS,
-        )
-        or icon_color,
+    icon_color = (
+      util.get_color_for_class(
+        classes,
+        self.layout.icon_colors,
       )
+      or icon_color
+    )
+    return util.ElementFrame(
+      e,
+      tag,
+      classes,
+      color,
+      icon_color,
+      list(self.process_text(e.text, icon_color)) if e.text else [],
+      iter(e),
     )
 
+  def close_element(
+    self, resource_id: str, frame: util.ElementFrame
+  ) -> Generator[tags.Tag[Any]]:
+    e, tag, classes, color, _, items, _ = frame
+
     # Remove unnessesary spans
     if tag == 'span' and not color:
       yield from items
@@ -150,7 +364,7 @@ class Scraper:
       if isinstance(item, (tags.TagFormattedText, tags.TagBlockquote)):
         # Remove trailing spaces
         if item.items and item.items[-1] == tags.TagText('text', ' '):
-          item.items.pop()
+          items[0] = replace(item, items=item.items[:-1])
 
     if tag in ('p', 'b', 'i', 'span'):
       if (
@@ -161,7 +375,7 @@ class Scraper:
       ):
         # Bring colors to the top
         color = item.color or color
-        item.color = None
+        items[0] = item = replace(item, color=None)
 
         # Remove unnessesary matching elements, spans or paragraphs
         if item.type == tag or item.type in ('span', 'p'):
@@ -178,7 +392,7 @@ class Scraper:
       if not items:
         return
 
-      anchor = e.get('id') if constants.CLASS_ANCHOR in classes else None
+      anchor = e.get('id') if self.layout.anchor_class in classes else None
       yield tags.TagTitle(
         tag,
         anchor,
@@ -190,15 +404,13 @@ class Scraper:
       if not items:
         return
 
-      url = util.rewrite_url(
-        self.base_url,
-        util.clean_url(e.get('href', '')),
-        urls,
-      )
-      self.TAG_URLS.add(url)
+      # Hrefs are kept as scraped and rewritten by rewrite_links once every
+      # page's resource id is known, the same goes for mirrored images
+      href = util.clean_url(e.get('href', ''))
 
       # Remove unnessesary links
-      if tag == 'a' and not url:
+      if tag == 'a' and not href:
+        self.TAG_URLS.add(href)
         yield tags.TagFormattedText(
           'span',
           color,
@@ -208,7 +420,7 @@ class Scraper:
 
       yield tags.TagLink(
         tag,
-        url,
+        href,
         items,
       )
       return
@@ -228,7 +440,7 @@ class Scraper:
 
       highlight = util.get_color_for_class(
         classes,
-        constants.CSS_HIGHLIGHT_COLORS,
+        self.layout.highlight_colors,
       )
       if tag == 'p' and highlight:
         yield tags.TagHighlight(
@@ -246,13 +458,9 @@ class Scraper:
         return
 
     elif tag == 'img':
-      src = e.get('src', '')
-      if src.startswith('/'):
-        src = urljoin(self.base_url, src)
-
       yield tags.TagImg(
         tag,
-        src,
+        self.img_src(e),
       )
       return
 
@@ -262,30 +470,93 @@ class Scraper:
     elif tag not in ('title', 'mark'):
       pass  # print(tag)
 
+  def img_src(self, e: HtmlElement):
+    src = e.get('src', '')
+    if src.startswith('/'):
+      src = urljoin(self.base_url, src)
+    return src
+
   def parse_element_items(
     self,
     resource_id: str,
     parent: HtmlElement,
-    urls: dict[str, str],
     icon_color: str | None,
-  ) -> Generator[tags.Tag[Any]]:
-    if parent.text and parent.text:
-      yield from self.process_text(parent.text, icon_color)
-
-    for child in parent:
-      items = self.parse_element(resource_id, child, urls, icon_color)
-      for modifier in (
-        self.add_dancers_round_tags,
-        self.add_mission_tags,
-        self.add_event_tags,
-        self.add_entry_tags,
-        self.add_reward_tags,
-      ):
-        items = modifier(resource_id, items)
-      yield from items
+  ) -> list[tags.Tag[Any]]:
+    # Elements are walked with an explicit stack rather than recursion, each
+    # element's items are collected in its frame and its tags are added to
+    # its parent's items once all of its children have been closed
+    root = util.ElementFrame(
+      parent,
+      '',
+      [],
+      None,
+      icon_color,
+      list(self.process_text(parent.text, icon_color)) if parent.text else [],
+      iter(parent),
+    )
+    stack = [root]
+    while True:
+      frame = stack[-1]
+      child = next(frame.children, None)
+      if child is not None:
+        stack.append(self.open_element(child, frame.icon_color))
+        continue
+
+      if frame is root:
+        return root.items
+
+      stack.pop()
+      parent_frame = stack[-1]
+      parent_frame.items.extend(
+        self.annotate(
+          resource_id,
+          list(self.close_element(resource_id, frame)),
+        )
+      )
 
-      if child.tail and child.tail:
-        yield from self.process_text(child.tail, icon_color)
+      if tail := frame.element.tail:
+        parent_frame.items.extend(self.process_text(tail, parent_frame.icon_color))
+
+  def annotate(
+    self,
+    resource_id: str,
+    items: list[tags.Tag[Any]],
+  ) -> list[tags.Tag[Any]]:
+    key = (
+      merkle.hash_items(items),
+      resource_id if resource_id == self.DANCERS_ROUND_ID else None,
+    )
+    cached = self.annotation_memo.get(key)
+    if cached is None:
+      # The names the modifiers find are kept with the result, so the stats
+      # of a page are complete even when its annotations come from the memo
+      seen = {name: getattr(self, name) for name in self.ANNOTATION_STATS}
+      found = {name: set[str]() for name in self.ANNOTATION_STATS}
+      for name, names in found.items():
+        setattr(self, name, names)
+      try:
+        annotated = list(self.add_dancers_round_tags(resource_id, items))
+        for modifier in (
+          self.add_mission_tags,
+          self.add_event_tags,
+          self.add_entry_tags,
+          self.add_reward_tags,
+        ):
+          annotated = modifier(resource_id, annotated)
+        self.mark_annotated(annotated)
+      finally:
+        for name, names in seen.items():
+          setattr(self, name, names)
+
+      cached = (annotated, found)
+      self.annotation_memo.put(key, cached)
+
+    annotated, found = cached
+    for name, names in found.items():
+      if names:
+        getattr(self, name).update(names)
+
+    return annotated
 
   TEXT_REPLACE_MAP = str.maketrans(
     {
@@ -305,9 +576,9 @@ class Scraper:
     for i, c in enumerate(text):
       code = ord(c)
       if 0xE000 <= code <= 0xF8FF:
-        self.TAG_ICONS[c] = constants.RANGER_ICON_NAMES.get(c)
+        self.TAG_ICONS[c] = self.layout.icon_names.get(c)
 
-      if c in constants.RANGER_ICON_NAMES:
+      if c in self.layout.icon_names:
         if i > start:
           text = text[start:i]
           if text != '\u200b':
@@ -318,7 +589,7 @@ class Scraper:
 
         icon = tags.TagIcon(
           'icon',
-          constants.RANGER_ICON_NAMES[c],
+          self.layout.icon_names[c],
           [
             tags.TagText(
               'text',
@@ -413,10 +684,22 @@ class Scraper:
     if isinstance(content, tags.TagText):
       return content.text
 
+    # Link hrefs are rewritten relative to the resource, so only subtrees
+    # without links can be shared between resources
+    node = merkle.node_hash(content)
+    key = (node.digest, resource_id if node.links else None)
+    xhtml = self.xhtml_memo.get(key)
+    if xhtml is None:
+      xhtml = self.render_xhtml(resource_id, content)
+      self.xhtml_memo.put(key, xhtml)
+
+    return xhtml
+
+  def render_xhtml(self, resource_id: str, content: tags.Tag[Any]):
     attributes = {
-      key: value
-      for key, value in asdict(content).items()
-      if key not in ('type', 'items')
+      field.name: getattr(content, field.name)
+      for field in fields(content)
+      if field.name not in ('type', 'items')
     }
 
     if isinstance(content, tags.TagIcon):
@@ -461,178 +744,924 @@ class Scraper:
     if isinstance(item, tags.TagText):
       yield item.text
 
+  def find_hrefs(self, items: Sequence[tags.Tag[Any]]) -> Generator[str]:
+    for item in items:
+      if isinstance(item, tags.TagLink):
+        yield item.href
+      if isinstance(item, tags.TagWithItems) and merkle.node_hash(item).links:
+        yield from self.find_hrefs(item.items)
+
+  def find_imgs(self, items: Sequence[tags.Tag[Any]]) -> Generator[str]:
+    for item in items:
+      if isinstance(item, tags.TagImg):
+        yield item.src
+      elif isinstance(item, tags.TagWithItems):
+        yield from self.find_imgs(item.items)
+
+  def rewrite_links(
+    self, items: list[tags.Tag[Any]], urls: dict[str, str]
+  ) -> list[tags.Tag[Any]]:
+    return [self.rewrite_link(item, urls) for item in items]
+
+  def rewrite_link(self, item: tags.Tag[Any], urls: dict[str, str]) -> tags.Tag[Any]:
+    if isinstance(item, tags.TagLink):
+      href = util.rewrite_url(self.base_url, item.href, urls)
+      self.link_urls.add(href)
+      if href != item.href:
+        item = replace(item, href=href)
+    elif isinstance(item, tags.TagImg) and item.src in self.asset_srcs:
+      item = replace(item, src=self.asset_srcs[item.src])
+
+    if isinstance(item, tags.TagWithItems) and (
+      merkle.node_hash(item).links or self.asset_srcs
+    ):
+      item = util.replace_items(item, self.rewrite_links(item.items, urls))
+
+    return item
+
+  def stats(self) -> dict[str, Any]:
+    return {name: getattr(self, name) for name in self.STATS}
+
   def scrape(self):
-    urls = dict[str, str]()
-    titles = dict[str, str]()
-    lookup = dict[str, list[util.Link]]()
-    resource_ids = dict[str, str]()
-    narrations = dict[str, list[util.Narration]]()
-    for page_url in self.page_urls:
-      for url, resource_id, title, _, _ in self.scrape_page(page_url):
-        urls[url] = resource_id
-        titles[url] = title
-        resource_ids[resource_id] = title
-
-        lookup_group = self.get_lookup_group(resource_id)
-        if lookup_group and lookup_group != resource_id:
-          lookup.setdefault(lookup_group, []).append(
-            util.Link(
-              id=resource_id,
-              title=title,
-            )
-          )
+    # Read the sidebars again in case the navigation has changed
+    self.nav_index = nav.NavIndex()
+    urls = [url for page_url in self.page_urls for url in self.plan_pages(page_url)]
+    # Images are mirrored before any page is written, which needs them all
+    if self.pipelined and not self.asset_mirror:
+      return asyncio.run(self.scrape_pipeline(urls))
+
+    self.fetch_pages(urls)
+    pages = [self.load_page(url) for url in urls]
+    index = util.SiteIndex()
+    img_srcs = set[str]()
+    for page in pages:
+      if self.asset_mirror and page.content:
+        img_srcs.update(self.find_imgs(page.content))
+
+      index.add(
+        page.url, page.resource_id, page.title, self.get_lookup_group(page.resource_id)
+      )
 
-    rmtree(self.output_dir, ignore_errors=True)
-    for page_url in self.page_urls:
-      for url, resource_id, title, items, data in self.scrape_page(page_url):
-        file = self.output_dir / 'data' / f'{resource_id}.json'
-        content = (
-          list(
-            self.parse_element_items(
-              resource_id,
-              data,
-              urls,
-              None,
-            )
+    asset_entries = dict[str, assets.AssetEntry]()
+    if self.asset_mirror:
+      asset_entries = self.asset_mirror.mirror(img_srcs)
+      self.asset_srcs = {
+        src: self.asset_mirror.local_src(src, asset_entries) for src in img_srcs
+      }
+
+    return self.write_pages(index, pages, asset_entries)
+
+  def shard(self, path: pathlib.Path, roots: list[str], skip: set[str]):
+    urls = [url for root in roots for url in self.plan_pages(root, skip)]
+    self.fetch_pages(urls)
+    pages = [self.load_page(url) for url in urls]
+    shard.write_shard(
+      path,
+      shard.Shard(
+        shard.SHARD_VERSION,
+        self.base_url,
+        roots,
+        pages,
+        self.stats(),
+      ),
+    )
+    print(f'{path}: {len(pages)} pages')
+
+  def merge(self, paths: list[pathlib.Path]):
+    pages = dict[str, util.Page]()
+    for path in paths:
+      part = shard.read_shard(path)
+      if part.base_url != self.base_url:
+        raise ValueError(f'{path}: shard is for {part.base_url}, not {self.base_url}')
+
+      shard.merge_stats(self.stats(), part.stats)
+      for page in part.pages:
+        pages.setdefault(page.url, page)
+
+    # Pages are written in the same order a single process would visit them
+    ordered = [
+      page for page_url in self.page_urls for page in shard.walk_pages(pages, page_url)
+    ]
+    index = util.SiteIndex()
+    for page in ordered:
+      index.add(
+        page.url, page.resource_id, page.title, self.get_lookup_group(page.resource_id)
+      )
+
+    self.write_pages(index, ordered, {})
+
+  def stream(self, path: str):
+    index = util.SiteIndex()
+    queue = stream.ResourceQueue()
+    # Anything printed while streaming to stdout would end up in the records
+    with stream.RecordStream(path) as records, redirect_stdout(sys.stderr):
+
+      def emit(page: util.Page):
+        content, anchors, links, lookup = self.render_page(index, page)
+        for content_type in self.content_types:
+          records.write(
+            {
+              'type': 'resource',
+              'format': content_type,
+              **self.page_resource(
+                content_type,
+                page.resource_id,
+                page.title,
+                content,
+                anchors,
+                links,
+                lookup,
+                util.clean_url(page.url),
+              ),
+            }
           )
-          if data is not None
-          else None
+
+      try:
+        for page_url in self.page_urls:
+          for url in self.plan_pages(page_url):
+            page = self.load_page(url)
+            lookup_group = self.get_lookup_group(page.resource_id)
+            index.add(page.url, page.resource_id, page.title, lookup_group)
+            for narration in self.page_narrations(
+              page.url, page.resource_id, page.content
+            ):
+              records.write(
+                {'type': 'narration', **asdict(self.narration_item(narration))}
+              )
+
+            links = [
+              urlparse(href).path
+              for href in self.find_hrefs(page.content or [])
+              if href.startswith('/')
+            ]
+            for ready in queue.add(page, links, page.resource_id == lookup_group):
+              emit(ready)
+
+        for page in queue.rest():
+          emit(page)
+      except BrokenPipeError:
+        print(f'{path}: reader went away after {records.records} records')
+        return
+
+      self.dump_logs()
+      print(records.summary())
+
+  def write_pages(
+    self,
+    index: util.SiteIndex,
+    pages: Iterable[util.Page],
+    asset_entries: dict[str, assets.AssetEntry],
+  ):
+    build = util.SiteBuild(index)
+    self.glossary_linker = self.build_glossary(index)
+    with ExitStack() as stack:
+      output, format_threads = self.open_output(stack, asset_entries)
+      for page in pages:
+        self.build_page(output, build, page, format_threads)
+
+      self.finish_output(output, build)
+
+    self.dump_logs()
+    return build
+
+  def open_output(self, stack: ExitStack, asset_entries: dict[str, assets.AssetEntry]):
+    output = stack.enter_context(writer.OutputWriter(self.output_dir))
+    if self.asset_mirror:
+      for name, blob in {
+        assets.asset_name(entry): self.asset_mirror.blob(entry)
+        for entry in asset_entries.values()
+      }.items():
+        output.submit(pathlib.Path('assets', name), blob.read_bytes)
+
+    format_threads = {
+      content_type: stack.enter_context(
+        ThreadPoolExecutor(1, thread_name_prefix=f'format_{content_type}')
+      )
+      for content_type in (self.content_types if self.threaded else [])
+    }
+    return output, format_threads
+
+  def finish_output(self, output: writer.OutputWriter, build: util.SiteBuild):
+    for data in build.data.values():
+      if isinstance(data, Future):
+        data.result()
+
+    self.write_groups(output, build, None)
+    self.write_index(output, build.index)
+    self.write_manifest(output, build)
+    entities = self.write_catalog(output, build)
+    self.write_autocomplete(output, build, entities)
+    self.write_narrations(output, build)
+    self.write_icons(output)
+    self.write_sync(output)
+
+  # The pages a page has to wait for before it can be rendered: the planned
+  # pages it links to, a group page's members and, when glossary terms are
+  # linked, every glossary page
+  def page_dependencies(
+    self, page: util.Page, planned: Container[str], glossary_urls: set[str]
+  ):
+    dependencies = {
+      path
+      for path in (urlparse(href).path for href in self.find_hrefs(page.content or []))
+      if path in planned
+    }
+    if page.resource_id == self.get_lookup_group(page.resource_id):
+      dependencies.update(self.nav_subtree(page.url))
+    dependencies.update(glossary_urls)
+    return dependencies
+
+  def nav_subtree(self, url: str) -> Generator[str]:
+    for _, _, item_url in self.nav_index.get(url).items or []:
+      yield item_url
+      yield from self.nav_subtree(item_url)
+
+  def fetch_page(self, url: str):
+    util.get_content(self.session, self.base_url, self.cache_dir, url)
+    return url
+
+  # Pages are fetched, parsed and written by separate stages with bounded
+  # queues in between, so the network, parsing and the disk are all busy at
+  # once. Pages are parsed one at a time and in plan order, as the parser
+  # keeps state between pages, and written as soon as everything they
+  # depend on has been parsed, then put back in plan order for the files
+  # that list every page.
+  async def scrape_pipeline(self, urls: list[str]):
+    index = util.SiteIndex()
+    build = util.SiteBuild(index)
+    planned = set(urls)
+    glossary_urls = (
+      {
+        url
+        for url in urls
+        if self.nav_index.get(url).resource_id.startswith(f'{glossary.GLOSSARY_GROUP}/')
+      }
+      if self.glossary_links
+      else set[str]()
+    )
+    self.glossary_linker = None
+
+    start = time.perf_counter()
+    with ExitStack() as stack:
+      output, format_threads = self.open_output(stack, {})
+      fetch_stage = pipeline.Stage('fetch', self.fetch_page, self.FETCH_WORKERS)
+      parse_stage = pipeline.Stage('parse', self.load_page)
+      write_stage = pipeline.Stage[util.Page, None](
+        'write',
+        lambda page: self.build_page(output, build, page, format_threads),
+      )
+      stages = (fetch_stage, parse_stage, write_stage)
+      for stage in stages:
+        stack.callback(stage.close)
+
+      dependencies = pipeline.Dependencies[str]()
+      pages = dict[str, util.Page]()
+      writes = deque[asyncio.Future[None]]()
+
+      async def write(url: str):
+        writes.append(asyncio.ensure_future(write_stage.submit(pages[url])))
+        while len(writes) > self.PIPELINE_QUEUE:
+          await writes.popleft()
+
+      fetched = pipeline.ordered(
+        fetch_stage, pipeline.iterate(urls), self.FETCH_WORKERS * 2
+      )
+      async for page in pipeline.ordered(parse_stage, fetched, self.PIPELINE_QUEUE):
+        pages[page.url] = page
+        index.add(
+          page.url,
+          page.resource_id,
+          page.title,
+          self.get_lookup_group(page.resource_id),
         )
-        anchors = list(self.find_anchors(content)) if content else []
-
-        lookup_group = self.get_lookup_group(resource_id)
-        if lookup_group:
-          narrations.setdefault(lookup_group, []).extend(
-            list(self.find_narrations(resource_id, url, None, content))
-            if content
-            else []
-          )
+        if (
+          self.glossary_links
+          and self.glossary_linker is None
+          and glossary_urls <= pages.keys()
+        ):
+          self.glossary_linker = self.build_glossary(index)
 
-        if self.content_type == ContentType.XHTML:
-          content = (
-            self.content_to_xhtml(
-              resource_id,
-              content,
-            )
-            if content
-            else None
-          )
-        elif self.content_type == ContentType.JSON:
-          content = [asdict(item) for item in content] if content else None
-        else:
-          content = None
-
-        lookup_group = self.get_lookup_group(resource_id)
-        util.write_resource(
-          file,
-          resource_id,
-          title,
-          content,
-          anchors,
-          [
-            util.Link(
-              id='/'.join((resource_id, item_id)),
-              title=item_title,
-            )
-            for item_id, item_title, _ in items
-          ]
-          + anchors,
-          (
-            lookup[lookup_group] if lookup_group and lookup_group == resource_id else []
-          ),
-          util.clean_url(url),
+        for url in dependencies.add(
+          page.url, self.page_dependencies(page, planned, glossary_urls)
+        ):
+          await write(url)
+
+      for future in writes:
+        await future
+      wall = time.perf_counter() - start
+
+      for name in ('pages', 'narrations', 'entities'):
+        values = getattr(build, name)
+        setattr(build, name, {url: values[url] for url in urls})
+      build.manifest.reorder(build.pages[url].resource_id for url in urls)
+      self.finish_output(output, build)
+
+    self.pipeline_stats = {stage.name: stage.stats(wall) for stage in stages}
+    self.dump_logs()
+    pipeline.print_stats(self.pipeline_stats, wall)
+    return build
+
+  def build_page(
+    self,
+    output: writer.OutputWriter,
+    build: util.SiteBuild,
+    page: util.Page,
+    format_threads: dict[ContentType, ThreadPoolExecutor],
+  ):
+    url, resource_id, title, items, content = page
+    build.pages[url] = page
+    for href in self.find_hrefs(content or []):
+      build.linked_by.setdefault(urlparse(href).path, set()).add(url)
+
+    content, anchors, links, lookup = self.render_page(build.index, page)
+    build.anchors[url] = anchors
+    build.manifest.add(
+      resource_id,
+      title,
+      util.clean_url(url),
+      content,
+      [f'{resource_id}/{item_id}' for item_id, _, _ in items],
+    )
+
+    build.entities[url] = list(catalog.find_entities(content)) if content else []
+    build.narrations[url] = [
+      self.narration_item(narration)
+      for narration in self.page_narrations(page.url, resource_id, content)
+    ]
+
+    for content_type in self.content_types:
+      args = (
+        output,
+        content_type,
+        resource_id,
+        title,
+        content,
+        anchors,
+        links,
+        lookup,
+        util.clean_url(url),
+      )
+      if format_thread := format_threads.get(content_type):
+        build.data[content_type, resource_id] = format_thread.submit(
+          self.write_page, *args
         )
+      else:
+        build.data[content_type, resource_id] = self.write_page(*args)
+
+  def build_glossary(self, index: util.SiteIndex):
+    if not self.glossary_links:
+      return None
+
+    return glossary.GlossaryLinker(glossary.glossary_terms(index.resource_ids))
+
+  def render_page(self, index: util.SiteIndex, page: util.Page):
+    _, resource_id, _, items, content = page
+    if content is not None:
+      content = self.rewrite_links(content, index.urls)
+      if self.glossary_linker:
+        content = self.glossary_linker.link(resource_id, content)
+
+    anchors = list(self.find_anchors(content)) if content else []
+    links = [
+      util.Link(
+        id='/'.join((resource_id, item_id)),
+        title=item_title,
+      )
+      for item_id, item_title, _ in items
+    ] + anchors
+    lookup_group = self.get_lookup_group(resource_id)
+    lookup = (
+      index.lookup.get(lookup_group, [])
+      if lookup_group and lookup_group == resource_id
+      else []
+    )
+    return content, anchors, links, lookup
 
-    for story_id, narrations in narrations.items():
-      util.write_csv(
-        self.output_dir / 'csv' / f'{story_id}.csv',
-        [
-          util.NarrationItem(
-            '.'.join(f'{narration.resource_id}/{narration.tag.id}'.split('/')),
-            urljoin(self.base_url, narration.url),
-            '\n'.join(
-              self.content_to_text(
-                narration.tag.items,
-              )
-            ),
-          )
-          for narration in narrations
-        ],
+  def page_narrations(
+    self, url: str, resource_id: str, content: list[tags.Tag[Any]] | None
+  ):
+    if not self.get_lookup_group(resource_id) or not content:
+      return []
+
+    return list(self.find_narrations(resource_id, url, None, content))
+
+  def narration_item(self, narration: util.Narration):
+    return util.NarrationItem(
+      '.'.join(f'{narration.resource_id}/{narration.tag.id}'.split('/')),
+      urljoin(self.base_url, narration.url),
+      '\n'.join(
+        self.content_to_text(
+          narration.tag.items,
+        )
+      ),
+    )
+
+  def write_groups(
+    self,
+    output: writer.OutputWriter,
+    build: util.SiteBuild,
+    lookup_groups: set[str] | None,
+  ):
+    members = dict[str, list[util.Page]]()
+    for page in build.pages.values():
+      lookup_group = self.get_lookup_group(page.resource_id)
+      if lookup_group and (lookup_groups is None or lookup_group in lookup_groups):
+        members.setdefault(lookup_group, []).append(page)
+
+    for lookup_group in lookup_groups or ():
+      if lookup_group not in members:
+        for content_type in self.content_types:
+          output.remove(self.bundle_path(content_type, lookup_group))
+        output.remove(pathlib.Path('csv', f'{lookup_group}.csv'))
+
+    for lookup_group, pages in members.items():
+      for content_type in self.content_types:
+        output.write_bytes(
+          self.bundle_path(content_type, lookup_group),
+          self.build_bundle(content_type, build, pages),
+        )
+
+      items = [item for page in pages for item in build.narrations[page.url]]
+      if not items:
+        output.remove(pathlib.Path('csv', f'{lookup_group}.csv'))
+        continue
+
+      output.write_text(
+        pathlib.Path('csv', f'{lookup_group}.csv'),
+        util.narrations_csv(items),
       )
 
-    util.write_resource(
-      self.output_dir / 'data.json',
-      '',
-      'The Living Valley',
-      None,
-      [],
-      [
-        {
-          'id': urls[page_url],
-          'title': titles[page_url],
-        }
-        for page_url in self.page_urls
-      ],
-      [],
-      self.base_url,
+  def write_index(self, output: writer.OutputWriter, index: util.SiteIndex):
+    output.write_json(
+      pathlib.Path('data.json'),
+      util.resource(
+        '',
+        self.profile.title,
+        None,
+        [],
+        [
+          {
+            'id': index.urls[page_url],
+            'title': index.titles[page_url],
+          }
+          for page_url in self.page_urls
+        ],
+        [],
+        self.base_url,
+      ),
     )
-    util.write_json(
-      self.output_dir / 'lookup.json',
+    output.write_json(
+      pathlib.Path('lookup.json'),
       [
         {
           'id': resource_id,
           'title': title,
           'parents': [
             parent_title
-            for parent_resource_id, parent_title in resource_ids.items()
+            for parent_resource_id, parent_title in index.resource_ids.items()
             if resource_id.startswith(f'{parent_resource_id}/')
           ],
         }
-        for resource_id, title in resource_ids.items()
+        for resource_id, title in index.resource_ids.items()
       ],
     )
-    self.dump_logs()
 
-  def dump_logs(self):
-    rmtree(self.log_dir, ignore_errors=True)
+  def write_manifest(self, output: writer.OutputWriter, build: util.SiteBuild):
+    output.write_json(
+      pathlib.Path('manifest.json'),
+      build.manifest.build([build.index.urls[page_url] for page_url in self.page_urls]),
+    )
 
-    util.write_json(
-      (self.log_dir / 'tags.json'),
-      {
-        key: sorted(value)
-        for key, value in sorted(self.TAG_ITEMS_TYPES.items(), key=lambda x: x[0])
-      },
+  # Only the postings of the pages given are built again
+  def write_catalog(
+    self,
+    output: writer.OutputWriter,
+    build: util.SiteBuild,
+    urls: Container[str] | None = None,
+  ):
+    entry_ids = catalog.entry_ids(build.pages.values(), self.get_lookup_group)
+    for page in build.pages.values():
+      if urls is None or page.url in urls:
+        build.postings[page.url] = catalog.page_postings(
+          page,
+          build.entities[page.url],
+          build.index.resource_ids,
+          entry_ids,
+          self.get_lookup_group(page.resource_id),
+        )
+
+    entities = catalog.merge_postings(build.postings[url] for url in build.pages)
+    output.write_json(pathlib.Path('catalog.json'), entities)
+    return entities
+
+  def write_autocomplete(
+    self,
+    output: writer.OutputWriter,
+    build: util.SiteBuild,
+    entities: dict[str, dict[str, list[util.Occurrence]]],
+    prefixes: Container[str] | None = None,
+  ):
+    # Only needed when writing over the previous output
+    path = self.output_dir / 'autocomplete' / 'index.json'
+    old: autocomplete.AutocompleteIndex | None = (
+      json.loads(path.read_bytes()) if output.in_place and path.exists() else None
     )
-    util.write_json(
-      (self.log_dir / 'classes.json'),
-      {
-        key: sorted(value)
-        for key, value in sorted(self.TAG_CLASSES.items(), key=lambda x: x[0])
-      },
+    tree, shards = autocomplete.build_index(
+      ((page, build.anchors[page.url]) for page in build.pages.values()),
+      build.index.resource_ids,
+      entities['entries'],
+      # The rest of the top results come from the previous index
+      prefixes if old else None,
+      old['top'] if old else None,
     )
-    util.write_json(
-      (self.log_dir / 'urls.json'),
-      sorted(self.TAG_URLS),
+    if old:
+      for prefix in old['shards']:
+        if prefix not in tree['shards']:
+          output.remove(pathlib.Path('autocomplete', f'{prefix}.json'))
+
+    # Shards are loaded as the user types, so they are kept small
+    for prefix, prefix_shard in shards.items():
+      output.write_bytes(
+        pathlib.Path('autocomplete', f'{prefix}.json'),
+        writer.encode_json(prefix_shard, indent=None),
+      )
+    output.write_bytes(
+      pathlib.Path('autocomplete', 'index.json'), writer.encode_json(tree, indent=None)
     )
-    util.write_json(
-      (self.log_dir / 'icons.json'),
-      dict(sorted(self.TAG_ICONS.items(), key=lambda x: x[0])),
+
+  def write_narrations(
+    self,
+    output: writer.OutputWriter,
+    build: util.SiteBuild,
+    feed: narrations.NarrationFeed | None = None,
+  ):
+    store = narrations.build_store(
+      (item for items in build.narrations.values() for item in items),
+      build.narration_hashes,
     )
-    util.write_json(
-      (self.log_dir / 'missions.json'),
-      sorted(self.MISSIONS),
+    if feed is None:
+      # The feed is against the narrations of the output being replaced
+      path = self.output_dir / 'narrations.json'
+      feed = narrations.diff_stores(
+        narrations.read_store(path) if path.exists() else None, store
+      )
+    output.write_json(pathlib.Path('narrations.json'), store)
+    output.write_json(pathlib.Path('narrations.changes.json'), feed)
+    print(f'narrations: {narrations.summary(feed)}')
+
+  def write_sync(self, output: writer.OutputWriter):
+    # Files are hashed as they are written, so this has to come last
+    output.flush()
+    path = self.output_dir / sync.SYNC_DIR / 'manifest.json'
+    old = sync.read_manifest(path) if path.exists() else None
+    manifest = sync.written_manifest(output, old)
+    patch = sync.diff_manifests(old, manifest)
+    output.write_json(pathlib.Path(sync.SYNC_DIR, 'manifest.json'), manifest)
+    output.write_json(pathlib.Path(sync.SYNC_DIR, 'patch.json'), patch)
+    if self.sync_delta:
+      output.write_bytes(
+        pathlib.Path(sync.SYNC_DIR, 'delta.zip'),
+        sync.build_delta(patch, output.staging),
+      )
+    elif output.in_place:
+      output.remove(pathlib.Path(sync.SYNC_DIR, 'delta.zip'))
+    print(f'sync: {sync.summary(patch)}')
+
+  def write_icons(self, output: writer.OutputWriter):
+    sprite, symbols = icons.build_sprite(icons.read_icons(self.icons_dir))
+    if missing := icons.missing_symbols(symbols, self.TAG_ICONS.values()):
+      raise ValueError(f'no symbol in {self.icons_dir} for icons: {", ".join(missing)}')
+    output.write_text(pathlib.Path('icons.svg'), sprite)
+    output.write_json(pathlib.Path('icons.json'), symbols)
+
+  def watch(self, interval: float):
+    build = self.scrape()
+    cache = watch.CacheWatcher(self.cache_dir, build.pages)
+    print(f'watching {len(cache.mtimes)} pages in ./cache/, press ctrl+c to stop')
+    try:
+      while True:
+        time.sleep(interval)
+        changed = cache.changed()
+        if not changed:
+          continue
+
+        start = time.perf_counter()
+        rebuilt = self.rebuild(build, changed)
+        cache.reset(build.pages)
+        print(
+          f'rebuilt {rebuilt} resources in {(time.perf_counter() - start) * 1000:.1f}ms'
+        )
+    except KeyboardInterrupt:
+      pass
+
+  def rebuild(self, build: util.SiteBuild, changed: list[str]):
+    # The navigation is read again from the same sidebars a full build reads,
+    # so the pages are the same whichever ones changed
+    self.nav_index = nav.NavIndex()
+    urls = [url for page_url in self.page_urls for url in self.plan_pages(page_url)]
+
+    old_pages = build.pages
+    reload = watch.reload_urls(urls, changed, old_pages, self.nav_index)
+    for url in reload:
+      # Narration ids are numbered per resource, so start again from 1
+      if old := old_pages.get(url):
+        self.RESOURCE_NARRATION_IDS.pop(old.resource_id, None)
+      self.RESOURCE_NARRATION_IDS.pop(self.nav_index.get(url).resource_id, None)
+
+    pages = {url: old_pages[url] for url in urls if url not in reload}
+    pages.update((url, self.load_page(url)) for url in reload)
+    build.pages = {url: pages[url] for url in urls}
+
+    affected, moved, removed, lookup_groups, index_changed = watch.diff_pages(
+      old_pages,
+      build.pages,
+      reload,
+      self.get_lookup_group,
     )
-    util.write_json(
-      (self.log_dir / 'events.json'),
-      sorted(self.EVENTS),
+    if index_changed:
+      build.index = util.SiteIndex()
+      for page in build.pages.values():
+        build.index.add(
+          page.url,
+          page.resource_id,
+          page.title,
+          self.get_lookup_group(page.resource_id),
+        )
+
+      # Group pages list their members, and links to a page that moved or
+      # went are rewritten
+      affected.update(
+        page.url for page in build.pages.values() if page.resource_id in lookup_groups
+      )
+      for url in [*moved, *removed, *(url for url in urls if url not in old_pages)]:
+        affected.update(
+          source for source in build.linked_by.get(url, ()) if source in build.pages
+        )
+
+      # Any page can mention a glossary term
+      old_linker = self.glossary_linker
+      self.glossary_linker = self.build_glossary(build.index)
+      if (
+        self.glossary_linker
+        and old_linker
+        and self.glossary_linker.terms != old_linker.terms
+      ):
+        affected.update(build.pages)
+
+    # Bundles hold a copy of every member
+    lookup_groups.update(
+      lookup_group
+      for url in affected
+      if (lookup_group := self.get_lookup_group(build.pages[url].resource_id))
     )
-    util.write_json(
-      (self.log_dir / 'entries.json'),
-      sorted(self.ENTRIES),
+
+    # What the pages held before they are built again, the narration feed
+    # and the autocomplete shards only need to look at these
+    touched = [*affected, *removed]
+    old_texts = list(self.search_texts(build, old_pages, touched))
+    old_narrations = [item for url in touched for item in build.narrations.get(url, [])]
+    old_store = narrations.build_store(old_narrations, build.narration_hashes)
+    for item in old_narrations:
+      build.narration_hashes.pop(item.narration_id, None)
+
+    with writer.OutputWriter(self.output_dir, in_place=True) as output:
+      for url, resource_id in [*moved.items(), *removed.items()]:
+        build.manifest.remove(resource_id)
+        for content_type in self.content_types:
+          build.data.pop((content_type, resource_id), None)
+          output.remove(self.content_path(content_type, resource_id))
+      for url in removed:
+        for values in (build.narrations, build.entities, build.anchors, build.postings):
+          values.pop(url, None)
+        for sources in build.linked_by.values():
+          sources.discard(url)
+
+      for page in build.pages.values():
+        if page.url in affected:
+          self.build_page(output, build, page, {})
+
+      for name in ('narrations', 'entities'):
+        values = getattr(build, name)
+        setattr(build, name, {url: values[url] for url in urls})
+      if index_changed:
+        build.manifest.reorder(page.resource_id for page in build.pages.values())
+
+      self.write_groups(output, build, lookup_groups)
+      if index_changed:
+        self.write_index(output, build.index)
+      self.write_manifest(output, build)
+      # Entry targets, titles and parents come from the index
+      entities = self.write_catalog(output, build, None if index_changed else affected)
+      self.write_autocomplete(
+        output,
+        build,
+        entities,
+        None
+        if index_changed
+        else autocomplete.key_prefixes(
+          [*old_texts, *self.search_texts(build, build.pages, touched)]
+        ),
+      )
+      new_store = narrations.build_store(
+        (item for url in affected for item in build.narrations[url]),
+        build.narration_hashes,
+      )
+      self.write_narrations(output, build, narrations.diff_stores(old_store, new_store))
+      self.write_sync(output)
+
+    self.dump_logs()
+    return len(affected)
+
+  # Every text a page can be found by in the autocomplete index
+  def search_texts(
+    self, build: util.SiteBuild, pages: Mapping[str, util.Page], urls: Iterable[str]
+  ):
+    for url in urls:
+      if page := pages.get(url):
+        yield page.title
+        yield from (anchor['title'] for anchor in build.anchors.get(url, ()))
+        yield from (
+          entity.name
+          for entity in build.entities.get(url, ())
+          if entity.kind == 'entries'
+        )
+
+  def write_page(
+    self,
+    output: writer.OutputWriter,
+    content_type: ContentType,
+    resource_id: str,
+    title: str,
+    content: list[tags.Tag[Any]] | None,
+    anchors: list[util.Link],
+    links: list[util.Link],
+    lookup: list[util.Link],
+    url: str,
+  ):
+    if content_type == ContentType.BINARY:
+      data = binary.encode_resource(
+        util.resource(resource_id, title, None, anchors, links, lookup, url),
+        content or None,
+      )
+    else:
+      data = writer.encode_json(
+        self.page_resource(
+          content_type, resource_id, title, content, anchors, links, lookup, url
+        ),
+        # Whitespace would outweigh the compact content
+        indent=None if content_type == ContentType.COMPACT else 2,
+      )
+    output.write_bytes(self.content_path(content_type, resource_id), data)
+    return data
+
+  # data/ held whichever single format was built before there could be
+  # several, JSON keeps it when there is no XHTML
+  def content_dir(self, content_type: ContentType):
+    if content_type == ContentType.JSON and ContentType.XHTML not in self.content_types:
+      return self.CONTENT_DIRS[ContentType.XHTML]
+    return self.CONTENT_DIRS[content_type]
+
+  def content_path(self, content_type: ContentType, resource_id: str):
+    extension = 'bin' if content_type == ContentType.BINARY else 'json'
+    return pathlib.Path(self.content_dir(content_type), f'{resource_id}.{extension}')
+
+  def build_bundle(
+    self, content_type: ContentType, build: util.SiteBuild, pages: list[util.Page]
+  ):
+    entries = [
+      (page.resource_id, util.result(build.data[content_type, page.resource_id]))
+      for page in pages
+    ]
+    if content_type != ContentType.COMPACT:
+      return bundle.build_bundle(entries)
+
+    # The resources share the bundle's tables instead of each bringing their own
+    resources: list[util.Resource] = [json.loads(data) for _, data in entries]
+    tables, contents = compact.share_tables(
+      resource['content'] for resource in resources
+    )
+    for resource, content in zip(resources, contents):
+      resource['content'] = content
+    return bundle.build_bundle(
+      (
+        (resource['id'], writer.encode_json(resource, indent=None))
+        for resource in resources
+      ),
+      tables,
     )
-    util.write_json(
-      (self.log_dir / 'rewards.json'),
-      sorted(self.REWARDS),
+
+  # Kept apart from the resource files, so a copy of a content directory
+  # doesn't hold every resource twice
+  def bundle_path(self, content_type: ContentType, lookup_group: str):
+    return pathlib.Path(
+      'bundles', self.content_dir(content_type), f'{lookup_group}.bundle'
+    )
+
+  def page_resource(
+    self,
+    content_type: ContentType,
+    resource_id: str,
+    title: str,
+    content: list[tags.Tag[Any]] | None,
+    anchors: list[util.Link],
+    links: list[util.Link],
+    lookup: list[util.Link],
+    url: str,
+  ):
+    return util.resource(
+      resource_id,
+      title,
+      self.serialize_content(content_type, resource_id, content) if content else None,
+      anchors,
+      links,
+      lookup,
+      url,
+    )
+
+  def serialize_content(
+    self,
+    content_type: ContentType,
+    resource_id: str,
+    content: list[tags.Tag[Any]],
+  ):
+    if content_type == ContentType.XHTML:
+      return self.content_to_xhtml(resource_id, content)
+    elif content_type == ContentType.JSON:
+      return [asdict(item) for item in content]
+    elif content_type == ContentType.TEXT:
+      return '\n'.join(self.content_to_text(content))
+    elif content_type == ContentType.COMPACT:
+      return compact.encode_content(content)
+
+  def dump_logs(self):
+    with writer.OutputWriter(self.log_dir) as output:
+      output.write_json(
+        pathlib.Path('tags.json'),
+        {
+          key: sorted(value)
+          for key, value in sorted(self.TAG_ITEMS_TYPES.items(), key=lambda x: x[0])
+        },
+      )
+      output.write_json(
+        pathlib.Path('classes.json'),
+        {
+          key: sorted(value)
+          for key, value in sorted(self.TAG_CLASSES.items(), key=lambda x: x[0])
+        },
+      )
+      output.write_json(
+        pathlib.Path('urls.json'),
+        sorted(self.TAG_URLS | self.link_urls),
+      )
+      output.write_json(
+        pathlib.Path('icons.json'),
+        dict(sorted(self.TAG_ICONS.items(), key=lambda x: x[0])),
+      )
+      output.write_json(
+        pathlib.Path('missions.json'),
+        sorted(self.MISSIONS),
+      )
+      output.write_json(
+        pathlib.Path('events.json'),
+        sorted(self.EVENTS),
+      )
+      output.write_json(
+        pathlib.Path('entries.json'),
+        sorted(self.ENTRIES),
+      )
+      output.write_json(
+        pathlib.Path('rewards.json'),
+        sorted(self.REWARDS),
+      )
+      output.write_json(
+        pathlib.Path('memo.json'),
+        {
+          'annotations': self.annotation_memo.stats(),
+          'xhtml': self.xhtml_memo.stats(),
+          'pages': {
+            'hits': self.page_cache.hits,
+            'misses': self.page_cache.misses,
+          },
+        },
+      )
+      output.write_json(
+        pathlib.Path('fetch.json'),
+        self.rate.stats(),
+      )
+      if self.pipeline_stats:
+        output.write_json(pathlib.Path('pipeline.json'), self.pipeline_stats)
+    rate = self.rate.stats()
+    if rate['requests']:
+      print(
+        f'fetched {rate["requests"]} urls at {rate["rate"]}/s, '
+        f'{rate["throttled"]} throttled, {rate["retries"]} retried, {rate["waited"]}s waiting'
+      )
+    print(
+      f'parsed pages: {self.page_cache.misses} parsed, {self.page_cache.hits} reused'
+    )
+    print(
+      f'memo hit rate: annotations {self.annotation_memo.hit_rate:.1%}, '
+      f'xhtml {self.xhtml_memo.hit_rate:.1%}'
     )
 
   def extract_text_items(
@@ -646,66 +1675,97 @@ class Scraper:
     self,
     item: tags.Tag[Any],
   ) -> Generator[str]:
-    if isinstance(item, tags.TagText):
-      yield item.text
-    elif isinstance(item, tags.TagWithItems):
-      yield from self.extract_text_items(item.items)
+    stack = [item]
+    while stack:
+      item = stack.pop()
+      if isinstance(item, tags.TagText):
+        yield item.text
+      elif isinstance(item, tags.TagWithItems):
+        stack.extend(reversed(item.items))
+
+  # The text of a tag written in capitals, None as soon as a lower case
+  # letter turns up so big tags aren't read to the end
+  def capitals_text(self, item: tags.Tag[Any]):
+    text = list[str]()
+    for part in self.extract_text(item):
+      if any(c.isalpha() and not c.isupper() for c in part):
+        return None
+      text.append(part)
+
+    joined = ''.join(text)
+    if not any(c.isalpha() for c in joined):
+      return None
+    return joined
+
+  # Annotated tags are marked like merkle's hashes, the modifiers never look
+  # inside them again when an ancestor is annotated
+  ANNOTATED_ATTR = '_annotated'
+
+  def is_annotated(self, tag: tags.Tag[Any]):
+    return self.ANNOTATED_ATTR in vars(tag)
+
+  def mark_annotated(self, items: list[tags.Tag[Any]]):
+    stack = list(items)
+    while stack:
+      item = stack.pop()
+      if self.is_annotated(item):
+        continue
+
+      vars(item)[self.ANNOTATED_ATTR] = True
+      if isinstance(item, tags.TagWithItems):
+        stack.extend(item.items)
 
   mission_pattern = re.compile(r'(\s*)([^,():\n]+(?:\s*\([^():]*\))?)([,:]\s*|$)')
 
   def add_mission_tag(
     self,
-    resource_id: str,
-    tag: tags.Tag[Any],
-  ) -> Generator[tags.Tag[Any]]:
-    if isinstance(tag, tags.TagWithItems):
-      yield replace(
-        tag,
-        items=list(self.add_mission_tags(resource_id, tag.items)),
+    item: tags.Tag[Any],
+  ) -> list[tags.Tag[Any]] | None:
+    if not (isinstance(item, tags.TagFormattedText) and item.type == 'b'):
+      return None
+
+    text = self.capitals_text(item)
+    if text is None or re.search(r'(IF|READ|PDF|GO TO)[\W]', text):
+      return None
+
+    items = list[tags.Tag[Any]]()
+    for match in self.mission_pattern.finditer(text):
+      prefix, mission, suffix = match.groups()
+      self.MISSIONS.add(mission)
+
+      if prefix:
+        items.append(
+          tags.TagText(
+            'text',
+            prefix,
+          )
+        )
+      items.append(
+        tags.TagMission(
+          'mission',
+          [
+            tags.TagText(
+              'text',
+              mission,
+            ),
+          ],
+        )
       )
-    else:
-      yield tag
+      if suffix:
+        items.append(
+          tags.TagText(
+            'text',
+            suffix,
+          )
+        )
+    return items
 
   def add_mission_tags(
     self,
     resource_id: str,
-    items: Iterable[tags.Tag[Any]],
-  ) -> Generator[tags.Tag[Any]]:
-    for item in items:
-      if isinstance(item, tags.TagFormattedText) and item.type == 'b':
-        text = ''.join(self.extract_text(item))
-        if (
-          all(c.isupper() or not c.isalpha() for c in text)
-          and any(c.isalpha() for c in text)
-          and not re.search(r'(IF|READ|PDF|GO TO)[\W]', text)
-        ):
-          for match in self.mission_pattern.finditer(text):
-            prefix, mission, suffix = match.groups()
-            self.MISSIONS.add(mission)
-
-            if prefix:
-              yield tags.TagText(
-                'text',
-                prefix,
-              )
-            yield tags.TagMission(
-              'mission',
-              [
-                tags.TagText(
-                  'text',
-                  mission,
-                ),
-              ],
-            )
-            if suffix:
-              yield tags.TagText(
-                'text',
-                suffix,
-              )
-        else:
-          yield from self.add_mission_tag(resource_id, item)
-      else:
-        yield from self.add_mission_tag(resource_id, item)
+    items: list[tags.Tag[Any]],
+  ) -> list[tags.Tag[Any]]:
+    return util.map_items(items, self.add_mission_tag, self.is_annotated)
 
   event_pattern = re.compile(
     r'(\s*)([^\s,():\n][^,():\n]*[^\s,:()\n](?:\(?:[^()]*\))?)(\s*(?:,|:|$))'
@@ -718,113 +1778,107 @@ class Scraper:
 
   def add_event_tag(
     self,
-    resource_id: str,
-    tag: tags.Tag[Any],
-  ) -> Generator[tags.Tag[Any]]:
-    if isinstance(tag, tags.TagWithItems):
-      yield replace(
-        tag,
-        items=list(self.add_event_tags(resource_id, tag.items)),
-      )
-    else:
-      yield tag
+    item: tags.Tag[Any],
+  ) -> list[tags.Tag[Any]] | None:
+    if not (
+      isinstance(item, tags.TagFormattedText)
+      and item.type == 'span'
+      and item.color == 'blue'
+    ):
+      return None
+
+    text = self.capitals_text(item)
+    if text is None:
+      return None
+
+    items = list[tags.Tag[Any]]()
+    for match in self.event_pattern.finditer(text):
+      prefix, event, suffix = match.groups()
+      if prefix:
+        items.append(
+          tags.TagText(
+            'text',
+            prefix,
+          )
+        )
+      if self.is_entry.search(event):
+        self.ENTRIES.add(event)
+        items.append(
+          tags.TagEntry(
+            'entry',
+            [
+              tags.TagText(
+                'text',
+                event,
+              ),
+            ],
+          )
+        )
+      else:
+        self.EVENTS.add(event)
+        items.append(
+          tags.TagEvent(
+            'event',
+            [
+              tags.TagText(
+                'text',
+                event,
+              ),
+            ],
+          )
+        )
+      if suffix:
+        items.append(
+          tags.TagText(
+            'text',
+            suffix,
+          )
+        )
+    return items
 
   def add_event_tags(
     self,
     resource_id: str,
-    items: Iterable[tags.Tag[Any]],
-  ) -> Generator[tags.Tag[Any]]:
-    for item in items:
-      if (
-        isinstance(item, tags.TagFormattedText)
-        and item.type == 'span'
-        and item.color == 'blue'
-      ):
-        text = ''.join(self.extract_text(item))
-        if all(c.isupper() or not c.isalpha() for c in text) and any(
-          c.isalpha() for c in text
-        ):
-          for match in self.event_pattern.finditer(text):
-            prefix, event, suffix = match.groups()
-            if prefix:
-              yield tags.TagText(
-                'text',
-                prefix,
-              )
-            if self.is_entry.search(event):
-              self.ENTRIES.add(event)
-              yield tags.TagEntry(
-                'entry',
-                [
-                  tags.TagText(
-                    'text',
-                    event,
-                  ),
-                ],
-              )
-            else:
-              self.EVENTS.add(event)
-              yield tags.TagEvent(
-                'event',
-                [
-                  tags.TagText(
-                    'text',
-                    event,
-                  ),
-                ],
-              )
-            if suffix:
-              yield tags.TagText(
-                'text',
-                suffix,
-              )
-        else:
-          yield from self.add_event_tag(resource_id, item)
-      else:
-        yield from self.add_event_tag(resource_id, item)
+    items: list[tags.Tag[Any]],
+  ) -> list[tags.Tag[Any]]:
+    return util.map_items(items, self.add_event_tag, self.is_annotated)
 
   def add_entry_tag(
     self,
-    resource_id: str,
-    tag: tags.Tag[Any],
-  ) -> Generator[tags.Tag[Any]]:
-    if isinstance(tag, tags.TagWithItems):
-      yield replace(
-        tag,
-        items=list(self.add_entry_tags(resource_id, tag.items)),
-      )
-    else:
-      yield tag
+    item: tags.Tag[Any],
+  ) -> list[tags.Tag[Any]] | None:
+    if not isinstance(item, tags.TagLink):
+      return None
+
+    text = ''.join(self.extract_text(item))
+    if not self.is_entry.search(text):
+      return None
+
+    self.ENTRIES.add(text)
+    return [
+      tags.TagLink(
+        'a',
+        item.href,
+        [
+          tags.TagEntry(
+            'entry',
+            [
+              tags.TagText(
+                'text',
+                text,
+              ),
+            ],
+          ),
+        ],
+      ),
+    ]
 
   def add_entry_tags(
     self,
     resource_id: str,
-    items: Iterable[tags.Tag[Any]],
-  ) -> Generator[tags.Tag[Any]]:
-    for item in items:
-      if isinstance(item, tags.TagLink):
-        text = ''.join(self.extract_text(item))
-        if self.is_entry.search(text):
-          self.ENTRIES.add(text)
-          yield tags.TagLink(
-            'a',
-            item.href,
-            [
-              tags.TagEntry(
-                'entry',
-                [
-                  tags.TagText(
-                    'text',
-                    text,
-                  ),
-                ],
-              ),
-            ],
-          )
-        else:
-          yield from self.add_entry_tag(resource_id, item)
-      else:
-        yield from self.add_entry_tag(resource_id, item)
+    items: list[tags.Tag[Any]],
+  ) -> list[tags.Tag[Any]]:
+    return util.map_items(items, self.add_entry_tag, self.is_annotated)
 
   reward_capture = re.compile(
     r'(.*gain the )((?!(?:following|same)\b).*?)( reward.*)',
@@ -833,35 +1887,19 @@ class Scraper:
 
   def add_reward_tag(
     self,
-    resource_id: str,
-    tag: tags.Tag[Any],
-  ) -> Generator[tags.Tag[Any]]:
-    if isinstance(tag, tags.TagWithItems):
-      yield replace(
-        tag,
-        items=list(self.add_reward_tags(resource_id, tag.items)),
-      )
-    else:
-      yield tag
-
-  def add_reward_tags(
-    self,
-    resource_id: str,
-    items: Iterable[tags.Tag[Any]],
-  ) -> Generator[tags.Tag[Any]]:
-    items = iter(items)
-    for item in items:
-      if isinstance(item, tags.TagText) and (
-        m := self.reward_capture.search(item.text)
-      ):
-        start, reward, end = m.groups()
-        self.REWARDS.add(reward)
-
-        yield tags.TagText(
-          'text',
-          start,
-        )
-        yield tags.TagReward(
+    item: tags.Tag[Any],
+  ) -> list[tags.Tag[Any]] | None:
+    if not isinstance(item, tags.TagText):
+      return None
+
+    # The capture finds the last reward, the ones before it are in the start
+    items = list[tags.Tag[Any]]()
+    start = item.text
+    while m := self.reward_capture.search(start):
+      start, reward, end = m.groups()
+      self.REWARDS.add(reward)
+      items[:0] = [
+        tags.TagReward(
           'reward',
           items=[
             tags.TagText(
@@ -869,20 +1907,38 @@ class Scraper:
               reward,
             ),
           ],
-        )
-        yield tags.TagText(
+        ),
+        tags.TagText(
           'text',
           end,
-        )
-      else:
-        yield from self.add_reward_tag(resource_id, item)
+        ),
+      ]
+
+    if not items:
+      return None
+    return [
+      tags.TagText(
+        'text',
+        start,
+      ),
+      *items,
+    ]
+
+  def add_reward_tags(
+    self,
+    resource_id: str,
+    items: list[tags.Tag[Any]],
+  ) -> list[tags.Tag[Any]]:
+    return util.map_items(items, self.add_reward_tag, self.is_annotated)
+
+  DANCERS_ROUND_ID = 'campaign_guides/lure_of_the_valley/67_dancers_round'
 
   def add_dancers_round_tags(
     self,
     resource_id: str,
     items: Iterable[tags.Tag[Any]],
   ) -> Generator[tags.Tag[Any]]:
-    if resource_id != 'campaign_guides/lure_of_the_valley/67_dancers_round':
+    if resource_id != self.DANCERS_ROUND_ID:
       yield from items
       return
 
@@ -925,7 +1981,24 @@ class Scraper:
       else:
         yield item
 
-  MISSIONS = set[str]()
-  EVENTS = set[str]()
-  ENTRIES = set[str]()
-  REWARDS = set[str]()
+
+class SiteResult(NamedTuple):
+  profile: profiles.SiteProfile
+  build: util.SiteBuild | None
+  error: Exception | None
+  wall: float
+
+
+def scrape_site(scraper: Scraper):
+  start = time.perf_counter()
+  try:
+    build = scraper.scrape()
+  except Exception as e:
+    return SiteResult(scraper.profile, None, e, time.perf_counter() - start)
+  return SiteResult(scraper.profile, build, None, time.perf_counter() - start)
+
+
+# Every site is built on its own thread, one failing doesn't stop the others
+def scrape_sites(scrapers: Sequence[Scraper]):
+  with ThreadPoolExecutor(max(len(scrapers), 1), thread_name_prefix='site') as executor:
+    return list(executor.map(scrape_site, scrapers))
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import TypedDict
+
+
+class MemoStats(TypedDict):
+  size: int
+  maxsize: int
+  hits: int
+  misses: int
+  hit_rate: float
+
+
+class LRUCache[K, V]:
+  maxsize: int
+  hits: int
+  misses: int
+  entries: OrderedDict[K, V]
+
+  def __init__(self, maxsize: int):
+    self.maxsize = maxsize
+    self.hits = 0
+    self.misses = 0
+    self.entries = OrderedDict()
+
+  def get(self, key: K) -> V | None:
+    value = self.entries.get(key)
+    if value is None:
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    self.entries.move_to_end(key)
+    return value
+
+  def put(self, key: K, value: V):
+    self.entries[key] = value
+    self.entries.move_to_end(key)
+    if len(self.entries) > self.maxsize:
+      self.entries.popitem(last=False)
+
+  @property
+  def hit_rate(self):
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
+
+  def stats(self):
+    return MemoStats(
+      size=len(self.entries),
+      maxsize=self.maxsize,
+      hits=self.hits,
+      misses=self.misses,
+      hit_rate=round(self.hit_rate, 4),
+    )
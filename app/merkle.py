@@ -0,0 +1,263 @@
+import hashlib
+import json
+import pathlib
+from collections.abc import Generator, Iterable, Sequence
+from dataclasses import dataclass, fields
+from typing import Any, NamedTuple, TypedDict
+
+from . import tags
+
+MANIFEST_VERSION = 1
+
+
+def new_hash():
+  return hashlib.blake2b(digest_size=16)
+
+
+def hash_values(values: Iterable[str]):
+  h = new_hash()
+  for value in values:
+    h.update(value.encode('utf8'))
+    h.update(b'\0')
+  return h.hexdigest()
+
+
+class NodeHash(NamedTuple):
+  digest: str
+  links: bool
+
+
+# Tags are never modified after they are built, so the hash is cached on the
+# node itself and shared subtrees are only hashed once.
+NODE_HASH_ATTR = '_node_hash'
+
+
+def node_hash(tag: tags.Tag[Any]) -> NodeHash:
+  node: NodeHash | None = vars(tag).get(NODE_HASH_ATTR)
+  if node is not None:
+    return node
+
+  h = new_hash()
+  links = isinstance(tag, tags.TagLink)
+  for field in fields(tag):
+    value = getattr(tag, field.name)
+    if field.name == 'items':
+      for item in value:
+        item_hash = node_hash(item)
+        links = links or item_hash.links
+        h.update(item_hash.digest.encode('ascii'))
+    else:
+      h.update(json.dumps([field.name, value]).encode('utf8'))
+    h.update(b'\0')
+
+  node = NodeHash(h.hexdigest(), links)
+  vars(tag)[NODE_HASH_ATTR] = node
+  return node
+
+
+def hash_tag(tag: tags.Tag[Any]):
+  return node_hash(tag).digest
+
+
+def hash_items(items: Iterable[tags.Tag[Any]]):
+  return hash_values(hash_tag(item) for item in items)
+
+
+def iter_sections(
+  items: Sequence[tags.Tag[Any]],
+) -> Generator[tuple[str, list[tags.Tag[Any]]]]:
+  anchor = ''
+  section = list[tags.Tag[Any]]()
+  for item in items:
+    if isinstance(item, tags.TagTitle) and item.id:
+      if section:
+        yield anchor, section
+      anchor = f'#{item.id}'
+      section = []
+    section.append(item)
+
+  if section:
+    yield anchor, section
+
+
+def hash_sections(items: Sequence[tags.Tag[Any]]):
+  return {anchor: hash_items(section) for anchor, section in iter_sections(items)}
+
+
+class ResourceEntry(TypedDict):
+  hash: str
+  tree: str
+  sections: dict[str, str]
+  children: list[str]
+
+
+class Manifest(TypedDict):
+  version: int
+  hash: str
+  roots: list[str]
+  resources: dict[str, ResourceEntry]
+
+
+class ManifestBuilder:
+  resources: dict[str, ResourceEntry]
+
+  def __init__(self):
+    self.resources = {}
+
+  def add(
+    self,
+    resource_id: str,
+    title: str,
+    url: str,
+    content: Sequence[tags.Tag[Any]] | None,
+    children: list[str],
+  ):
+    sections = hash_sections(content) if content else {}
+    self.resources[resource_id] = ResourceEntry(
+      hash=hash_values(
+        (
+          title,
+          url,
+          *(f'{anchor}={value}' for anchor, value in sections.items()),
+        )
+      ),
+      tree='',
+      sections=sections,
+      children=children,
+    )
+
+  def remove(self, resource_id: str):
+    self.resources.pop(resource_id, None)
+
+  def reorder(self, resource_ids: Iterable[str]):
+    self.resources = {
+      resource_id: self.resources[resource_id]
+      for resource_id in resource_ids
+      if resource_id in self.resources
+    }
+
+  def tree_hash(self, resource_id: str) -> str:
+    entry = self.resources[resource_id]
+    if not entry['tree']:
+      entry['tree'] = hash_values(
+        (
+          entry['hash'],
+          *(
+            f'{child_id}={self.tree_hash(child_id)}'
+            for child_id in entry['children']
+            if child_id in self.resources
+          ),
+        )
+      )
+    return entry['tree']
+
+  def build(self, roots: list[str]):
+    # Resources can be replaced between builds, so subtree hashes are redone
+    for entry in self.resources.values():
+      entry['tree'] = ''
+
+    return Manifest(
+      version=MANIFEST_VERSION,
+      hash=hash_values(f'{root}={self.tree_hash(root)}' for root in roots),
+      roots=roots,
+      resources=self.resources,
+    )
+
+
+def read_manifest(path: pathlib.Path) -> Manifest:
+  with path.open() as f:
+    manifest: Manifest = json.load(f)
+
+  if manifest.get('version') != MANIFEST_VERSION:
+    raise ValueError(f'{path}: unsupported manifest version {manifest.get("version")}')
+
+  return manifest
+
+
+@dataclass
+class ResourceDiff:
+  resource_id: str
+  status: str
+  sections: list[tuple[str, str]]
+
+
+def diff_manifests(old: Manifest, new: Manifest) -> Generator[ResourceDiff]:
+  if old['hash'] == new['hash']:
+    return
+
+  yield from diff_children(old, new, old['roots'], new['roots'])
+
+
+def diff_children(
+  old: Manifest,
+  new: Manifest,
+  old_ids: list[str],
+  new_ids: list[str],
+) -> Generator[ResourceDiff]:
+  for resource_id in new_ids:
+    if resource_id not in old['resources']:
+      yield from diff_subtree(new, resource_id, 'added')
+    else:
+      yield from diff_resource(old, new, resource_id)
+
+  for resource_id in old_ids:
+    if resource_id not in new['resources']:
+      yield from diff_subtree(old, resource_id, 'removed')
+
+
+def diff_resource(
+  old: Manifest, new: Manifest, resource_id: str
+) -> Generator[ResourceDiff]:
+  old_entry = old['resources'][resource_id]
+  new_entry = new['resources'][resource_id]
+  if old_entry['tree'] == new_entry['tree']:
+    return
+
+  if old_entry['hash'] != new_entry['hash']:
+    yield ResourceDiff(
+      resource_id,
+      'changed',
+      list(diff_sections(old_entry['sections'], new_entry['sections'])),
+    )
+
+  yield from diff_children(old, new, old_entry['children'], new_entry['children'])
+
+
+def diff_sections(
+  old: dict[str, str], new: dict[str, str]
+) -> Generator[tuple[str, str]]:
+  for anchor, value in new.items():
+    if anchor not in old:
+      yield anchor, 'added'
+    elif old[anchor] != value:
+      yield anchor, 'changed'
+
+  for anchor in old:
+    if anchor not in new:
+      yield anchor, 'removed'
+
+
+def diff_subtree(
+  manifest: Manifest, resource_id: str, status: str
+) -> Generator[ResourceDiff]:
+  entry = manifest['resources'].get(resource_id)
+  if entry is None:
+    return
+
+  yield ResourceDiff(resource_id, status, [])
+  for child_id in entry['children']:
+    yield from diff_subtree(manifest, child_id, status)
+
+
+DIFF_MARKERS: dict[str, str] = {
+  'added': '+',
+  'removed': '-',
+  'changed': '~',
+}
+
+
+def print_diff(diffs: Iterable[ResourceDiff]):
+  for diff in diffs:
+    print(f'{DIFF_MARKERS[diff.status]} {diff.resource_id}')
+    for anchor, status in diff.sections:
+      print(f'    {DIFF_MARKERS[status]} {anchor or "(top)"}')
@@ -0,0 +1,106 @@
+import json
+import pathlib
+from collections.abc import Iterable
+from typing import Literal, TypedDict
+
+from . import merkle, util
+
+NARRATIONS_VERSION = 1
+
+
+class NarrationEntry(TypedDict):
+  url: str
+  hash: str
+  content: str
+
+
+class NarrationStore(TypedDict):
+  version: int
+  narrations: dict[str, NarrationEntry]
+
+
+class NarrationChange(TypedDict):
+  id: str
+  status: Literal['added', 'changed', 'removed']
+  url: str
+  hash: str
+  content: str | None
+
+
+class NarrationFeed(TypedDict):
+  version: int
+  changes: list[NarrationChange]
+
+
+# Hashes of narrations already in `hashes` are taken from it, the others are
+# added to it
+def build_store(
+  items: Iterable[util.NarrationItem], hashes: dict[str, str] | None = None
+):
+  hashes = {} if hashes is None else hashes
+  narrations = dict[str, NarrationEntry]()
+  for item in items:
+    content_hash = hashes.get(item.narration_id)
+    if content_hash is None:
+      content_hash = hashes[item.narration_id] = merkle.hash_values((item.content,))
+    narrations[item.narration_id] = NarrationEntry(
+      url=item.url,
+      hash=content_hash,
+      content=item.content,
+    )
+  return NarrationStore(version=NARRATIONS_VERSION, narrations=narrations)
+
+
+def read_store(path: pathlib.Path) -> NarrationStore:
+  with path.open() as f:
+    store: NarrationStore = json.load(f)
+
+  if store.get('version') != NARRATIONS_VERSION:
+    raise ValueError(f'{path}: unsupported narrations version {store.get("version")}')
+
+  return store
+
+
+# Only the text is compared, a narration that has moved to another anchor
+# doesn't need to be recorded again
+def diff_stores(old: NarrationStore | None, new: NarrationStore):
+  old_narrations = old['narrations'] if old else {}
+  changes = list[NarrationChange]()
+  for narration_id, entry in new['narrations'].items():
+    old_entry = old_narrations.get(narration_id)
+    if old_entry is None or old_entry['hash'] != entry['hash']:
+      changes.append(
+        NarrationChange(
+          id=narration_id,
+          status='added' if old_entry is None else 'changed',
+          url=entry['url'],
+          hash=entry['hash'],
+          content=entry['content'],
+        )
+      )
+
+  for narration_id, entry in old_narrations.items():
+    if narration_id not in new['narrations']:
+      changes.append(
+        NarrationChange(
+          id=narration_id,
+          status='removed',
+          url=entry['url'],
+          hash=entry['hash'],
+          content=None,
+        )
+      )
+
+  return NarrationFeed(version=NARRATIONS_VERSION, changes=changes)
+
+
+def summary(feed: NarrationFeed):
+  counts = {status: 0 for status in ('added', 'changed', 'removed')}
+  for change in feed['changes']:
+    counts[change['status']] += 1
+  return ', '.join(f'{count} {status}' for status, count in counts.items())
+
+
+def print_feed(feed: NarrationFeed):
+  for change in feed['changes']:
+    print(f'{merkle.DIFF_MARKERS[change["status"]]} {change["id"]}')
@@ -0,0 +1,90 @@
+from collections.abc import Generator
+from typing import NamedTuple
+
+from lxml.html import HtmlElement
+
+from . import profiles, util
+
+
+class NavItem(NamedTuple):
+  title: str
+  url: str
+  # None when the category is collapsed and its items were not rendered
+  items: list['NavItem'] | None
+
+
+class NavEntry(NamedTuple):
+  resource_id: str
+  title: str
+  items: list[tuple[str, str, str]] | None
+
+
+def parse_sidebar(tree: HtmlElement, layout: profiles.SiteLayout) -> list[NavItem]:
+  return [
+    item
+    for nav_list in tree.xpath(layout.sidebar_list)
+    for item in parse_sidebar_list(nav_list, layout)
+  ]
+
+
+def parse_sidebar_list(
+  nav_list: HtmlElement, layout: profiles.SiteLayout
+) -> Generator[NavItem]:
+  for li in nav_list.xpath(layout.sidebar_items):
+    link = next(iter(li.xpath(layout.sidebar_item_link)), None)
+    if link is None:
+      continue
+
+    sublist = next(iter(li.xpath(layout.sidebar_item_list)), None)
+    yield NavItem(
+      link.text or '',
+      util.clean_url(link.get('href', '')),
+      (
+        list(parse_sidebar_list(sublist, layout))
+        if sublist is not None
+        # Links are pages, a category without its list is collapsed
+        else None
+        if li.xpath(layout.sidebar_item_category)
+        else []
+      ),
+    )
+
+
+# Docusaurus renders the whole sidebar on every page, but only expands the
+# categories above the current page. Merging the sidebars of the pages that
+# have been read fills in the collapsed categories as they are expanded.
+class NavIndex:
+  entries: dict[str, NavEntry]
+
+  def __init__(self):
+    self.entries = {}
+
+  def merge(self, items: list[NavItem], parent_id: str = ''):
+    for title, url, subitems in items:
+      item_id = util.to_id(title)
+      resource_id = f'{parent_id}/{item_id}' if parent_id else item_id
+      old = self.entries.get(url)
+      self.entries[url] = NavEntry(
+        resource_id,
+        title,
+        (
+          [(util.to_id(item.title), item.title, item.url) for item in subitems]
+          if subitems is not None
+          else old.items
+          if old
+          else None
+        ),
+      )
+      if subitems:
+        self.merge(subitems, resource_id)
+
+  def known(self, url: str):
+    entry = self.entries.get(url)
+    return entry is not None and entry.items is not None
+
+  def get(self, url: str):
+    entry = self.entries.get(url)
+    if entry is None or entry.items is None:
+      raise ValueError(f'{url} is not in the sidebar')
+
+    return entry
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import pathlib
+import pickle
+import threading
+from typing import Any, NamedTuple
+
+from . import util
+
+# Bump when a change to the parser or the annotation rules should invalidate
+# pages parsed by an older build. The source of the parsing modules is hashed
+# into the key as well, so this only matters for changes outside them.
+PARSER_VERSION = 1
+
+
+class ParsedPage(NamedTuple):
+  page: util.Page
+  stats: dict[str, Any]
+  # Narration ids are numbered per resource, so a page can only be reused
+  # when it would start from the same number
+  narrations: tuple[int, int]
+
+
+# Pages are parsed relative to the site's base url and with its layout, so
+# both are part of the version as well
+def parser_version(base_url: str, layout: str, paths: list[pathlib.Path]):
+  h = hashlib.blake2b(
+    f'{PARSER_VERSION}\0{base_url}\0{layout}'.encode(), digest_size=16
+  )
+  for path in paths:
+    h.update(path.read_bytes())
+  return h.hexdigest()
+
+
+class PageCache:
+  directory: pathlib.Path
+  version: str
+
+  hits: int
+  misses: int
+
+  def __init__(self, directory: pathlib.Path, version: str):
+    self.directory = directory
+    self.version = version
+
+    self.hits = 0
+    self.misses = 0
+
+  def key(self, html: str):
+    h = hashlib.blake2b(self.version.encode('ascii'), digest_size=20)
+    h.update(html.encode('utf8'))
+    return h.hexdigest()
+
+  def path(self, key: str):
+    return self.directory / key[:2] / f'{key}.pickle'
+
+  def get(self, key: str) -> ParsedPage | None:
+    try:
+      with self.path(key).open('rb') as f:
+        return pickle.load(f)
+    except FileNotFoundError:
+      return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+      print(f'ignoring parsed page {key}: {e}')
+      return None
+
+  def put(self, key: str, parsed: ParsedPage):
+    path = self.path(key)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    # Sites built at the same time can put the same page
+    tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+    with tmp.open('wb') as f:
+      pickle.dump(parsed, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from collections.abc import (
+  AsyncGenerator,
+  AsyncIterable,
+  AsyncIterator,
+  Callable,
+  Iterable,
+)
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+
+
+class StageStats(TypedDict):
+  workers: int
+  items: int
+  busy: float
+  # Share of the run the stage's workers spent working
+  utilization: float
+
+
+class Stage[T, R]:
+  name: str
+  fn: Callable[[T], R]
+  workers: int
+  executor: ThreadPoolExecutor
+
+  lock: threading.Lock
+  items: int
+  busy: float
+
+  def __init__(self, name: str, fn: Callable[[T], R], workers: int = 1):
+    self.name = name
+    self.fn = fn
+    self.workers = workers
+    self.executor = ThreadPoolExecutor(workers, thread_name_prefix=name)
+
+    self.lock = threading.Lock()
+    self.items = 0
+    self.busy = 0.0
+
+  def call(self, item: T) -> R:
+    start = time.perf_counter()
+    try:
+      return self.fn(item)
+    finally:
+      elapsed = time.perf_counter() - start
+      with self.lock:
+        self.items += 1
+        self.busy += elapsed
+
+  async def submit(self, item: T) -> R:
+    return await asyncio.get_running_loop().run_in_executor(
+      self.executor, self.call, item
+    )
+
+  def stats(self, wall: float):
+    return StageStats(
+      workers=self.workers,
+      items=self.items,
+      busy=round(self.busy, 3),
+      utilization=round(self.busy / (wall * self.workers), 4) if wall else 0.0,
+    )
+
+  def close(self):
+    self.executor.shutdown(cancel_futures=True)
+
+
+async def iterate[T](items: Iterable[T]) -> AsyncIterator[T]:
+  for item in items:
+    yield item
+
+
+# Runs a stage over items and yields the results in the order of the items.
+# At most queue_size items are queued or running, so a slow consumer holds
+# the stage back instead of letting results pile up.
+async def ordered[T, R](
+  stage: Stage[T, R], items: AsyncIterable[T], queue_size: int
+) -> AsyncGenerator[R]:
+  queue = asyncio.Queue[asyncio.Future[R] | None](queue_size)
+
+  async def produce():
+    async for item in items:
+      await queue.put(asyncio.ensure_future(stage.submit(item)))
+    await queue.put(None)
+
+  producer = asyncio.create_task(produce())
+  try:
+    while (future := await queue.get()) is not None:
+      yield await future
+    await producer
+  finally:
+    producer.cancel()
+    while not queue.empty():
+      if future := queue.get_nowait():
+        future.cancel()
+
+
+# Holds items back until everything they depend on has been added
+class Dependencies[K]:
+  waiting: dict[K, set[K]]
+  dependents: dict[K, list[K]]
+  added: set[K]
+
+  def __init__(self):
+    self.waiting = {}
+    self.dependents = {}
+    self.added = set()
+
+  # The items that are ready now, the new one first if it is
+  def add(self, key: K, dependencies: Iterable[K]):
+    self.added.add(key)
+    waiting = set(dependencies) - self.added
+    self.waiting[key] = waiting
+    for dependency in waiting:
+      self.dependents.setdefault(dependency, []).append(key)
+
+    ready = [key] if not waiting else []
+    for dependent in self.dependents.pop(key, []):
+      self.waiting[dependent].discard(key)
+      if not self.waiting[dependent]:
+        ready.append(dependent)
+    for ready_key in ready:
+      del self.waiting[ready_key]
+    return ready
+
+
+def print_stats(stats: dict[str, StageStats], wall: float):
+  print(
+    f'pipeline: {wall:.2f}s, '
+    + ', '.join(
+      f'{name} {stage["utilization"]:.0%} of {stage["workers"]}'
+      for name, stage in stats.items()
+    )
+  )
@@ -0,0 +1,124 @@
+import json
+import pathlib
+from dataclasses import dataclass, field, fields
+from typing import Any
+from urllib.parse import urlparse
+
+from . import constants
+
+
+# How to read a site: where its content and sidebar are and what its classes
+# and icon glyphs mean
+@dataclass
+class SiteLayout:
+  section_markdown: str = constants.SECTION_MARKDOWN
+  sidebar_list: str = constants.SIDEBAR_LIST
+  sidebar_items: str = constants.SIDEBAR_ITEMS
+  sidebar_item_link: str = constants.SIDEBAR_ITEM_LINK
+  sidebar_item_list: str = constants.SIDEBAR_ITEM_LIST
+  sidebar_item_category: str = constants.SIDEBAR_ITEM_CATEGORY
+  page_title: str = constants.PAGE_TITLE
+  anchor_class: str = constants.CLASS_ANCHOR
+  text_colors: dict[str, str] = field(
+    default_factory=lambda: dict(constants.CSS_TEXT_COLORS)
+  )
+  icon_colors: dict[str, str] = field(
+    default_factory=lambda: dict(constants.CSS_ICON_COLORS)
+  )
+  highlight_colors: dict[str, str] = field(
+    default_factory=lambda: dict(constants.CSS_HIGHLIGHT_COLORS)
+  )
+  icon_names: dict[str, str] = field(
+    default_factory=lambda: dict(constants.RANGER_ICON_NAMES)
+  )
+  replace_tag: dict[str, str] = field(
+    default_factory=lambda: dict(constants.REPLACE_TAG)
+  )
+
+
+# What to crawl and where to put it
+@dataclass
+class SiteProfile:
+  name: str
+  base_url: str
+  page_urls: list[str]
+  title: str = constants.SITE_TITLE
+  layout: SiteLayout = field(default_factory=SiteLayout)
+  output_dir: pathlib.Path = pathlib.Path('output')
+  log_dir: pathlib.Path = pathlib.Path('log')
+  cache_dir: pathlib.Path = pathlib.Path('cache')
+  icons_dir: pathlib.Path = pathlib.Path('icons')
+
+
+DEFAULT_PROFILE = SiteProfile('living_valley', constants.BASE_URL, constants.PAGE_URLS)
+
+LAYOUT_FIELDS = {f.name for f in fields(SiteLayout)}
+PROFILE_FIELDS = {f.name for f in fields(SiteProfile)}
+PATH_FIELDS = ('output_dir', 'log_dir', 'cache_dir', 'icons_dir')
+
+
+# Pages are cached by path, so every host gets its own directory. The
+# default site's stay where they have always been.
+def default_cache_dir(base_url: str):
+  host = urlparse(base_url).netloc
+  if host == urlparse(DEFAULT_PROFILE.base_url).netloc:
+    return DEFAULT_PROFILE.cache_dir
+  return DEFAULT_PROFILE.cache_dir / host.replace(':', '_')
+
+
+def read_profile(data: dict[str, Any]):
+  if unknown := set(data) - PROFILE_FIELDS:
+    raise ValueError(f'unknown profile fields: {", ".join(sorted(unknown))}')
+  if unknown := set(data.get('layout', {})) - LAYOUT_FIELDS:
+    raise ValueError(f'unknown layout fields: {", ".join(sorted(unknown))}')
+
+  if 'name' not in data:
+    raise ValueError('profile without a name')
+
+  name = data['name']
+  base_url = data.get('base_url', DEFAULT_PROFILE.base_url)
+  # Another site's title isn't ours, its name is the best there is
+  default_title = (
+    DEFAULT_PROFILE.title if base_url == DEFAULT_PROFILE.base_url else name
+  )
+  site_dir = pathlib.Path('sites', name)
+  paths = {
+    'output_dir': site_dir / 'output',
+    'log_dir': site_dir / 'log',
+    'cache_dir': default_cache_dir(base_url),
+    'icons_dir': DEFAULT_PROFILE.icons_dir,
+  }
+  paths.update({key: pathlib.Path(data[key]) for key in PATH_FIELDS if key in data})
+  return SiteProfile(
+    name,
+    base_url,
+    list(data.get('page_urls', DEFAULT_PROFILE.page_urls)),
+    data.get('title', default_title),
+    # A map replaces the default one whole, another site's classes have
+    # nothing to do with ours
+    SiteLayout(**data.get('layout', {})),
+    **paths,
+  )
+
+
+def read_profiles(path: pathlib.Path):
+  with path.open() as f:
+    data = json.load(f)
+
+  if not isinstance(data, dict) or 'profiles' not in data:
+    raise ValueError(f'{path}: no profiles')
+
+  try:
+    profiles = [read_profile(profile) for profile in data['profiles']]
+  except (TypeError, ValueError) as e:
+    raise ValueError(f'{path}: {e}') from e
+
+  for key in ('name', 'output_dir', 'log_dir'):
+    seen = set[Any]()
+    for profile in profiles:
+      value = getattr(profile, key)
+      if value in seen:
+        raise ValueError(f'{path}: more than one profile with {key} {value}')
+      seen.add(value)
+
+  return profiles
@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import deque
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, TypedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+THROTTLE_STATUSES = (429, 503)
+# Enough for percentiles, a watch would otherwise keep every latency forever
+LATENCY_SAMPLES = 1000
+
+
+class RateStats(TypedDict):
+  rate: float
+  queue_depth: int
+  max_queue_depth: int
+  requests: int
+  throttled: int
+  retries: int
+  latency: float
+  waited: float
+
+
+def parse_retry_after(value: str | None) -> float | None:
+  if not value:
+    return None
+
+  try:
+    return max(float(value), 0)
+  except ValueError:
+    pass
+
+  try:
+    date = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  return max((date - datetime.now(UTC)).total_seconds(), 0)
+
+
+# Token bucket shared by every request of a crawl. The rate grows by about
+# `increase` requests per second every second while responses are fast, and
+# is cut by `decrease` on a throttled response or when latency climbs past
+# `target_latency`.
+class RateController:
+  rate: float
+  min_rate: float
+  max_rate: float
+  burst: float
+  increase: float
+  decrease: float
+  target_latency: float
+
+  condition: threading.Condition
+  tokens: float
+  refilled_at: float
+  blocked_until: float
+  decreased_at: float
+
+  queue_depth: int
+  max_queue_depth: int
+  requests: int
+  throttled: int
+  # Requests sent again, by the adapter or by urllib3
+  retries: int
+  latency: float
+  latencies: deque[float]
+  waited: float
+
+  def __init__(
+    self,
+    rate: float = 4,
+    min_rate: float = 0.5,
+    max_rate: float = 32,
+    burst: float = 4,
+    increase: float = 1,
+    decrease: float = 0.5,
+    target_latency: float = 2,
+  ):
+    self.rate = rate
+    self.min_rate = min_rate
+    self.max_rate = max_rate
+    self.burst = burst
+    self.increase = increase
+    self.decrease = decrease
+    self.target_latency = target_latency
+
+    self.condition = threading.Condition()
+    self.tokens = burst
+    self.refilled_at = time.monotonic()
+    self.blocked_until = 0
+    self.decreased_at = 0
+
+    self.queue_depth = 0
+    self.max_queue_depth = 0
+    self.requests = 0
+    self.throttled = 0
+    self.retries = 0
+    self.latency = 0
+    self.latencies = deque(maxlen=LATENCY_SAMPLES)
+    self.waited = 0
+
+  def refill(self, now: float):
+    self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+    self.refilled_at = now
+
+  def acquire(self):
+    start = time.monotonic()
+    with self.condition:
+      self.queue_depth += 1
+      self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+      try:
+        while True:
+          now = time.monotonic()
+          self.refill(now)
+          if now >= self.blocked_until and self.tokens >= 1:
+            self.tokens -= 1
+            break
+
+          self.condition.wait(
+            max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+          )
+      finally:
+        self.queue_depth -= 1
+        self.waited += time.monotonic() - start
+
+  def slow_down(self, now: float, sent_at: float, factor: float):
+    # Only the first of a burst of responses to requests sent at the old rate
+    # counts, otherwise one overload would collapse the rate to the minimum
+    if sent_at >= self.decreased_at:
+      self.rate = max(self.min_rate, self.rate * factor)
+      self.decreased_at = now
+
+  def record(
+    self,
+    sent_at: float,
+    status: int,
+    latency: float,
+    retry_after: float | None,
+    retries: int = 0,
+  ):
+    with self.condition:
+      now = time.monotonic()
+      self.requests += 1
+      self.retries += retries
+      self.latency = (
+        latency if self.requests == 1 else self.latency * 0.8 + latency * 0.2
+      )
+      self.latencies.append(latency)
+
+      if status in THROTTLE_STATUSES:
+        self.throttled += 1
+        self.slow_down(now, sent_at, self.decrease)
+        self.tokens = 0
+        self.blocked_until = max(
+          self.blocked_until,
+          now + (retry_after if retry_after is not None else 1 / self.rate),
+        )
+      elif self.latency > self.target_latency:
+        self.slow_down(now, sent_at, (1 + self.decrease) / 2)
+      else:
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+      self.condition.notify_all()
+
+  def stats(self):
+    with self.condition:
+      return RateStats(
+        rate=round(self.rate, 3),
+        queue_depth=self.queue_depth,
+        max_queue_depth=self.max_queue_depth,
+        requests=self.requests,
+        throttled=self.throttled,
+        retries=self.retries,
+        latency=round(self.latency, 3),
+        waited=round(self.waited, 3),
+      )
+
+
+class RateLimitedAdapter(HTTPAdapter):
+  controller: RateController
+  throttle_retries: int
+
+  def __init__(
+    self, controller: RateController, throttle_retries: int = 5, **kwargs: Any
+  ):
+    self.controller = controller
+    self.throttle_retries = throttle_retries
+    super().__init__(**kwargs)
+
+  def send(
+    self, request: requests.PreparedRequest, *args: Any, **kwargs: Any
+  ) -> requests.Response:
+    attempt = 0
+    while True:
+      self.controller.acquire()
+      sent_at = time.monotonic()
+      response = super().send(request, *args, **kwargs)
+      retry_after = parse_retry_after(response.headers.get('retry-after'))
+      # Server errors urllib3 already retried before this response
+      retried = getattr(response.raw, 'retries', None)
+      self.controller.record(
+        sent_at,
+        response.status_code,
+        time.monotonic() - sent_at,
+        retry_after,
+        len(retried.history if retried else ()) + (1 if attempt else 0),
+      )
+
+      attempt += 1
+      if (
+        response.status_code not in THROTTLE_STATUSES or attempt > self.throttle_retries
+      ):
+        return response
+
+      response.close()
+
+
+# 429 and 503 are retried by the adapter so the whole crawl slows down
+# instead of each request backing off on its own. urllib3 only retries
+# server errors, and would otherwise retry 429 and 503 itself whenever they
+# have a Retry-After header
+def new_adapter(controller: RateController):
+  return RateLimitedAdapter(
+    controller,
+    max_retries=Retry(
+      total=5,
+      backoff_factor=2,
+      status_forcelist=[500, 502, 504],
+      respect_retry_after_header=False,
+    ),
+  )
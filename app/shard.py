@@ -0,0 +1,58 @@
+import os
+import pathlib
+import pickle
+from collections.abc import Generator
+from typing import Any, NamedTuple
+
+from . import util
+
+SHARD_VERSION = 1
+
+
+class Shard(NamedTuple):
+  version: int
+  base_url: str
+  roots: list[str]
+  pages: list[util.Page]
+  stats: dict[str, Any]
+
+
+def write_shard(path: pathlib.Path, shard: Shard):
+  path.parent.mkdir(exist_ok=True, parents=True)
+  tmp = path.with_name(f'{path.name}.tmp')
+  with tmp.open('wb') as f:
+    pickle.dump(shard, f, pickle.HIGHEST_PROTOCOL)
+  os.replace(tmp, path)
+
+
+def read_shard(path: pathlib.Path) -> Shard:
+  with path.open('rb') as f:
+    shard: Shard = pickle.load(f)
+
+  if shard.version != SHARD_VERSION:
+    raise ValueError(f'{path}: unsupported shard version {shard.version}')
+
+  return shard
+
+
+def merge_stats(target: dict[str, Any], stats: dict[str, Any]):
+  for name, value in stats.items():
+    merged = target[name]
+    if isinstance(merged, set):
+      merged.update(value)
+    elif isinstance(merged, dict):
+      for key, item in value.items():
+        if isinstance(item, set):
+          merged.setdefault(key, set()).update(item)
+        else:
+          merged[key] = item
+
+
+def walk_pages(pages: dict[str, util.Page], url: str) -> Generator[util.Page]:
+  page = pages.get(url)
+  if page is None:
+    raise ValueError(f'no shard contains {url}')
+
+  yield page
+  for _, _, item_url in page.items:
+    yield from walk_pages(pages, item_url)
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from typing import NamedTuple, TypedDict
+
+from . import writer
+
+SNAPSHOT_VERSION = 1
+
+
+class FileEntry(TypedDict):
+  hash: str
+  size: int
+
+
+class Snapshot(TypedDict):
+  version: int
+  name: str
+  created: str
+  files: dict[str, FileEntry]
+
+
+class SnapshotInfo(NamedTuple):
+  name: str
+  created: str
+  files: int
+  size: int
+  # Bytes of blobs that the previous snapshot didn't have
+  added: int
+
+
+class GcStats(NamedTuple):
+  blobs: int
+  removed: int
+  freed: int
+
+
+def iter_files(root: pathlib.Path, pattern: str):
+  for path in sorted(root.rglob(pattern)):
+    if path.is_file() and not path.name.endswith('.tmp'):
+      yield path
+
+
+class SnapshotStore:
+  root: pathlib.Path
+  objects_dir: pathlib.Path
+  snapshots_dir: pathlib.Path
+
+  def __init__(self, root: pathlib.Path):
+    self.root = root
+    self.objects_dir = root / 'objects'
+    self.snapshots_dir = root / 'snapshots'
+
+  def blob(self, digest: str):
+    return self.objects_dir / digest[:2] / digest[2:]
+
+  def snapshot_path(self, name: str):
+    return self.snapshots_dir / f'{name}.json'
+
+  def put(self, data: bytes):
+    digest = hashlib.sha256(data).hexdigest()
+    blob = self.blob(digest)
+    if not blob.exists():
+      blob.parent.mkdir(exist_ok=True, parents=True)
+      tmp = blob.with_name(f'{blob.name}.tmp')
+      tmp.write_bytes(data)
+      # Blobs are shared by every snapshot and hardlinked into materialized
+      # trees, so they must never be written to
+      tmp.chmod(0o444)
+      os.replace(tmp, blob)
+
+    return FileEntry(hash=digest, size=len(data))
+
+  # Each source is a directory, the prefix its files are stored under and a
+  # glob of the files to keep
+  def save(
+    self, sources: Iterable[tuple[str, pathlib.Path, str]], name: str | None = None
+  ):
+    now = datetime.now(UTC)
+    name = name or now.strftime('%Y%m%dT%H%M%SZ')
+    path = self.snapshot_path(name)
+    if path.exists():
+      raise ValueError(f'snapshot {name} already exists')
+
+    files = dict[str, FileEntry]()
+    for prefix, root, pattern in sources:
+      for file in iter_files(root, pattern):
+        files[f'{prefix}/{file.relative_to(root).as_posix()}'] = self.put(
+          file.read_bytes()
+        )
+
+    snapshot = Snapshot(
+      version=SNAPSHOT_VERSION,
+      name=name,
+      created=now.isoformat(),
+      files=files,
+    )
+    # The snapshot is only written once all of its blobs are, so an
+    # interrupted save leaves nothing but blobs for gc to collect
+    self.snapshots_dir.mkdir(exist_ok=True, parents=True)
+    tmp = path.with_name(f'{path.name}.tmp')
+    tmp.write_bytes(writer.encode_json(snapshot, indent=None))
+    os.replace(tmp, path)
+    return snapshot
+
+  def read(self, name: str) -> Snapshot:
+    path = self.snapshot_path(name)
+    if not path.exists():
+      raise ValueError(f'no snapshot named {name}')
+
+    snapshot: Snapshot = json.loads(path.read_text('utf8'))
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+      raise ValueError(
+        f'{path}: unsupported snapshot version {snapshot.get("version")}'
+      )
+
+    return snapshot
+
+  def names(self):
+    if not self.snapshots_dir.exists():
+      return []
+
+    return sorted(path.stem for path in self.snapshots_dir.glob('*.json'))
+
+  def snapshots(self):
+    return sorted(
+      (self.read(name) for name in self.names()),
+      key=lambda x: (x['created'], x['name']),
+    )
+
+  def history(self):
+    seen = set[str]()
+    infos = list[SnapshotInfo]()
+    for snapshot in self.snapshots():
+      entries = snapshot['files'].values()
+      hashes = {entry['hash']: entry['size'] for entry in entries}
+      infos.append(
+        SnapshotInfo(
+          name=snapshot['name'],
+          created=snapshot['created'],
+          files=len(entries),
+          size=sum(entry['size'] for entry in entries),
+          added=sum(size for digest, size in hashes.items() if digest not in seen),
+        )
+      )
+      seen = set(hashes)
+    return infos
+
+  def materialize(self, name: str, target: pathlib.Path):
+    snapshot = self.read(name)
+    if target.exists() and any(target.iterdir()):
+      raise ValueError(f'{target} is not empty')
+
+    linked = True
+    for file, entry in snapshot['files'].items():
+      path = target / file
+      path.parent.mkdir(exist_ok=True, parents=True)
+      blob = self.blob(entry['hash'])
+      # Hardlinks need the target on the same filesystem as the store, else
+      # fall back to copying, which is copy-on-write where the os supports it
+      if linked:
+        try:
+          path.hardlink_to(blob)
+          continue
+        except OSError:
+          linked = False
+      shutil.copyfile(blob, path)
+
+    return snapshot
+
+  def remove(self, name: str):
+    self.read(name)
+    self.snapshot_path(name).unlink()
+
+  def gc(self):
+    referenced = {
+      entry['hash']
+      for snapshot in self.snapshots()
+      for entry in snapshot['files'].values()
+    }
+
+    blobs = removed = freed = 0
+    if not self.objects_dir.exists():
+      return GcStats(blobs, removed, freed)
+
+    for directory in sorted(self.objects_dir.iterdir()):
+      for blob in sorted(directory.iterdir()):
+        if f'{directory.name}{blob.name}' in referenced:
+          blobs += 1
+          continue
+
+        removed += 1
+        freed += blob.stat().st_size
+        blob.unlink()
+      if not any(directory.iterdir()):
+        directory.rmdir()
+
+    return GcStats(blobs, removed, freed)
+
+
+def print_history(infos: list[SnapshotInfo]):
+  for info in infos:
+    print(
+      f'{info.name}  {info.created}  {info.files} files  {info.size:,} bytes  +{info.added:,} new'
+    )
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import time
+from collections.abc import Iterable
+from typing import Any, BinaryIO, NamedTuple
+
+from . import util
+
+
+def encode_record(obj: Any):
+  return (
+    json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf8') + b'\n'
+  )
+
+
+# Newline delimited JSON, flushed after every record so a reader on the other
+# end of a pipe or FIFO sees each record as soon as it is written
+class RecordStream:
+  path: str
+  # Open inside the with block
+  f: BinaryIO | None
+
+  started_at: float
+  first_at: float | None
+  records: int
+
+  def __init__(self, path: str):
+    self.path = path
+    self.started_at = time.perf_counter()
+    self.first_at = None
+    self.records = 0
+    self.f = None
+
+  def __enter__(self):
+    # Opening a FIFO blocks until there is a reader
+    self.f = sys.stdout.buffer if self.path == '-' else open(self.path, 'wb')
+    return self
+
+  def __exit__(self, *exc: object):
+    f, self.f = self.f, None
+    if f is not None and f is not sys.stdout.buffer:
+      try:
+        f.close()
+      except BrokenPipeError:
+        pass
+
+  def write(self, record: dict[str, Any]):
+    if self.f is None:
+      raise ValueError(f'{self.path}: stream is not open')
+    try:
+      self.f.write(encode_record(record))
+      self.f.flush()
+    except BrokenPipeError:
+      # Python flushes stdout again on exit, which would fail the same way
+      if self.f is sys.stdout.buffer:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+      raise
+    if self.first_at is None:
+      self.first_at = time.perf_counter()
+    self.records += 1
+
+  def summary(self):
+    total = (time.perf_counter() - self.started_at) * 1000
+    first = (
+      (self.first_at - self.started_at) * 1000 if self.first_at is not None else total
+    )
+    return f'streamed {self.records} records, first after {first:.1f}ms, last after {total:.1f}ms'
+
+
+class WaitingPage(NamedTuple):
+  page: util.Page
+  links: set[str]
+  group: bool
+
+
+# A resource is held back until every page it links to has been loaded, and
+# a group page until the whole group has, so each record is the same as the
+# file a full build would write
+class ResourceQueue:
+  pages: dict[str, util.Page]
+  waiting: dict[str, WaitingPage]
+
+  def __init__(self):
+    self.pages = {}
+    self.waiting = {}
+
+  def loaded(self, url: str) -> bool:
+    page = self.pages.get(url)
+    return page is not None and all(
+      self.loaded(item_url) for _, _, item_url in page.items
+    )
+
+  def ready(self, waiting: WaitingPage):
+    if waiting.group and not self.loaded(waiting.page.url):
+      return False
+    return waiting.links <= self.pages.keys()
+
+  # The pages that can be written now, in the order they were loaded
+  def add(self, page: util.Page, links: Iterable[str], group: bool):
+    self.pages[page.url] = page
+    self.waiting[page.url] = WaitingPage(page, set(links), group)
+    ready = [url for url, waiting in self.waiting.items() if self.ready(waiting)]
+    return [self.waiting.pop(url).page for url in ready]
+
+  # Whatever is left links to something that is not a page
+  def rest(self):
+    pages = [waiting.page for waiting in self.waiting.values()]
+    self.waiting.clear()
+    return pages
@@ -0,0 +1,211 @@
+import hashlib
+import io
+import json
+import os
+import pathlib
+import zipfile
+from collections.abc import Iterable, Mapping
+from typing import Literal, TypedDict
+
+from . import merkle, writer
+
+SYNC_VERSION = 1
+SYNC_DIR = 'sync'
+PATCH_NAME = 'patch.json'
+# Fixed so the same changes always make the same archive
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class SyncFile(TypedDict):
+  hash: str
+  size: int
+
+
+class SyncManifest(TypedDict):
+  version: int
+  hash: str
+  files: dict[str, SyncFile]
+
+
+class SyncChange(TypedDict):
+  path: str
+  status: Literal['added', 'changed', 'removed']
+  # The hash the local file must have before and will have after the change
+  old: str | None
+  hash: str | None
+  size: int
+
+
+class SyncPatch(TypedDict):
+  version: int
+  # Manifest hashes
+  old: str | None
+  new: str
+  size: int
+  changes: list[SyncChange]
+
+
+def build_manifest(files: Mapping[str, SyncFile]):
+  files = dict(sorted(files.items()))
+  return SyncManifest(
+    version=SYNC_VERSION,
+    hash=merkle.hash_values(f'{path}={entry["hash"]}' for path, entry in files.items()),
+    files=files,
+  )
+
+
+# A full build writes every file, an in place rebuild only the ones that
+# changed, the rest are carried over from the previous manifest
+def written_manifest(output: writer.OutputWriter, old: SyncManifest | None):
+  files = dict(old['files']) if old and output.in_place else {}
+  for path in output.removed:
+    files.pop(path, None)
+  for path, entry in output.written.items():
+    if not path.startswith(f'{SYNC_DIR}/'):
+      files[path] = SyncFile(hash=entry.hash, size=entry.size)
+  return build_manifest(files)
+
+
+def read_manifest(path: pathlib.Path) -> SyncManifest:
+  with path.open() as f:
+    manifest: SyncManifest = json.load(f)
+
+  if manifest.get('version') != SYNC_VERSION:
+    raise ValueError(
+      f'{path}: unsupported sync manifest version {manifest.get("version")}'
+    )
+
+  return manifest
+
+
+def diff_manifests(old: SyncManifest | None, new: SyncManifest):
+  old_files = old['files'] if old else {}
+  changes = list[SyncChange]()
+  for path, entry in new['files'].items():
+    old_entry = old_files.get(path)
+    if old_entry is None or old_entry['hash'] != entry['hash']:
+      changes.append(
+        SyncChange(
+          path=path,
+          status='added' if old_entry is None else 'changed',
+          old=old_entry['hash'] if old_entry else None,
+          hash=entry['hash'],
+          size=entry['size'],
+        )
+      )
+
+  for path, entry in old_files.items():
+    if path not in new['files']:
+      changes.append(
+        SyncChange(path=path, status='removed', old=entry['hash'], hash=None, size=0)
+      )
+
+  return SyncPatch(
+    version=SYNC_VERSION,
+    old=old['hash'] if old else None,
+    new=new['hash'],
+    size=sum(change['size'] for change in changes),
+    changes=changes,
+  )
+
+
+def summary(patch: SyncPatch):
+  counts = {status: 0 for status in ('added', 'changed', 'removed')}
+  for change in patch['changes']:
+    counts[change['status']] += 1
+  return (
+    ', '.join(f'{count} {status}' for status, count in counts.items())
+    + f', {patch["size"]:,} bytes'
+  )
+
+
+def zip_entry(name: str):
+  return zipfile.ZipInfo(name, ZIP_DATE_TIME)
+
+
+# The patch and the content of every added or changed file
+def build_delta(patch: SyncPatch, root: pathlib.Path):
+  buffer = io.BytesIO()
+  with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+    archive.writestr(zip_entry(PATCH_NAME), writer.encode_json(patch))
+    for change in patch['changes']:
+      if change['hash']:
+        archive.writestr(
+          zip_entry(change['path']), (root / change['path']).read_bytes()
+        )
+  return buffer.getvalue()
+
+
+def file_hash(path: pathlib.Path):
+  return hashlib.sha256(path.read_bytes()).hexdigest() if path.exists() else None
+
+
+def select(changes: Iterable[SyncChange], prefix: str):
+  for change in changes:
+    if change['path'].startswith(prefix):
+      yield change['path'].removeprefix(prefix), change
+
+
+# The local file a path from a manifest or delta stands for, None when the
+# path would lead out of the local copy
+def local_path(local: pathlib.Path, name: str):
+  root = local.resolve()
+  path = (root / name).resolve()
+  if path == root or not path.is_relative_to(root):
+    return None
+  return path
+
+
+def apply_delta(local: pathlib.Path, delta: pathlib.Path, prefix: str = ''):
+  with zipfile.ZipFile(delta) as archive:
+    patch: SyncPatch = json.loads(archive.read(PATCH_NAME))
+    if patch.get('version') != SYNC_VERSION:
+      raise ValueError(
+        f'{delta}: unsupported sync patch version {patch.get("version")}'
+      )
+
+    # Every file is checked before any is touched, a file that already has
+    # its new content is skipped, so an interrupted sync can be run again
+    pending = list[tuple[pathlib.Path, SyncChange]]()
+    for name, change in select(patch['changes'], prefix):
+      path = local_path(local, name)
+      if path is None:
+        raise ValueError(f'{delta}: {change["path"]} is outside of {local}')
+      current = file_hash(path)
+      if current == change['hash']:
+        continue
+      if current != change['old']:
+        raise ValueError(
+          f"{path}: local copy does not match the delta's previous version"
+        )
+      pending.append((path, change))
+
+    for path, change in pending:
+      if change['hash'] is None:
+        path.unlink()
+        continue
+
+      data = archive.read(change['path'])
+      if hashlib.sha256(data).hexdigest() != change['hash']:
+        raise ValueError(f'{delta}: {change["path"]} does not match its hash')
+
+      path.parent.mkdir(exist_ok=True, parents=True)
+      tmp = path.with_name(f'{path.name}.tmp')
+      tmp.write_bytes(data)
+      os.replace(tmp, path)
+
+  return patch, len(pending)
+
+
+def verify(local: pathlib.Path, manifest: SyncManifest, prefix: str = ''):
+  mismatched = list[str]()
+  for name, entry in manifest['files'].items():
+    if not name.startswith(prefix):
+      continue
+
+    path = local_path(local, name.removeprefix(prefix))
+    if path is None:
+      raise ValueError(f'{name} is outside of {local}')
+    if file_hash(path) != entry['hash']:
+      mismatched.append(name)
+  return mismatched
@@ -1,20 +1,31 @@
 import csv
-import json
+import io
+import os
 import pathlib
-from dataclasses import asdict, dataclass, fields
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field, fields, replace
 from typing import Any, NamedTuple, TypedDict
 from urllib.parse import urljoin, urlparse, urlunparse
 
 import requests
 from lxml import html
+from lxml.html import HtmlElement
 
-from . import tags
+from . import merkle, tags
 
-HTML_PARSER = html.HTMLParser(remove_blank_text=True, remove_comments=True)
+# lxml parsers can't be used by more than one thread at a time
+HTML_PARSERS = threading.local()
 
 
 def parse_html(content: str):
-  return html.fromstring(content, parser=HTML_PARSER)  # pyright: ignore[reportArgumentType]
+  parser = getattr(HTML_PARSERS, 'parser', None)
+  if parser is None:
+    parser = HTML_PARSERS.parser = html.HTMLParser(
+      remove_blank_text=True, remove_comments=True
+    )
+  return html.fromstring(content, parser=parser)  # pyright: ignore[reportArgumentType]
 
 
 def clean_url(url: str):
@@ -41,16 +52,36 @@ def iter_id(title: str):
       yield '_'
 
 
-def get_content(session: requests.Session, base_url: str, url: str):
-  file = pathlib.Path(f'./cache/{clean_url(url)}.html')
+def cache_path(cache_dir: pathlib.Path, url: str):
+  return cache_dir / f'{clean_url(url).lstrip("/")}.html'
+
+
+def cache_mtime(cache_dir: pathlib.Path, url: str):
+  try:
+    return cache_path(cache_dir, url).stat().st_mtime_ns
+  except FileNotFoundError:
+    return None
+
+
+def get_content(
+  session: requests.Session, base_url: str, cache_dir: pathlib.Path, url: str
+):
+  file = cache_path(cache_dir, url)
   if file.exists():
     return file.read_text('utf8')
 
   content_url = urljoin(base_url, url)
   print(f'fetching {content_url}...')
-  content = session.get(urljoin(base_url, url), timeout=30).text
+  response = session.get(content_url, timeout=30)
+  # Throttled or failed pages are never cached, they would be read back as
+  # the page from then on
+  response.raise_for_status()
+  content = response.text
   file.parent.mkdir(exist_ok=True, parents=True)
-  file.write_text(content, 'utf8')
+  # Sites on the same host share the cache, so another one may be reading it
+  tmp = file.with_name(f'{file.name}.{threading.get_ident()}.tmp')
+  tmp.write_text(content, 'utf8')
+  os.replace(tmp, file)
 
   return content
 
@@ -76,6 +107,46 @@ def rewrite_url(base_url: str, url: str, urls: dict[str, str]):
   )
 
 
+def replace_items[T: tags.TagWithItems[Any]](tag: T, items: list[tags.Tag[Any]]) -> T:
+  if len(items) == len(tag.items) and all(a is b for a, b in zip(items, tag.items)):
+    return tag
+
+  return replace(tag, items=items)
+
+
+# Replaces every tag modify returns a list for, without looking inside the
+# replacement, and rebuilds its parents. Subtrees skip is true for are kept
+# as they are. Unchanged tags are returned as they were.
+def map_items(
+  items: list[tags.Tag[Any]],
+  modify: Callable[[tags.Tag[Any]], list[tags.Tag[Any]] | None],
+  skip: Callable[[tags.Tag[Any]], bool],
+) -> list[tags.Tag[Any]]:
+  # [items, mapped items, parent]
+  root: tuple[Iterator[tags.Tag[Any]], list[tags.Tag[Any]], Any] = (
+    iter(items),
+    [],
+    None,
+  )
+  stack = [root]
+  while True:
+    children, mapped, parent = stack[-1]
+    item = next(children, None)
+    if item is None:
+      stack.pop()
+      if not stack:
+        return mapped
+      stack[-1][1].append(replace_items(parent, mapped))
+      continue
+
+    if (replacement := modify(item)) is not None:
+      mapped.extend(replacement)
+    elif isinstance(item, tags.TagWithItems) and not skip(item):
+      stack.append((iter(item.items), [], item))
+    else:
+      mapped.append(item)
+
+
 def get_color_for_class(classes: list[str], colors: dict[str, str]):
   return next(
     (
@@ -92,8 +163,17 @@ class Link(TypedDict):
   title: str
 
 
-def write_resource(
-  path: pathlib.Path,
+class Resource(TypedDict):
+  id: str
+  title: str
+  content: Any | None
+  anchors: list[Link]
+  links: list[Link]
+  lookup: list[Link]
+  url: str
+
+
+def resource(
   resource_id: str,
   title: str,
   content: Any | None,
@@ -102,24 +182,54 @@ def write_resource(
   lookup: list[Link],
   url: str,
 ):
-  write_json(
-    path,
-    {
-      'id': resource_id,
-      'title': title,
-      'content': content,
-      'anchors': anchors,
-      'links': links,
-      'lookup': lookup,
-      'url': url,
-    },
+  return Resource(
+    id=resource_id,
+    title=title,
+    content=content,
+    anchors=anchors,
+    links=links,
+    lookup=lookup,
+    url=url,
   )
 
 
-def write_json(path: pathlib.Path, obj: Any):
-  path.parent.mkdir(exist_ok=True, parents=True)
-  with path.open('w') as f:
-    json.dump(obj, f, indent=2)
+class ElementFrame(NamedTuple):
+  element: HtmlElement
+  tag: str
+  classes: list[str]
+  color: str | None
+  icon_color: str | None
+  items: list[tags.Tag[Any]]
+  children: Iterator[HtmlElement]
+
+
+class Page(NamedTuple):
+  url: str
+  resource_id: str
+  title: str
+  items: list[tuple[str, str, str]]
+  content: list[tags.Tag[Any]] | None
+
+
+@dataclass
+class SiteIndex:
+  urls: dict[str, str] = field(default_factory=dict[str, str])
+  titles: dict[str, str] = field(default_factory=dict[str, str])
+  resource_ids: dict[str, str] = field(default_factory=dict[str, str])
+  lookup: dict[str, list[Link]] = field(default_factory=dict[str, list[Link]])
+
+  def add(self, url: str, resource_id: str, title: str, lookup_group: str | None):
+    self.urls[url] = resource_id
+    self.titles[url] = title
+    self.resource_ids[resource_id] = title
+
+    if lookup_group and lookup_group != resource_id:
+      self.lookup.setdefault(lookup_group, []).append(
+        Link(
+          id=resource_id,
+          title=title,
+        )
+      )
 
 
 class Narration(NamedTuple):
@@ -128,6 +238,30 @@ class Narration(NamedTuple):
   tag: tags.TagBlockquote
 
 
+class Entity(NamedTuple):
+  kind: str
+  name: str
+  anchor: str | None
+  href: str | None
+
+
+class Occurrence(TypedDict):
+  id: str
+  # Every section it occurs in, None before the first title with an id
+  anchors: list[str | None]
+  count: int
+
+
+class EntryOccurrence(Occurrence):
+  target: str | None
+
+
+class Posting(NamedTuple):
+  kind: str
+  name: str
+  occurrence: Occurrence
+
+
 @dataclass
 class NarrationItem:
   narration_id: str
@@ -135,23 +269,45 @@ class NarrationItem:
   content: str
 
 
-def write_csv(path: pathlib.Path, items: list[NarrationItem]):
-  if not items:
-    return
-
-  path.parent.mkdir(exist_ok=True, parents=True)
-  with path.open('w') as f:
-    writer = csv.DictWriter(
-      f,
-      [
-        field.name  #
-        for field in fields(NarrationItem)
-      ],
-    )
-    writer.writeheader()
-    writer.writerows(
-      [
-        asdict(item)  #
-        for item in items
-      ]
-    )
+@dataclass
+class SiteBuild:
+  index: SiteIndex
+  manifest: merkle.ManifestBuilder = field(default_factory=merkle.ManifestBuilder)
+  # Pages as parsed, before their links are rewritten, in nav order
+  pages: dict[str, Page] = field(default_factory=dict[str, Page])
+  narrations: dict[str, list[NarrationItem]] = field(
+    default_factory=dict[str, list[NarrationItem]]
+  )
+  data: dict[tuple[str, str], Future[bytes] | bytes] = field(
+    default_factory=dict[tuple[str, str], Future[bytes] | bytes]
+  )
+  linked_by: dict[str, set[str]] = field(default_factory=dict[str, set[str]])
+  entities: dict[str, list[Entity]] = field(default_factory=dict[str, list[Entity]])
+  # What the catalog, autocomplete and narrations are built from, kept per
+  # page so a rebuild only redoes the pages it touched
+  anchors: dict[str, list[Link]] = field(default_factory=dict[str, list[Link]])
+  postings: dict[str, list[Posting]] = field(default_factory=dict[str, list[Posting]])
+  narration_hashes: dict[str, str] = field(default_factory=dict[str, str])
+
+
+def result(value: Future[bytes] | bytes):
+  return value.result() if isinstance(value, Future) else value
+
+
+def narrations_csv(items: list[NarrationItem]):
+  f = io.StringIO()
+  writer = csv.DictWriter(
+    f,
+    [
+      field.name  #
+      for field in fields(NarrationItem)
+    ],
+  )
+  writer.writeheader()
+  writer.writerows(
+    [
+      asdict(item)  #
+      for item in items
+    ]
+  )
+  return f.getvalue()
@@ -0,0 +1,104 @@
+import pathlib
+from collections.abc import Callable, Iterable, Mapping
+from typing import NamedTuple
+
+from . import merkle, nav, util
+
+
+# Pages whose cached html changed since they were last read
+class CacheWatcher:
+  cache_dir: pathlib.Path
+  mtimes: dict[str, int | None]
+
+  def __init__(self, cache_dir: pathlib.Path, urls: Iterable[str]):
+    self.cache_dir = cache_dir
+    self.reset(urls)
+
+  def reset(self, urls: Iterable[str]):
+    self.mtimes = {url: util.cache_mtime(self.cache_dir, url) for url in urls}
+
+  def changed(self):
+    return [
+      url
+      for url, mtime in self.mtimes.items()
+      if util.cache_mtime(self.cache_dir, url) != mtime
+    ]
+
+
+# Pages to load again: the changed ones, new ones and those the navigation
+# now gives another id or other items
+def reload_urls(
+  urls: Iterable[str],
+  changed: Iterable[str],
+  old_pages: Mapping[str, util.Page],
+  nav_index: nav.NavIndex,
+):
+  changed = set(changed)
+  reload = list[str]()
+  for url in urls:
+    old = old_pages.get(url)
+    entry = nav_index.get(url)
+    if (
+      url in changed
+      or old is None
+      or (entry.resource_id, entry.items) != (old.resource_id, old.items)
+    ):
+      reload.append(url)
+  return reload
+
+
+class PageChanges(NamedTuple):
+  # Pages to render again
+  affected: set[str]
+  # Urls to the resource id they had
+  moved: dict[str, str]
+  removed: dict[str, str]
+  lookup_groups: set[str]
+  # The order, ids or titles of the pages changed
+  index_changed: bool
+
+
+# A page whose html changed but parses the same, like one whose sidebar
+# lists a renamed page elsewhere, is left as it is
+def diff_pages(
+  old_pages: Mapping[str, util.Page],
+  pages: Mapping[str, util.Page],
+  reload: Iterable[str],
+  get_lookup_group: Callable[[str], str | None],
+):
+  affected = set[str]()
+  lookup_groups = set[str]()
+  moved = dict[str, str]()
+  for url in reload:
+    page = pages[url]
+    old = old_pages.get(url)
+    if (
+      old
+      and (page.resource_id, page.title, page.items)
+      == (old.resource_id, old.title, old.items)
+      and merkle.hash_items(page.content or []) == merkle.hash_items(old.content or [])
+    ):
+      continue
+
+    affected.add(url)
+    for resource_id in (page.resource_id, old.resource_id if old else None):
+      if resource_id and (lookup_group := get_lookup_group(resource_id)):
+        lookup_groups.add(lookup_group)
+    if old and page.resource_id != old.resource_id:
+      moved[url] = old.resource_id
+
+  removed = {
+    url: page.resource_id for url, page in old_pages.items() if url not in pages
+  }
+  for resource_id in removed.values():
+    if lookup_group := get_lookup_group(resource_id):
+      lookup_groups.add(lookup_group)
+
+  index_changed = (
+    list(old_pages) != list(pages)
+    or bool(moved)
+    or any(
+      pages[url].title != old_pages[url].title for url in affected if url in old_pages
+    )
+  )
+  return PageChanges(affected, moved, removed, lookup_groups, index_changed)
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import pathlib
+import queue
+import threading
+from collections.abc import Callable
+from shutil import rmtree
+from types import TracebackType
+from typing import Any, NamedTuple
+
+
+class WrittenFile(NamedTuple):
+  hash: str
+  size: int
+
+
+class OutputWriter:
+  root: pathlib.Path
+  in_place: bool
+  staging: pathlib.Path
+  previous: pathlib.Path
+
+  workers: int
+  tasks: queue.Queue[tuple[pathlib.Path, Callable[[], bytes]] | None]
+  threads: list[threading.Thread]
+
+  lock: threading.Lock
+  directories: set[pathlib.Path]
+  errors: list[BaseException]
+  files: int
+  # Every file written or removed, by its path relative to the root
+  written: dict[str, WrittenFile]
+  removed: set[str]
+
+  def __init__(
+    self,
+    root: pathlib.Path,
+    workers: int = 4,
+    queue_size: int = 256,
+    in_place: bool = False,
+  ):
+    self.root = root
+    self.in_place = in_place
+    # In place writes replace single files in an existing output, each one
+    # still atomically
+    self.staging = root if in_place else root.with_name(f'.{root.name}.partial')
+    self.previous = root.with_name(f'.{root.name}.previous')
+
+    self.workers = workers
+    self.tasks = queue.Queue(queue_size)
+    self.threads = []
+
+    self.lock = threading.Lock()
+    self.directories = set()
+    self.errors = []
+    self.files = 0
+    self.written = {}
+    self.removed = set()
+
+  def __enter__(self):
+    self.open()
+    return self
+
+  def __exit__(
+    self,
+    exc_type: type[BaseException] | None,
+    exc: BaseException | None,
+    traceback: TracebackType | None,
+  ):
+    if exc_type is None:
+      self.commit()
+    else:
+      self.abort()
+
+  def open(self):
+    # A previous run died between moving the old output aside and moving the
+    # new one into place
+    if not self.root.exists() and self.previous.exists():
+      self.previous.rename(self.root)
+
+    if self.in_place:
+      self.staging.mkdir(parents=True, exist_ok=True)
+    else:
+      rmtree(self.staging, ignore_errors=True)
+      rmtree(self.previous, ignore_errors=True)
+      self.staging.mkdir(parents=True)
+    self.directories.add(self.staging)
+
+    self.threads = [
+      threading.Thread(
+        target=self.worker,
+        name=f'writer_{self.root.name}_{i}',
+        daemon=True,
+      )
+      for i in range(self.workers)
+    ]
+    for thread in self.threads:
+      thread.start()
+
+  def submit(self, path: pathlib.PurePath, encode: Callable[[], bytes]):
+    with self.lock:
+      self.removed.discard(path.as_posix())
+    self.tasks.put((self.staging / path, encode))
+
+  def write_bytes(self, path: pathlib.PurePath, data: bytes):
+    self.submit(path, lambda: data)
+
+  def write_text(self, path: pathlib.PurePath, text: str):
+    self.submit(path, lambda: text.encode('utf8'))
+
+  def write_json(self, path: pathlib.PurePath, obj: Any):
+    self.submit(path, lambda: encode_json(obj))
+
+  # Files are only removed once the workers are joined, a write still in the
+  # queue could bring them back or need a directory that was pruned
+  def remove(self, path: pathlib.PurePath):
+    with self.lock:
+      name = path.as_posix()
+      self.written.pop(name, None)
+      self.removed.add(name)
+
+  def remove_files(self):
+    for name in sorted(self.removed):
+      path = self.staging / name
+      path.unlink(missing_ok=True)
+      directory = path.parent
+      while (
+        directory != self.staging
+        and directory.is_dir()
+        and not any(directory.iterdir())
+      ):
+        directory.rmdir()
+        self.directories.discard(directory)
+        directory = directory.parent
+      self.directories.add(directory)
+
+  def worker(self):
+    while (task := self.tasks.get()) is not None:
+      path, encode = task
+      try:
+        self.write_file(path, encode())
+      except BaseException as e:
+        with self.lock:
+          self.errors.append(e)
+      finally:
+        self.tasks.task_done()
+    self.tasks.task_done()
+
+  def ensure_directory(self, directory: pathlib.Path):
+    if directory in self.directories:
+      return
+
+    with self.lock:
+      if directory in self.directories:
+        return
+
+      directory.mkdir(parents=True, exist_ok=True)
+      while directory not in self.directories and directory != self.staging.parent:
+        self.directories.add(directory)
+        directory = directory.parent
+
+  def write_file(self, path: pathlib.Path, data: bytes):
+    self.ensure_directory(path.parent)
+    tmp = path.with_name(f'{path.name}.tmp')
+    with tmp.open('wb') as f:
+      f.write(data)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp, path)
+    entry = WrittenFile(hashlib.sha256(data).hexdigest(), len(data))
+    with self.lock:
+      self.files += 1
+      name = path.relative_to(self.staging).as_posix()
+      # Removed after it was submitted
+      if name not in self.removed:
+        self.written[name] = entry
+
+  # Waits for every file submitted so far to be written
+  def flush(self):
+    self.tasks.join()
+    if self.errors:
+      raise self.errors[0]
+
+  def join(self):
+    for _ in self.threads:
+      self.tasks.put(None)
+    for thread in self.threads:
+      thread.join()
+    self.threads = []
+
+  def commit(self):
+    self.join()
+    if self.errors:
+      if not self.in_place:
+        rmtree(self.staging, ignore_errors=True)
+      raise self.errors[0]
+
+    self.remove_files()
+    # Every file was synced when written, their directory entries have to be
+    # too before the staging directory takes the old output's place
+    self.sync_directories()
+    if self.in_place:
+      return
+
+    if self.root.exists():
+      self.root.rename(self.previous)
+    self.staging.rename(self.root)
+    fsync_directory(self.root.parent)
+    rmtree(self.previous, ignore_errors=True)
+
+  def sync_directories(self):
+    for directory in sorted(self.directories, key=lambda d: len(d.parts), reverse=True):
+      if directory.is_dir():
+        fsync_directory(directory)
+
+  def abort(self):
+    self.join()
+    if not self.in_place:
+      rmtree(self.staging, ignore_errors=True)
+
+
+def encode_json(obj: Any, indent: int | None = 2):
+  if indent is None:
+    return json.dumps(obj, separators=(',', ':')).encode('utf8')
+  return json.dumps(obj, indent=indent).encode('utf8')
+
+
+def fsync_directory(directory: pathlib.Path):
+  # Directories can't be opened on Windows, renames there are durable once
+  # they return
+  if os.name == 'nt':
+    return
+
+  fd = os.open(directory, os.O_RDONLY)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import pathlib
+import statistics
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import replace
+from functools import partial
+from typing import Any
+
+from app import binary, profiles
+from app.main import ContentType, IconType, Scraper
+
+from . import site
+from .server import MockSite, ServerConfig
+
+ICONS_DIR = pathlib.Path(__file__).parent.parent / 'icons'
+
+
+def build(site_url: str, roots: list[str], workdir: pathlib.Path):
+  workdir.mkdir(parents=True)
+  (workdir / 'icons').symlink_to(ICONS_DIR.resolve(), target_is_directory=True)
+  with (
+    contextlib.chdir(workdir),
+    open(os.devnull, 'w') as devnull,
+    contextlib.redirect_stdout(devnull),
+  ):
+    Scraper(
+      replace(profiles.DEFAULT_PROFILE, base_url=site_url, page_urls=roots),
+      IconType.ELEMENT,
+      [ContentType.JSON, ContentType.BINARY],
+    ).scrape()
+  return workdir / 'output'
+
+
+def json_text(items: list[dict[str, Any]]) -> str:
+  text = list[str]()
+  stack = list(reversed(items))
+  while stack:
+    item = stack.pop()
+    if item['type'] == 'text':
+      text.append(item['text'])
+    stack.extend(reversed(item.get('items', ())))
+  return ''.join(text)
+
+
+# What a client does to show one section: load the resource and find the
+# anchor's title among the top level tags
+def json_section(path: pathlib.Path, anchor_id: str):
+  with path.open() as f:
+    resource = json.load(f)
+  items = resource['content'] or []
+  start = next(i for i, item in enumerate(items) if f'#{item.get("id")}' == anchor_id)
+  return json_text(items[start : start + 2])
+
+
+def binary_section(path: pathlib.Path, anchor_id: str):
+  with binary.open_resource(path) as resource:
+    return ''.join(
+      resource.text(node) for node in itertools.islice(resource.section(anchor_id), 2)
+    )
+
+
+def json_full(path: pathlib.Path):
+  with path.open() as f:
+    return json.load(f)
+
+
+def binary_full(path: pathlib.Path):
+  with binary.open_resource(path) as resource:
+    return resource.content()
+
+
+def timeit(fn: Callable[[], Any], repeat: int):
+  times = list[float]()
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    times.append(time.perf_counter() - start)
+  return statistics.median(times)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    prog='bench.binary_read',
+    description='compare reading a section of the largest resources as JSON and as memory mapped binary',
+  )
+  parser.add_argument(
+    '--cache',
+    type=pathlib.Path,
+    help='serve the pages in a ./cache/ directory instead of a generated site',
+  )
+  parser.add_argument('--campaigns', type=int, default=2)
+  parser.add_argument('--missions', type=int, default=10, help='missions per campaign')
+  parser.add_argument('--glossary', type=int, default=20, help='rules glossary pages')
+  parser.add_argument('--sections', type=int, default=40, help='sections per page')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument(
+    '--pages', type=int, default=5, help='largest pages to read (default: 5)'
+  )
+  parser.add_argument('--repeat', type=int, default=50)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix='bench_binary_') as tmp:
+    if args.cache:
+      site_dir = args.cache.resolve()
+      roots = profiles.DEFAULT_PROFILE.page_urls
+    else:
+      site_dir = pathlib.Path(tmp, 'site')
+      roots = site.generate(
+        site_dir, args.campaigns, args.missions, args.glossary, args.sections, args.seed
+      )
+
+    with MockSite(site_dir, ServerConfig(latency=0, jitter=0)) as mock:
+      output = build(mock.base_url, roots, pathlib.Path(tmp, 'build'))
+
+    largest = sorted(
+      (output / 'data').rglob('*.json'),
+      key=lambda path: path.stat().st_size,
+      reverse=True,
+    )[: args.pages]
+
+    print(
+      f'{"resource":<40} {"json KB":>8} {"bin KB":>7} {"nodes":>6}'
+      f' {"json ms":>8} {"bin ms":>7} {"full json":>9} {"full bin":>8}'
+    )
+    for json_path in largest:
+      name = json_path.relative_to(output / 'data').with_suffix('')
+      binary_path = (output / 'binary' / name).with_suffix('.bin')
+      with binary.open_resource(binary_path) as resource:
+        nodes = resource.node_count
+        # The last anchor is the furthest into the page
+        anchor = [anchor.id for anchor in resource.anchors() if anchor.node >= 0][-1]
+
+      if json_section(json_path, anchor) != binary_section(binary_path, anchor):
+        raise ValueError(f'{name}: sections differ')
+
+      print(
+        f'{str(name)[:40]:<40} {json_path.stat().st_size / 1024:>8.1f} {binary_path.stat().st_size / 1024:>7.1f}'
+        f' {nodes:>6}'
+        f' {timeit(partial(json_section, json_path, anchor), args.repeat) * 1000:>8.3f}'
+        f' {timeit(partial(binary_section, binary_path, anchor), args.repeat) * 1000:>7.3f}'
+        f' {timeit(partial(json_full, json_path), args.repeat) * 1000:>9.3f}'
+        f' {timeit(partial(binary_full, binary_path), args.repeat) * 1000:>8.3f}'
+      )
+
+
+if __name__ == '__main__':
+  main()
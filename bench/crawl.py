@@ -0,0 +1,156 @@
+import argparse
+import contextlib
+import os
+import pathlib
+import statistics
+import tempfile
+import time
+from collections.abc import Sequence
+from dataclasses import replace
+
+from app import profiles
+from app.main import ContentType, IconType, Scraper
+
+from . import site
+from .server import MockSite, ServerConfig
+
+ICONS_DIR = pathlib.Path(__file__).parent.parent / 'icons'
+
+
+def percentile(values: Sequence[float], n: int):
+  if len(values) < 2:
+    return values[0] if values else 0
+
+  return statistics.quantiles(values, n=100, method='inclusive')[n - 1]
+
+
+def run(
+  site_url: str,
+  roots: list[str],
+  workdir: pathlib.Path,
+  formats: list[ContentType],
+  pipelined: bool,
+):
+  workdir.mkdir(parents=True)
+  (workdir / 'icons').symlink_to(ICONS_DIR.resolve(), target_is_directory=True)
+  with contextlib.chdir(workdir), open(os.devnull, 'w') as devnull:
+    scraper = Scraper(
+      replace(profiles.DEFAULT_PROFILE, base_url=site_url, page_urls=roots),
+      IconType.ELEMENT,
+      formats,
+      pipelined=pipelined,
+    )
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(devnull):
+      build = scraper.scrape()
+    wall = time.perf_counter() - start
+
+  return len(build.pages), wall, scraper.rate
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    prog='bench.crawl',
+    description='crawl a local mock site from a cold cache and report throughput',
+  )
+  parser.add_argument(
+    '--cache',
+    type=pathlib.Path,
+    help='serve the pages in a ./cache/ directory instead of a generated site',
+  )
+  parser.add_argument('--campaigns', type=int, default=3)
+  parser.add_argument('--missions', type=int, default=20, help='missions per campaign')
+  parser.add_argument('--glossary', type=int, default=40, help='rules glossary pages')
+  parser.add_argument('--sections', type=int, default=6, help='sections per page')
+  parser.add_argument(
+    '--latency', type=float, default=0.05, help='seconds (default: 0.05)'
+  )
+  parser.add_argument(
+    '--jitter', type=float, default=0.02, help='seconds (default: 0.02)'
+  )
+  parser.add_argument(
+    '--throttle-rate', type=float, default=0, help='share of 429 responses'
+  )
+  parser.add_argument(
+    '--unavailable-rate', type=float, default=0, help='share of 503 responses'
+  )
+  parser.add_argument(
+    '--error-rate', type=float, default=0, help='share of 502 responses'
+  )
+  parser.add_argument(
+    '--retry-after', type=int, default=1, help='seconds, sent with 429 and 503'
+  )
+  parser.add_argument(
+    '--rate-limit', type=float, default=0, help='requests a second before 429s'
+  )
+  parser.add_argument(
+    '--bandwidth', type=int, default=0, help='bytes a second per response'
+  )
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--runs', type=int, default=1)
+  parser.add_argument(
+    '--sequential',
+    dest='pipelined',
+    action='store_false',
+    help='fetch, parse and write one after the other',
+  )
+  parser.add_argument(
+    '--format',
+    dest='formats',
+    action='append',
+    type=ContentType,
+    choices=list(ContentType),
+  )
+  args = parser.parse_args()
+
+  config = ServerConfig(
+    latency=args.latency,
+    jitter=args.jitter,
+    throttle_rate=args.throttle_rate,
+    unavailable_rate=args.unavailable_rate,
+    error_rate=args.error_rate,
+    retry_after=args.retry_after,
+    rate_limit=args.rate_limit,
+    bandwidth=args.bandwidth,
+    seed=args.seed,
+  )
+  with tempfile.TemporaryDirectory(prefix='bench_crawl_') as tmp:
+    if args.cache:
+      site_dir = args.cache.resolve()
+      roots = profiles.DEFAULT_PROFILE.page_urls
+    else:
+      site_dir = pathlib.Path(tmp, 'site')
+      roots = site.generate(
+        site_dir,
+        args.campaigns,
+        args.missions,
+        args.glossary,
+        args.sections,
+        args.seed,
+      )
+
+    print(
+      f'{"run":>3} {"pages":>5} {"wall s":>7} {"pages/s":>7} {"requests":>8} {"retries":>7}'
+      f' {"p50 ms":>7} {"p95 ms":>7} {"429":>4} {"503":>4} {"502":>4} {"rate":>6}'
+    )
+    with MockSite(site_dir, config) as mock:
+      for i in range(args.runs):
+        mock.reset()
+        pages, wall, rate = run(
+          mock.base_url,
+          roots,
+          pathlib.Path(tmp, f'run_{i}'),
+          args.formats or [ContentType.XHTML],
+          args.pipelined,
+        )
+        stats = rate.stats()
+        print(
+          f'{i + 1:>3} {pages:>5} {wall:>7.2f} {pages / wall:>7.1f} {stats["requests"]:>8}'
+          f' {stats["retries"]:>7}'
+          f' {percentile(rate.latencies, 50) * 1000:>7.1f} {percentile(rate.latencies, 95) * 1000:>7.1f}'
+          f' {mock.stats.throttled:>4} {mock.stats.unavailable:>4} {mock.stats.errors:>4} {stats["rate"]:>6.2f}'
+        )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,107 @@
+import argparse
+import time
+from dataclasses import replace
+from typing import Any
+
+from lxml.html import Element, HtmlElement, fragment_fromstring
+
+from app import memo, profiles, tags
+from app.main import ContentType, IconType, Scraper
+
+TAGS = ('b', 'i', 'span')
+
+
+# lxml's html parser stops nesting at 255 levels, so the tree is built
+# directly to go deeper than a page could
+def deep_tree(depth: int):
+  root = fragment_fromstring('<div></div>')
+  parent = root
+  for level in range(depth):
+    e = Element(TAGS[level % len(TAGS)])
+    if level % len(TAGS) == 2:
+      e.set('class', 'blue_text')
+    e.text = f'level {level} '
+    e.tail = ' after'
+    parent.append(e)
+    parent = e
+  return root
+
+
+def wide_tree(elements: int):
+  root = fragment_fromstring('<div></div>')
+  for level in range(elements):
+    e = Element(TAGS[level % len(TAGS)])
+    if level % len(TAGS) == 2:
+      e.set('class', 'blue_text')
+    e.text = f'level {level} '
+    e.tail = ' after'
+    root.append(e)
+  return root
+
+
+def count(root: HtmlElement):
+  return sum(1 for _ in root.iter()) - 1
+
+
+# Every element is kept as a tag of its own and none of the text is lost,
+# otherwise there is nothing being timed
+def check(scraper: Scraper, root: HtmlElement, items: list[tags.Tag[Any]]):
+  nodes = 0
+  stack = list(items)
+  while stack:
+    item = stack.pop()
+    if isinstance(item, tags.TagWithItems):
+      nodes += 1
+      stack.extend(item.items)
+
+  if nodes != count(root):
+    raise ValueError(f'parsed {nodes} tags from {count(root)} elements')
+  if ''.join(scraper.extract_text_items(items)) != ''.join(root.itertext()):
+    raise ValueError('parsed text differs')
+
+
+def run(scraper: Scraper, root: HtmlElement, repeat: int):
+  best = float('inf')
+  for _ in range(repeat):
+    scraper.annotation_memo = memo.LRUCache(scraper.MEMO_SIZE)
+    start = time.perf_counter()
+    items = scraper.parse_element_items('bench', root, None)
+    best = min(best, time.perf_counter() - start)
+    check(scraper, root, items)
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    prog='bench.deep_nesting',
+    description='time parse_element_items per element on deep and flat trees',
+  )
+  parser.add_argument(
+    '--depth',
+    dest='depths',
+    type=int,
+    action='append',
+    help='nesting depth to time, can be repeated (default: 10 100 1000 5000)',
+  )
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  scraper = Scraper(
+    replace(profiles.DEFAULT_PROFILE, base_url='https://example.com', page_urls=[]),
+    IconType.ELEMENT,
+    [ContentType.JSON],
+  )
+  print(f'{"depth":>6} {"elements":>8} {"deep us/el":>10} {"flat us/el":>10}')
+  for depth in args.depths or [10, 100, 1000, 5000]:
+    deep = deep_tree(depth)
+    elements = count(deep)
+    deep_time = run(scraper, deep, args.repeat)
+    flat_time = run(scraper, wide_tree(elements), args.repeat)
+    print(
+      f'{depth:>6} {elements:>8}'
+      f' {deep_time / elements * 1e6:>10.2f} {flat_time / elements * 1e6:>10.2f}'
+    )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,172 @@
+import hashlib
+import mimetypes
+import pathlib
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+@dataclass
+class ServerConfig:
+  # Seconds added to every response, plus up to `jitter` either way
+  latency: float = 0.05
+  jitter: float = 0.02
+  # Share of requests answered with 429, 503 or 502 instead of the page
+  throttle_rate: float = 0
+  unavailable_rate: float = 0
+  error_rate: float = 0
+  retry_after: int | None = 1
+  # Requests a second served before answering 429, 0 for no limit
+  rate_limit: float = 0
+  # Bytes a second for each response body, 0 for no limit
+  bandwidth: int = 0
+  seed: int = 0
+
+
+@dataclass
+class ServerStats:
+  requests: int = 0
+  served: int = 0
+  throttled: int = 0
+  unavailable: int = 0
+  errors: int = 0
+  not_found: int = 0
+  not_modified: int = 0
+  sent: int = 0
+
+
+# Serves `<directory>/<path>.html`, the layout of ./cache/, or any other file
+# at its own path, with the delays and errors of a busy server. Everything random comes from one seeded
+# generator so a run can be repeated.
+class MockSite:
+  directory: pathlib.Path
+  config: ServerConfig
+  stats: ServerStats
+
+  lock: threading.Lock
+  rng: random.Random
+  window: list[float]
+
+  server: ThreadingHTTPServer
+  thread: threading.Thread
+
+  def __init__(self, directory: pathlib.Path, config: ServerConfig, port: int = 0):
+    self.directory = directory
+    self.config = config
+    self.stats = ServerStats()
+
+    self.lock = threading.Lock()
+    self.rng = random.Random(config.seed)
+    self.window = []
+
+    site = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        site.handle(self)
+
+      def log_message(self, format: str, *args: Any):
+        pass
+
+    self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    self.server.daemon_threads = True
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+  def reset(self):
+    with self.lock:
+      self.stats = ServerStats()
+      self.rng = random.Random(self.config.seed)
+      self.window = []
+
+  @property
+  def base_url(self):
+    host, port = self.server.server_address[:2]
+    return f'http://{host!s}:{port}'
+
+  def __enter__(self):
+    self.thread.start()
+    return self
+
+  def __exit__(self, *exc: object):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def pick(self):
+    config = self.config
+    with self.lock:
+      self.stats.requests += 1
+      delay = max(0, config.latency + self.rng.uniform(-config.jitter, config.jitter))
+
+      now = time.monotonic()
+      if config.rate_limit:
+        self.window = [t for t in self.window if now - t < 1]
+        if len(self.window) >= config.rate_limit:
+          self.stats.throttled += 1
+          return delay, 429
+        self.window.append(now)
+
+      roll = self.rng.random()
+      if roll < config.throttle_rate:
+        self.stats.throttled += 1
+        return delay, 429
+      if roll < config.throttle_rate + config.unavailable_rate:
+        self.stats.unavailable += 1
+        return delay, 503
+      if roll < config.throttle_rate + config.unavailable_rate + config.error_rate:
+        self.stats.errors += 1
+        return delay, 502
+
+      return delay, 200
+
+  def handle(self, request: BaseHTTPRequestHandler):
+    delay, status = self.pick()
+    time.sleep(delay)
+
+    if status != 200:
+      request.send_response(status)
+      if status in (429, 503) and self.config.retry_after is not None:
+        request.send_header('retry-after', str(self.config.retry_after))
+      request.send_header('content-length', '0')
+      request.end_headers()
+      return
+
+    name = request.path.split('?')[0].strip('/')
+    path = self.directory / f'{name}.html'
+    content_type = 'text/html; charset=utf-8'
+    if not path.is_file():
+      path = self.directory / name
+      content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if not path.is_file():
+      with self.lock:
+        self.stats.not_found += 1
+      request.send_error(404)
+      return
+
+    body = path.read_bytes()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+    if request.headers.get('if-none-match') == etag:
+      request.send_response(304)
+      request.send_header('etag', etag)
+      request.end_headers()
+      with self.lock:
+        self.stats.not_modified += 1
+      return
+
+    request.send_response(200)
+    request.send_header('content-type', content_type)
+    request.send_header('content-length', str(len(body)))
+    request.send_header('etag', etag)
+    request.end_headers()
+
+    chunk = max(1, self.config.bandwidth // 20) if self.config.bandwidth else len(body)
+    for offset in range(0, len(body), chunk):
+      request.wfile.write(body[offset : offset + chunk])
+      if self.config.bandwidth:
+        time.sleep(chunk / self.config.bandwidth)
+
+    with self.lock:
+      self.stats.served += 1
+      self.stats.sent += len(body)
@@ -0,0 +1,155 @@
+import html
+import pathlib
+import random
+from collections.abc import Generator
+from typing import NamedTuple
+
+ICONS = ''.join(chr(code) for code in range(0xE010, 0xE01F))
+
+
+class SitePage(NamedTuple):
+  title: str
+  url: str
+  items: list['SitePage']
+
+
+def site_tree(campaigns: int, missions: int, glossary: int) -> list[SitePage]:
+  return [
+    SitePage(
+      'Campaign Guides',
+      '/docs/category/campaign-guides',
+      [
+        SitePage(
+          f'Campaign {c}',
+          f'/docs/campaign_guides/campaign_{c}',
+          [
+            SitePage(
+              '1. Missions',
+              f'/docs/campaign_guides/campaign_{c}/missions',
+              [
+                SitePage(
+                  f'1.{m:02}',
+                  f'/docs/campaign_guides/campaign_{c}/missions/1_{m:02}',
+                  [],
+                )
+                for m in range(1, missions + 1)
+              ],
+            ),
+            *(
+              SitePage(
+                f'{m + 1}. Location {m}',
+                f'/docs/campaign_guides/campaign_{c}/location_{m}',
+                [],
+              )
+              for m in range(1, missions + 1)
+            ),
+          ],
+        )
+        for c in range(1, campaigns + 1)
+      ],
+    ),
+    SitePage(
+      'Rules Glossary',
+      '/docs/rules_glossary',
+      [
+        SitePage(f'Rule {g}', f'/docs/rules_glossary/rule_{g}', [])
+        for g in range(1, glossary + 1)
+      ],
+    ),
+    SitePage('Frequently Asked Questions', '/docs/faq', []),
+  ]
+
+
+def walk(
+  pages: list[SitePage], parents: tuple[str, ...] = ()
+) -> Generator[tuple[SitePage, tuple[str, ...]]]:
+  for page in pages:
+    yield page, parents
+    yield from walk(page.items, (*parents, page.url))
+
+
+# Like Docusaurus, only the categories above the current page are expanded
+def sidebar(pages: list[SitePage], url: str, active: tuple[str, ...]) -> str:
+  out = ['<ul class="menu__list">']
+  for page in pages:
+    link = 'menu__link' + (' menu__link--active' if page.url in active else '')
+    title = html.escape(page.title)
+    if page.items:
+      collapsible = 'menu__list-item-collapsible' + (
+        ' menu__list-item-collapsible--active' if page.url == url else ''
+      )
+      out.append(
+        f'<li class="menu__list-item"><div class="{collapsible}">'
+        f'<a class="{link} menu__link--sublist" href="{page.url}">{title}</a></div>'
+      )
+      if page.url in active:
+        out.append(sidebar(page.items, url, active))
+      out.append('</li>')
+    else:
+      out.append(
+        f'<li class="menu__list-item"><a class="{link}" href="{page.url}">{title}</a></li>'
+      )
+  out.append('</ul>')
+  return ''.join(out)
+
+
+def content(r: random.Random, urls: list[str], sections: int) -> str:
+  out = list[str]()
+  for section in range(sections):
+    out.append(f'<h2 class="anchor" id="section-{section}">Section {section}</h2>')
+    out.append(
+      '<blockquote><p>You walk along the trail – it’s cold and the wind picks up.</p>'
+      f'<p>Read entry <em>{r.randint(1, 99)}.{r.randint(1, 20):02}</em>.</p></blockquote>'
+    )
+    out.append(
+      f'<p>If you have not <span class="blue_text">FOUND SILARO, 1.{r.randint(1, 20):02}</span>, '
+      f'read <a href="{r.choice(urls)}">this entry</a> and spend {r.choice(ICONS)} and {r.choice(ICONS)}.</p>'
+    )
+    out.append(
+      f'<ul><li>Gain the Reward {r.randint(1, 9)} reward.</li>'
+      f'<li><span class="gold_text"><strong>Mission: Find {r.randint(1, 9)}</strong></span></li>'
+      f'<li><a href="{r.choice(urls)}#section-0">see also</a></li></ul>'
+    )
+    out.append(
+      '<div class="blue_highlight"><p>Highlighted <strong>TEXT</strong> with an '
+      f'<span class="ranger_icons_red">{r.choice(ICONS)}</span> icon</p></div>'
+    )
+  return ''.join(out)
+
+
+def page_html(
+  tree: list[SitePage], page: SitePage, active: tuple[str, ...], body: str
+) -> str:
+  title = html.escape(page.title)
+  return (
+    f'<!DOCTYPE html><html><head><title>{title}</title></head><body>'
+    '<div class="sidebar_njMd"><nav class="menu thin-scrollbar menu_SIkG">'
+    f'{sidebar(tree, page.url, active)}</nav></div>'
+    '<main><article><div class="theme-doc-markdown markdown">'
+    f'<header><h1>{title}</h1></header>{body}</div></article></main></body></html>'
+  )
+
+
+# Writes a Docusaurus shaped site in the same layout as ./cache/ and returns
+# its root pages
+def generate(
+  directory: pathlib.Path,
+  campaigns: int = 3,
+  missions: int = 20,
+  glossary: int = 40,
+  sections: int = 6,
+  seed: int = 0,
+):
+  r = random.Random(seed)
+  tree = site_tree(campaigns, missions, glossary)
+  pages = list(walk(tree))
+  urls = [page.url for page, _ in pages]
+  for page, parents in pages:
+    path = directory / f'{page.url.lstrip("/")}.html'
+    path.parent.mkdir(exist_ok=True, parents=True)
+    path.write_text(
+      page_html(tree, page, (*parents, page.url), content(r, urls, sections)),
+      'utf8',
+    )
+
+  return [page.url for page in tree]
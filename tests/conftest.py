@@ -0,0 +1,179 @@
+import html
+import pathlib
+from collections.abc import Generator
+from dataclasses import fields
+from typing import Any
+
+import pytest
+
+from app import profiles, tags, util
+from app.main import ContentType, IconType, Scraper
+
+
+# Every tag with its depth and fields other than items, in document order.
+# Dataclass equality recurses, so deep trees are compared by this instead.
+def walk(items: list[tags.Tag[Any]]) -> Generator[tuple[Any, ...]]:
+  stack = [(0, item) for item in reversed(items)]
+  while stack:
+    depth, item = stack.pop()
+    yield (
+      depth,
+      *(getattr(item, field.name) for field in fields(item) if field.name != 'items'),
+    )
+    if isinstance(item, tags.TagWithItems):
+      stack.extend((depth + 1, child) for child in reversed(item.items))
+
+
+def text(value: str):
+  return tags.TagText('text', value)
+
+
+# One of every kind of tag, with and without their optional fields
+@pytest.fixture
+def content() -> list[tags.Tag[Any]]:
+  return [
+    tags.TagTitle('h1', 'setup', [text('Setup')]),
+    tags.TagFormattedText(
+      'p',
+      None,
+      [
+        text('Read '),
+        tags.TagLink(
+          'a', 'rules_glossary/fatigue#setup', [tags.TagEntry('entry', [text('1.02')])]
+        ),
+        text(', then gain the '),
+        tags.TagReward('reward', [text('Silver Hat')]),
+        text(' reward.'),
+        tags.EmptyTag('br'),
+        tags.TagIcon('icon', 'ranger_token', []),
+        tags.TagHighlight('highlight', 'green', [text('Über ✓')]),
+      ],
+    ),
+    tags.TagBlockquote(
+      'blockquote',
+      'narration_1',
+      'blue',
+      [
+        tags.TagFormattedText(
+          'span', 'blue', [tags.TagEvent('event', [text('THE STORM')])]
+        )
+      ],
+    ),
+    tags.TagTitle('h2', None, [tags.TagMission('mission', [text('THE LOST PATH')])]),
+    tags.TagImg('img', 'icons/map.png'),
+    tags.EmptyTag('hr'),
+    tags.TagTitle('choice', 'choice_a', [text('')]),
+  ]
+
+
+@pytest.fixture
+def deep_content() -> list[tags.Tag[Any]]:
+  tag: tags.Tag[Any] = text('bottom')
+  for i in range(5000):
+    tag = tags.TagFormattedText('span', 'blue' if i % 2 else None, [tag, text(str(i))])
+  return [tag]
+
+
+# (title, url, children) of a small Docusaurus site
+type SiteItem = tuple[str, str, list[SiteItem]]
+
+SITE: list[SiteItem] = [
+  (
+    'Campaign Guides',
+    '/docs/category/campaign-guides',
+    [
+      (
+        'Lure of the Valley',
+        '/docs/campaign_guides/lure_of_the_valley',
+        [
+          ('1.01', '/docs/campaign_guides/lure_of_the_valley/1_01', []),
+          ('1.02', '/docs/campaign_guides/lure_of_the_valley/1_02', []),
+        ],
+      ),
+    ],
+  ),
+  (
+    'Rules Glossary',
+    '/docs/rules_glossary',
+    [
+      ('Fatigue', '/docs/rules_glossary/fatigue', []),
+      ('Ranger Token', '/docs/rules_glossary/ranger_token', []),
+    ],
+  ),
+  ('Frequently Asked Questions', '/docs/faq', []),
+]
+SITE_ROOTS = [url for _, url, _ in SITE]
+ICONS_DIR = pathlib.Path(__file__).parents[1] / 'icons'
+
+
+# Only the categories above the current page are expanded, as on the site
+def sidebar_list(items: list[SiteItem], expanded: set[str]) -> str:
+  lis = list[str]()
+  for title, url, children in items:
+    link = f'<a class="menu__link" href="{url}">{html.escape(title)}</a>'
+    if not children:
+      lis.append(f'<li class="menu__list-item">{link}</li>')
+      continue
+    sublist = sidebar_list(children, expanded) if url in expanded else ''
+    lis.append(
+      '<li class="menu__list-item">'
+      f'<div class="menu__list-item-collapsible">{link}</div>{sublist}</li>'
+    )
+  return f'<ul class="menu__list">{"".join(lis)}</ul>'
+
+
+def sidebar(items: list[SiteItem], expanded: set[str]):
+  return (
+    '<div class="sidebar_njMd"><nav class="menu thin-scrollbar menu_SIkG">'
+    f'{sidebar_list(items, expanded)}</nav></div>'
+  )
+
+
+def site_page(title: str, url: str, expanded: set[str]):
+  return (
+    f'<html><head><title>{html.escape(title)}</title></head><body>'
+    f'{sidebar(SITE, expanded)}<main><article>'
+    '<div class="theme-doc-markdown markdown">'
+    f'<header><h1>{html.escape(title)}</h1></header>'
+    '<h2 class="anchor" id="setup">Setup</h2>'
+    '<blockquote><p>You walk along the trail.</p></blockquote>'
+    '<p>Take <a href="/docs/rules_glossary/fatigue">fatigue</a>, then read '
+    '<a href="/docs/campaign_guides/lure_of_the_valley/1_02">1.02</a>.</p>'
+    '</div></article></main></body></html>'
+  )
+
+
+def write_site(
+  cache_dir: pathlib.Path, items: list[SiteItem], parents: tuple[str, ...] = ()
+):
+  for title, url, children in items:
+    path = util.cache_path(cache_dir, url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(site_page(title, url, {*parents, url}), 'utf8')
+    write_site(cache_dir, children, (*parents, url))
+
+
+@pytest.fixture
+def site_cache(tmp_path: pathlib.Path):
+  cache_dir = tmp_path / 'cache'
+  write_site(cache_dir, SITE)
+  return cache_dir
+
+
+def site_scraper(
+  tmp_path: pathlib.Path,
+  cache_dir: pathlib.Path,
+  name: str,
+  layout: profiles.SiteLayout | None = None,
+):
+  profile = profiles.SiteProfile(
+    name,
+    'https://example.com',
+    SITE_ROOTS,
+    layout=layout or profiles.SiteLayout(),
+    output_dir=tmp_path / name / 'output',
+    log_dir=tmp_path / name / 'log',
+    cache_dir=cache_dir,
+    icons_dir=ICONS_DIR,
+  )
+  return Scraper(profile, IconType.ELEMENT, [ContentType.XHTML, ContentType.JSON])
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import pathlib
+
+import pytest
+import requests
+
+from app import assets
+from bench.server import MockSite, ServerConfig
+
+MAP = b'\x89PNG map'
+
+
+@pytest.fixture
+def site_dir(tmp_path: pathlib.Path):
+  directory = tmp_path / 'site'
+  (directory / 'img').mkdir(parents=True)
+  (directory / 'img' / 'map.png').write_bytes(MAP)
+  (directory / 'img' / 'map_copy.png').write_bytes(MAP)
+  (directory / 'img' / 'icon.svg').write_text('<svg/>', 'utf8')
+  return directory
+
+
+def test_names_are_content_addressed_and_shared(
+  site_dir: pathlib.Path, tmp_path: pathlib.Path
+):
+  store_dir = tmp_path / 'assets'
+  with MockSite(site_dir, ServerConfig(latency=0, jitter=0)) as mock:
+    mirror = assets.AssetMirror(requests.Session(), store_dir)
+    base = mock.base_url
+    entries = mirror.mirror(
+      [f'{base}/img/map.png', f'{base}/img/map_copy.png#a', f'{base}/img/map.png']
+    )
+
+  digest = hashlib.sha256(MAP).hexdigest()
+  assert {assets.asset_name(entry) for entry in entries.values()} == {f'{digest}.png'}
+  assert list(entries) == [f'{base}/img/map.png', f'{base}/img/map_copy.png']
+  # One blob and the index
+  assert sorted(path.name for path in store_dir.iterdir()) == [
+    f'{digest}.png',
+    'index.json',
+  ]
+  assert (store_dir / f'{digest}.png').read_bytes() == MAP
+  assert json.loads((store_dir / 'index.json').read_text('utf8')) == entries
+  assert (
+    mirror.local_src(f'{base}/img/map_copy.png#a', entries) == f'assets/{digest}.png#a'
+  )
+  assert mirror.local_src(f'{base}/img/none.png', entries) == f'{base}/img/none.png'
+
+
+def test_unchanged_assets_are_not_downloaded_again(
+  site_dir: pathlib.Path, tmp_path: pathlib.Path
+):
+  store_dir = tmp_path / 'assets'
+  with MockSite(site_dir, ServerConfig(latency=0, jitter=0)) as mock:
+    urls = [f'{mock.base_url}/img/map.png', f'{mock.base_url}/img/icon.svg']
+    first = assets.AssetMirror(requests.Session(), store_dir).mirror(urls)
+    # The index is read back by the next run
+    second = assets.AssetMirror(requests.Session(), store_dir).mirror(urls)
+    assert first == second
+    assert mock.stats.served == 2
+    assert mock.stats.not_modified == 2
+
+    mock.reset()
+    (site_dir / 'img' / 'icon.svg').write_text('<svg>new</svg>', 'utf8')
+    third = assets.AssetMirror(requests.Session(), store_dir).mirror(urls)
+    assert mock.stats.served == 1
+
+  assert third[urls[0]] == second[urls[0]]
+  assert third[urls[1]]['hash'] == hashlib.sha256(b'<svg>new</svg>').hexdigest()
+
+
+def test_failures_keep_the_mirrored_copy(
+  site_dir: pathlib.Path, tmp_path: pathlib.Path
+):
+  store_dir = tmp_path / 'assets'
+  with MockSite(site_dir, ServerConfig(latency=0, jitter=0)) as mock:
+    url = f'{mock.base_url}/img/map.png'
+    mirrored = assets.AssetMirror(requests.Session(), store_dir).mirror([url])
+
+    mock.config.error_rate = 1
+    mirror = assets.AssetMirror(requests.Session(), store_dir)
+    assert mirror.mirror([url, f'{mock.base_url}/img/icon.svg']) == mirrored
+    assert mock.stats.errors == 2
+
+  # The server is gone
+  assert assets.AssetMirror(requests.Session(), store_dir).mirror([url]) == mirrored
+
+  # Without its blob the entry is dropped and the source is left as it was
+  for blob in store_dir.glob('*.png'):
+    blob.unlink()
+  mirror = assets.AssetMirror(requests.Session(), store_dir)
+  entries = mirror.mirror([url])
+  assert entries == {}
+  assert mirror.local_src(url, entries) == url
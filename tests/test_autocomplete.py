@@ -0,0 +1,102 @@
+from app import autocomplete, util
+
+RESOURCE_IDS = {
+  'guides': 'Campaign Guides',
+  'guides/lure': 'Lure of the Valley',
+  'guides/lure/station': 'Lone Tree Station',
+  'guides/lure/1_02': 'The Path',
+}
+
+
+def page(resource_id: str):
+  return util.Page(
+    f'/docs/{resource_id}', resource_id, RESOURCE_IDS[resource_id], [], None
+  )
+
+
+def build():
+  return autocomplete.build_index(
+    [
+      (page('guides'), []),
+      (page('guides/lure'), []),
+      (
+        page('guides/lure/station'),
+        [
+          util.Link(id='#setup', title='Setup'),
+          util.Link(id='#tree', title='The Tree'),
+        ],
+      ),
+      (page('guides/lure/1_02'), []),
+    ],
+    RESOURCE_IDS,
+    {
+      '1.02': [
+        util.EntryOccurrence(
+          id='guides/lure/station', anchors=[None], count=1, target='guides/lure/1_02'
+        )
+      ]
+    },
+  )
+
+
+def find(query: str):
+  index, shards = build()
+  key = util.to_id(query)
+  if len(key) < index['prefix_length']:
+    return [result['title'] for result in index['top'][key]]
+
+  shard = shards[key[: index['prefix_length']]]
+  best = dict[int, int]()
+  for entry, score, result in shard['keys']:
+    if entry.startswith(key):
+      best[result] = min(score, best.get(result, score))
+  return [
+    shard['results'][result]['title']
+    for result in sorted(best, key=lambda result: best[result])
+  ]
+
+
+def test_title_keys():
+  assert list(autocomplete.title_keys('Lone Tree Station')) == [
+    ('lone_tree_station', 0),
+    ('tree_station', 1),
+    ('station', 2),
+  ]
+
+
+def test_parent_titles():
+  assert autocomplete.parent_titles(RESOURCE_IDS, 'guides/lure/station') == [
+    'Campaign Guides',
+    'Lure of the Valley',
+  ]
+  assert autocomplete.parent_titles(RESOURCE_IDS, 'guides') == []
+
+
+def test_titles_are_found_from_any_word():
+  # A page scores better than an anchor, a match on the first word better
+  # than one on a later word
+  assert find('tree') == ['Lone Tree Station', 'The Tree']
+  assert find('the') == ['The Path', 'The Tree', 'Lure of the Valley']
+  assert find('lone tree') == ['Lone Tree Station']
+  assert find('valley') == ['Lure of the Valley']
+
+
+def test_short_prefixes_are_in_the_index():
+  index, shards = build()
+  assert index['shards'] == sorted(shards)
+  assert all(len(prefix) == autocomplete.PREFIX_LENGTH for prefix in shards)
+  assert find('s') == ['Setup', 'Lone Tree Station']
+  assert find('t') == [
+    'The Path',
+    'The Tree',
+    'Lone Tree Station',
+    'Lure of the Valley',
+  ]
+
+
+def test_entry_numbers_lead_to_their_target():
+  _, shards = build()
+  results = shards['1_']['results']
+  assert [result['id'] for result in results] == ['guides/lure/1_02']
+  assert results[0]['parents'] == ['Campaign Guides', 'Lure of the Valley']
+  assert find('1.02') == ['The Path']
@@ -0,0 +1,81 @@
+import pathlib
+from typing import Any
+
+import pytest
+
+from app import binary, tags, util
+
+from .conftest import walk
+
+
+def resource(content: list[tags.Tag[Any]] | None):
+  return util.resource(
+    'campaign_guides/lure_of_the_valley/2_lone_tree_station',
+    'Lone Tree Station',
+    content,
+    [
+      util.Link(id='#setup', title='Setup'),
+      util.Link(id='#choice_a', title='Choice A'),
+      util.Link(id='#gone', title='Gone'),
+    ],
+    [util.Link(id='rules_glossary/fatigue', title='Fatigue')],
+    [],
+    'https://example.com/docs/lone_tree_station',
+  )
+
+
+def test_round_trip(tmp_path: pathlib.Path, content: list[tags.Tag[Any]]):
+  path = tmp_path / 'page.bin'
+  path.write_bytes(binary.encode_resource(resource(content), content))
+
+  with binary.open_resource(path) as page:
+    assert page.id == 'campaign_guides/lure_of_the_valley/2_lone_tree_station'
+    assert page.title == 'Lone Tree Station'
+    assert page.url == 'https://example.com/docs/lone_tree_station'
+    assert page.has_content
+    assert page.content() == content
+    assert page.links() == [util.Link(id='rules_glossary/fatigue', title='Fatigue')]
+    assert page.lookup() == []
+
+
+def test_round_trip_deep_tree(deep_content: list[tags.Tag[Any]]):
+  page = binary.BinaryResource(
+    binary.encode_resource(resource(deep_content), deep_content)
+  )
+  assert list(walk(page.content() or [])) == list(walk(deep_content))
+
+
+def test_without_content():
+  page = binary.BinaryResource(binary.encode_resource(resource(None), None))
+  assert not page.has_content
+  assert page.content() is None
+  assert [anchor.node for anchor in page.anchors()] == [-1, -1, -1]
+
+
+def test_sections_and_narrations(content: list[tags.Tag[Any]]):
+  page = binary.BinaryResource(binary.encode_resource(resource(content), content))
+
+  anchors = {anchor.id: anchor for anchor in page.anchors()}
+  assert anchors['#gone'].node == -1
+  assert list(page.section('#gone')) == []
+
+  # Up to the next title with an id, the h2 without one is part of it
+  section = [page.tag(node) for node in page.section('#setup')]
+  assert section == content[:-1]
+  assert page.text(next(page.section('#setup'))) == 'Setup'
+
+  narration = page.narration('narration_1')
+  assert narration is not None
+  assert page.tag(narration) == content[2]
+  assert page.text(narration) == 'THE STORM'
+  assert page.narration('narration_2') is None
+
+
+def test_not_a_binary_resource():
+  with pytest.raises(ValueError, match='not a binary resource'):
+    binary.BinaryResource(b'\0' * binary.HEADER.size)
+
+  data = bytearray(binary.encode_resource(resource(None), None))
+  data[4] = binary.BINARY_VERSION + 1
+  with pytest.raises(ValueError, match='unsupported binary resource version'):
+    binary.BinaryResource(bytes(data))
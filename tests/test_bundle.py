@@ -0,0 +1,42 @@
+import io
+import json
+import pathlib
+
+import pytest
+
+from app import bundle
+
+ENTRIES = [
+  ('guides/lure', b'{"id":"guides/lure"}'),
+  ('guides/lure/station', '{"title":"Über"}'.encode()),
+  ('guides/lure/empty', b''),
+]
+
+
+def test_round_trip(tmp_path: pathlib.Path):
+  path = tmp_path / 'lure.bundle'
+  path.write_bytes(bundle.build_bundle(ENTRIES))
+
+  with path.open('rb') as f:
+    index, start = bundle.read_index(f)
+  assert list(index['entries']) == [resource_id for resource_id, _ in ENTRIES]
+  assert start == len(path.read_bytes().partition(b'\n')[0]) + 1
+
+  for resource_id, data in ENTRIES:
+    assert bundle.read_entry(path, resource_id) == data
+
+
+def test_offsets_follow_the_header():
+  data = bundle.build_bundle(ENTRIES)
+  header, _, body = data.partition(b'\n')
+  assert json.loads(header)['entries'] == {
+    'guides/lure': [0, 20],
+    'guides/lure/station': [20, 17],
+    'guides/lure/empty': [37, 0],
+  }
+  assert body == b''.join(data for _, data in ENTRIES)
+
+
+def test_unknown_version():
+  with pytest.raises(ValueError, match='unsupported bundle version'):
+    bundle.read_index(io.BytesIO(b'{"version":2,"entries":{}}\n'))
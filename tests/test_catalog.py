@@ -0,0 +1,115 @@
+from typing import Any
+
+from app import catalog, tags, util
+
+
+def text(value: str):
+  return tags.TagText('text', value)
+
+
+def event(name: str):
+  return tags.TagFormattedText('span', 'blue', [tags.TagEvent('event', [text(name)])])
+
+
+def lookup_group(resource_id: str):
+  return '/'.join(resource_id.split('/')[:2])
+
+
+def build_catalog(
+  pages: list[util.Page],
+  entities: dict[str, list[util.Entity]],
+  resource_ids: set[str],
+):
+  entry_ids = catalog.entry_ids(pages, lookup_group)
+  return catalog.merge_postings(
+    catalog.page_postings(
+      page, entities[page.url], resource_ids, entry_ids, lookup_group(page.resource_id)
+    )
+    for page in pages
+  )
+
+
+def test_find_entities():
+  items: list[tags.Tag[Any]] = [
+    event('THE STORM'),
+    tags.TagTitle('h2', 'setup', [text('Setup')]),
+    tags.TagFormattedText(
+      'p',
+      None,
+      [
+        tags.TagLink(
+          'a', 'guides/lure/1_02#start', [tags.TagEntry('entry', [text('1.02')])]
+        ),
+        tags.TagReward('reward', [text('Silver '), text('Hat')]),
+      ],
+    ),
+    tags.TagTitle('h2', None, [tags.TagMission('mission', [text('THE LOST PATH')])]),
+    event('THE STORM'),
+  ]
+  assert list(catalog.find_entities(items)) == [
+    util.Entity('events', 'THE STORM', None, None),
+    util.Entity('entries', '1.02', 'setup', 'guides/lure/1_02#start'),
+    util.Entity('rewards', 'Silver Hat', 'setup', None),
+    # A title without an id ends the section
+    util.Entity('missions', 'THE LOST PATH', None, None),
+    util.Entity('events', 'THE STORM', None, None),
+  ]
+
+
+def test_occurrences_are_counted_per_page():
+  pages = [
+    util.Page('/docs/guides/lure/station', 'guides/lure/station', 'Station', [], None),
+    util.Page('/docs/guides/lure/1_02', 'guides/lure/1_02', '1.02 The Path', [], None),
+    util.Page(
+      '/docs/guides/other/station', 'guides/other/station', 'Station', [], None
+    ),
+  ]
+  entities = {
+    '/docs/guides/lure/station': [
+      util.Entity('events', 'THE STORM', 'setup', None),
+      util.Entity('entries', '1.02', 'setup', None),
+      util.Entity('events', 'THE STORM', 'day_1', None),
+      util.Entity('events', 'THE STORM', 'setup', None),
+      util.Entity('entries', '1.02', 'day_1', 'guides/lure/1_02'),
+    ],
+    '/docs/guides/lure/1_02': [util.Entity('events', 'THE STORM', None, None)],
+    # Not in the same campaign as the 1.02 page, nor linked to it
+    '/docs/guides/other/station': [util.Entity('entries', '1.02', None, None)],
+  }
+  resource_ids = {page.resource_id for page in pages}
+
+  result = build_catalog(pages, entities, resource_ids)
+  assert result['events'] == {
+    'THE STORM': [
+      util.Occurrence(id='guides/lure/station', anchors=['#setup', '#day_1'], count=3),
+      util.Occurrence(id='guides/lure/1_02', anchors=[None], count=1),
+    ],
+  }
+  assert result['entries'] == {
+    '1.02': [
+      util.EntryOccurrence(
+        id='guides/lure/station',
+        anchors=['#setup', '#day_1'],
+        count=2,
+        target='guides/lure/1_02',
+      ),
+      util.EntryOccurrence(
+        id='guides/other/station', anchors=[None], count=1, target=None
+      ),
+    ],
+  }
+  assert result['missions'] == result['rewards'] == {}
+
+
+def test_links_name_the_entry_target():
+  pages = [
+    util.Page('/docs/guides/lure/station', 'guides/lure/station', 'Station', [], None)
+  ]
+  entities = {
+    '/docs/guides/lure/station': [
+      util.Entity('entries', '9.99', None, 'rules/fatigue#setup')
+    ]
+  }
+
+  result = build_catalog(pages, entities, {'guides/lure/station', 'rules/fatigue'})
+  assert result['entries']['9.99'][0].get('target') == 'rules/fatigue'
@@ -0,0 +1,65 @@
+import json
+import pathlib
+from typing import Any
+
+import pytest
+
+from app import bundle, compact, tags
+
+
+def round_trip(items: list[tags.Tag[Any]]):
+  return compact.decode_content(json.loads(json.dumps(compact.encode_content(items))))
+
+
+def test_round_trip(content: list[tags.Tag[Any]]):
+  assert round_trip(content) == content
+
+
+def test_strings_and_types_are_shared():
+  items: list[tags.Tag[Any]] = [
+    tags.TagFormattedText('b', None, [tags.TagText('text', 'same')]),
+    tags.TagFormattedText('b', None, [tags.TagText('text', 'same')]),
+    tags.TagFormattedText('b', 'red', [tags.TagText('text', 'red')]),
+  ]
+  encoded = compact.encode_content(items)
+  assert encoded['strings'] == ['same', 'red']
+  # Children are numbered before their parents, a missing color is a type
+  # of its own
+  assert encoded['types'] == [['text', 'text'], ['b', 'items'], ['b', 'color', 'items']]
+  assert encoded['nodes'] == [[1, [[0, 0]]], [1, [[0, 0]]], [2, 1, [[0, 1]]]]
+
+
+def test_empty_content():
+  assert round_trip([]) == []
+
+
+def test_unknown_version():
+  encoded = compact.encode_content([])
+  encoded['version'] = compact.COMPACT_VERSION + 1
+  with pytest.raises(ValueError, match='unsupported compact content version'):
+    compact.decode_content(encoded)
+
+
+def test_bundles_share_one_table(content: list[tags.Tag[Any]], tmp_path: pathlib.Path):
+  other: list[tags.Tag[Any]] = [tags.TagIcon('icon', 'ranger_token', [])]
+  tables, nodes = compact.share_tables(
+    [compact.encode_content(content), None, compact.encode_content(other)]
+  )
+  assert tables['strings'].count('ranger_token') == 1
+
+  path = tmp_path / 'group.bundle'
+  path.write_bytes(
+    bundle.build_bundle(
+      ((str(i), json.dumps(entry).encode('utf8')) for i, entry in enumerate(nodes)),
+      tables,
+    )
+  )
+  with path.open('rb') as f:
+    index, _ = bundle.read_index(f)
+  # Each entry is read on its own against the tables in the index
+  entries = [json.loads(bundle.read_entry(path, str(i))) for i in range(3)]
+  assert entries[1] is None
+  tables = index.get('tables')
+  assert tables is not None
+  assert compact.decode_nodes(tables, entries[0]['nodes']) == content
+  assert compact.decode_nodes(tables, entries[2]['nodes']) == other
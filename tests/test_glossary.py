@@ -0,0 +1,120 @@
+from typing import Any
+
+from app import glossary, tags
+
+
+def text(value: str):
+  return tags.TagText('text', value)
+
+
+def link(href: str, value: str):
+  return tags.TagLink('a', href, [text(value)])
+
+
+def paragraph(*items: tags.Tag[Any]):
+  return tags.TagFormattedText('p', None, list(items))
+
+
+TERMS = glossary.glossary_terms(
+  {
+    'rules_glossary': 'Rules Glossary',
+    'rules_glossary/a': 'A',
+    'rules_glossary/ambush': 'Ambush (Keyword)',
+    'rules_glossary/fatigue': 'Fatigue',
+    'rules_glossary/fatigue_pile': 'Fatigue Pile',
+    'rules_glossary/pile_of_cards': 'Pile of Cards',
+    'rules_glossary/powered': 'Powered [X]',
+    'campaign_guides/lure/setup': 'Setup',
+  }
+)
+
+
+def test_terms():
+  assert TERMS == {
+    ('ambush',): 'rules_glossary/ambush',
+    ('fatigue',): 'rules_glossary/fatigue',
+    ('fatigue', 'pile'): 'rules_glossary/fatigue_pile',
+    ('pile', 'of', 'cards'): 'rules_glossary/pile_of_cards',
+    ('powered',): 'rules_glossary/powered',
+  }
+
+
+def test_search_finds_overlapping_matches():
+  automaton = glossary.Automaton([('a', 'b'), ('b', 'c'), ('b',), ('a', 'b', 'c', 'd')])
+  matches = [
+    (start, end, automaton.lengths[state])
+    for start, end, state in automaton.search(['x', 'a', 'b', 'c', 'd'])
+  ]
+  assert matches == [(1, 2, 2), (2, 2, 1), (2, 3, 2), (1, 4, 4)]
+
+
+def test_leftmost_longest():
+  linker = glossary.GlossaryLinker(TERMS)
+  items = linker.link(
+    'campaign_guides/lure/setup', [text('Put it on the fatigue pile of cards.')]
+  )
+  assert items == [
+    text('Put it on the '),
+    link('rules_glossary/fatigue_pile', 'fatigue pile'),
+    text(' of cards.'),
+  ]
+
+
+def test_first_mention_only():
+  linker = glossary.GlossaryLinker(TERMS)
+  items = linker.link(
+    'campaign_guides/lure/setup',
+    [
+      paragraph(text('Suffer Fatigue, then more FATIGUE.')),
+      paragraph(text('An Ambush adds fatigue.')),
+    ],
+  )
+  assert items == [
+    paragraph(
+      text('Suffer '),
+      link('rules_glossary/fatigue', 'Fatigue'),
+      text(', then more FATIGUE.'),
+    ),
+    paragraph(
+      text('An '), link('rules_glossary/ambush', 'Ambush'), text(' adds fatigue.')
+    ),
+  ]
+
+
+def test_existing_links_entries_and_titles_are_skipped():
+  linker = glossary.GlossaryLinker(TERMS)
+  items: list[tags.Tag[Any]] = [
+    tags.TagTitle('h2', 'fatigue', [text('Fatigue')]),
+    paragraph(
+      link('rules_glossary/ambush#setup', 'Ambush'),
+      tags.TagEntry('entry', [text('Powered')]),
+      text(' fatigue, ambush and powered'),
+    ),
+  ]
+  assert linker.link('campaign_guides/lure/setup', items) == [
+    items[0],
+    paragraph(
+      link('rules_glossary/ambush#setup', 'Ambush'),
+      tags.TagEntry('entry', [text('Powered')]),
+      text(' '),
+      link('rules_glossary/fatigue', 'fatigue'),
+      # Already linked above
+      text(', ambush and '),
+      link('rules_glossary/powered', 'powered'),
+    ),
+  ]
+
+
+def test_a_term_is_not_linked_to_itself():
+  linker = glossary.GlossaryLinker(TERMS)
+  items: list[tags.Tag[Any]] = [text('Fatigue goes on the fatigue pile.')]
+  assert linker.link('rules_glossary/fatigue', items) == [
+    text('Fatigue goes on the '),
+    link('rules_glossary/fatigue_pile', 'fatigue pile'),
+    text('.'),
+  ]
+  # The longer term still hides the shorter one inside it
+  assert linker.link('rules_glossary/fatigue_pile', items) == [
+    link('rules_glossary/fatigue', 'Fatigue'),
+    text(' goes on the fatigue pile.'),
+  ]
@@ -0,0 +1,16 @@
+from app import memo
+
+
+def test_least_recently_used_is_evicted():
+  cache = memo.LRUCache[str, int](2)
+  cache.put('a', 1)
+  cache.put('b', 2)
+  assert cache.get('a') == 1
+  cache.put('c', 3)
+
+  assert cache.get('b') is None
+  assert cache.get('a') == 1
+  assert cache.get('c') == 3
+  assert cache.stats() == memo.MemoStats(
+    size=2, maxsize=2, hits=3, misses=1, hit_rate=0.75
+  )
@@ -0,0 +1,87 @@
+from typing import Any
+
+from app import merkle, tags
+
+
+def text(value: str):
+  return tags.TagText('text', value)
+
+
+def title(anchor: str | None, value: str):
+  return tags.TagTitle('h2', anchor, [text(value)])
+
+
+def content(*sections: str) -> list[tags.Tag[Any]]:
+  items: list[tags.Tag[Any]] = [text('intro')]
+  for section in sections:
+    items += [
+      title(section, section.title()),
+      tags.TagFormattedText('p', None, [text(f'{section} text')]),
+    ]
+  return items
+
+
+def manifest(pages: dict[str, tuple[list[tags.Tag[Any]], list[str]]]):
+  builder = merkle.ManifestBuilder()
+  for resource_id, (items, children) in pages.items():
+    builder.add(
+      resource_id, resource_id.title(), f'/docs/{resource_id}', items, children
+    )
+  return builder.build(['guide'])
+
+
+def test_equal_trees_hash_the_same():
+  assert merkle.hash_items(content('setup')) == merkle.hash_items(content('setup'))
+  assert merkle.hash_items(content('setup')) != merkle.hash_items(content('day_1'))
+  # Fields are hashed by name, a link and a color with the same text differ
+  link = tags.TagLink('a', 'x', [text('a')])
+  span = tags.TagFormattedText('span', 'x', [text('a')])
+  assert merkle.hash_tag(link) != merkle.hash_tag(span)
+  assert merkle.node_hash(link).links and not merkle.node_hash(span).links
+
+
+def test_sections_split_at_titles_with_an_id():
+  items = [*content('setup'), title(None, 'No id'), text('more')]
+  assert [
+    (anchor, len(section)) for anchor, section in merkle.iter_sections(items)
+  ] == [('', 1), ('#setup', 4)]
+
+
+def test_diff():
+  old = manifest(
+    {
+      'guide': (content('setup'), ['guide/a', 'guide/b']),
+      'guide/a': (content('setup', 'day_1'), []),
+      'guide/b': (content('setup'), ['guide/b/1']),
+      'guide/b/1': (content(), []),
+    }
+  )
+  new = manifest(
+    {
+      'guide': (content('setup'), ['guide/a', 'guide/c']),
+      'guide/a': (content('setup', 'day_2'), []),
+      'guide/c': (content(), []),
+    }
+  )
+  diffs = [
+    (diff.resource_id, diff.status, diff.sections)
+    for diff in merkle.diff_manifests(old, new)
+  ]
+  assert diffs == [
+    ('guide/a', 'changed', [('#day_2', 'added'), ('#day_1', 'removed')]),
+    ('guide/c', 'added', []),
+    ('guide/b', 'removed', []),
+    ('guide/b/1', 'removed', []),
+  ]
+  assert list(merkle.diff_manifests(old, old)) == []
+
+
+def test_unchanged_subtrees_are_skipped():
+  pages = {
+    'guide': (content('setup'), ['guide/a']),
+    'guide/a': (content('setup'), []),
+  }
+  old = manifest(pages)
+  new = manifest({**pages, 'guide': (content('day_1'), ['guide/a'])})
+  assert old['resources']['guide/a']['tree'] == new['resources']['guide/a']['tree']
+  assert [diff.resource_id for diff in merkle.diff_manifests(old, new)] == ['guide']
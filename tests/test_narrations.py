@@ -0,0 +1,110 @@
+import json
+import pathlib
+
+import pytest
+
+from app import merkle, narrations, util
+
+
+def item(narration_id: str, content: str, url: str = '/docs/rules_glossary/fatigue'):
+  return util.NarrationItem(narration_id, url, content)
+
+
+OLD = narrations.build_store(
+  [
+    item('rules_glossary.fatigue.narration_1', 'You rest.'),
+    item('rules_glossary.fatigue.narration_2', 'You walk on.'),
+    item('rules_glossary.ranger_token.narration_1', 'A token.'),
+  ]
+)
+
+
+def test_build_store():
+  assert OLD['version'] == narrations.NARRATIONS_VERSION
+  assert OLD['narrations']['rules_glossary.fatigue.narration_1'] == {
+    'url': '/docs/rules_glossary/fatigue',
+    'hash': merkle.hash_values(('You rest.',)),
+    'content': 'You rest.',
+  }
+
+
+def test_build_store_fills_in_hashes():
+  hashes = dict[str, str]()
+  store = narrations.build_store([item('a.narration_1', 'You rest.')], hashes)
+  assert hashes == {'a.narration_1': merkle.hash_values(('You rest.',))}
+
+  # Known hashes are not computed again
+  hashes['a.narration_1'] = 'cached'
+  assert narrations.build_store([item('a.narration_1', 'You rest.')], hashes) == {
+    **store,
+    'narrations': {
+      'a.narration_1': {**store['narrations']['a.narration_1'], 'hash': 'cached'}
+    },
+  }
+
+
+def test_diff_stores():
+  new = narrations.build_store(
+    [
+      item('rules_glossary.fatigue.narration_1', 'You rest.'),
+      # Only the text counts, not where it is
+      item('rules_glossary.fatigue.narration_2', 'You walk on.', '/docs/faq'),
+      item('rules_glossary.ranger_token.narration_2', 'Another token.'),
+      item('rules_glossary.ranger_token.narration_1', 'A new token.'),
+    ]
+  )
+  feed = narrations.diff_stores(OLD, new)
+  assert feed['version'] == narrations.NARRATIONS_VERSION
+  assert [(change['id'], change['status']) for change in feed['changes']] == [
+    ('rules_glossary.ranger_token.narration_2', 'added'),
+    ('rules_glossary.ranger_token.narration_1', 'changed'),
+  ]
+  assert feed['changes'][1]['content'] == 'A new token.'
+  assert narrations.summary(feed) == '1 added, 1 changed, 0 removed'
+
+  feed = narrations.diff_stores(new, OLD)
+  assert [(change['id'], change['status']) for change in feed['changes']] == [
+    ('rules_glossary.ranger_token.narration_1', 'changed'),
+    ('rules_glossary.ranger_token.narration_2', 'removed'),
+  ]
+  assert feed['changes'][1] == {
+    'id': 'rules_glossary.ranger_token.narration_2',
+    'status': 'removed',
+    'url': '/docs/rules_glossary/fatigue',
+    'hash': merkle.hash_values(('Another token.',)),
+    'content': None,
+  }
+
+  assert narrations.diff_stores(OLD, OLD)['changes'] == []
+
+
+def test_without_an_old_store_everything_is_added():
+  feed = narrations.diff_stores(None, OLD)
+  assert [change['status'] for change in feed['changes']] == ['added'] * 3
+  assert narrations.summary(feed) == '3 added, 0 changed, 0 removed'
+
+
+def test_read_store(tmp_path: pathlib.Path):
+  path = tmp_path / 'narrations.json'
+  path.write_text(json.dumps(OLD), 'utf8')
+  assert narrations.read_store(path) == OLD
+
+  path.write_text(json.dumps({**OLD, 'version': 0}), 'utf8')
+  with pytest.raises(ValueError, match='unsupported narrations version 0'):
+    narrations.read_store(path)
+
+
+def test_print_feed(capsys: pytest.CaptureFixture[str]):
+  new = narrations.build_store(
+    [
+      item('rules_glossary.fatigue.narration_1', 'You rest now.'),
+      item('rules_glossary.fatigue.narration_3', 'You stop.'),
+    ]
+  )
+  narrations.print_feed(narrations.diff_stores(OLD, new))
+  assert capsys.readouterr().out.splitlines() == [
+    '~ rules_glossary.fatigue.narration_1',
+    '+ rules_glossary.fatigue.narration_3',
+    '- rules_glossary.fatigue.narration_2',
+    '- rules_glossary.ranger_token.narration_1',
+  ]
@@ -0,0 +1,111 @@
+import pytest
+
+from app import nav, profiles, util
+
+from .conftest import SITE, sidebar
+
+LAYOUT = profiles.SiteLayout()
+
+SIDEBAR = """
+<div class="sidebar_njMd"><nav class="menu thin-scrollbar menu_SIkG">
+<ul class="menu__list">
+  <li class="menu__list-item">
+    <div class="menu__list-item-collapsible">
+      <a class="menu__link menu__link--sublist" href="/docs/category/campaign-guides/">Campaign Guides</a>
+    </div>
+    <ul class="menu__list">
+      <li class="menu__list-item">
+        <div class="menu__list-item-collapsible">
+          <a class="menu__link menu__link--sublist" href="/docs/lure">Lure of the Valley</a>
+        </div>
+        <ul class="menu__list">
+          <li class="menu__list-item"><a class="menu__link" href="/docs/lure/1_01">1.01</a></li>
+        </ul>
+      </li>
+    </ul>
+  </li>
+  <li class="menu__list-item menu__list-item--collapsed">
+    <div class="menu__list-item-collapsible">
+      <a class="menu__link menu__link--sublist" href="/docs/rules_glossary">Rules Glossary</a>
+    </div>
+  </li>
+  <li class="menu__list-item"><span class="menu__divider">Community</span></li>
+  <li class="menu__list-item"><a class="menu__link" href="https://example.com/discord">Discord</a></li>
+  <li class="menu__list-item"><a class="menu__link" href="/docs/faq/"></a></li>
+</ul>
+</nav></div>
+"""
+
+
+def test_parse_sidebar():
+  assert nav.parse_sidebar(util.parse_html(SIDEBAR), LAYOUT) == [
+    nav.NavItem(
+      'Campaign Guides',
+      '/docs/category/campaign-guides',
+      [
+        nav.NavItem(
+          'Lure of the Valley',
+          '/docs/lure',
+          [nav.NavItem('1.01', '/docs/lure/1_01', [])],
+        )
+      ],
+    ),
+    # Collapsed, its items are on the pages below it
+    nav.NavItem('Rules Glossary', '/docs/rules_glossary', None),
+    # Items without a link are left out, links are taken to be pages
+    nav.NavItem('Discord', 'https://example.com/discord', []),
+    nav.NavItem('', '/docs/faq', []),
+  ]
+
+
+def test_merge_nests_resource_ids():
+  index = nav.NavIndex()
+  index.merge(nav.parse_sidebar(util.parse_html(SIDEBAR), LAYOUT))
+  assert index.get('/docs/category/campaign-guides') == nav.NavEntry(
+    'campaign_guides',
+    'Campaign Guides',
+    [('lure_of_the_valley', 'Lure of the Valley', '/docs/lure')],
+  )
+  assert index.get('/docs/lure') == nav.NavEntry(
+    'campaign_guides/lure_of_the_valley',
+    'Lure of the Valley',
+    [('1_01', '1.01', '/docs/lure/1_01')],
+  )
+  assert index.get('/docs/lure/1_01') == nav.NavEntry(
+    'campaign_guides/lure_of_the_valley/1_01', '1.01', []
+  )
+  assert index.get('https://example.com/discord').items == []
+
+
+def test_merge_fills_in_collapsed_categories():
+  index = nav.NavIndex()
+  index.merge(nav.parse_sidebar(util.parse_html(sidebar(SITE, {'/docs/faq'})), LAYOUT))
+  assert index.known('/docs/faq')
+  assert not index.known('/docs/rules_glossary')
+  assert not index.known('/docs/rules_glossary/fatigue')
+  with pytest.raises(ValueError, match='/docs/rules_glossary is not in the sidebar'):
+    index.get('/docs/rules_glossary')
+  assert index.entries['/docs/rules_glossary'].resource_id == 'rules_glossary'
+
+  index.merge(
+    nav.parse_sidebar(util.parse_html(sidebar(SITE, {'/docs/rules_glossary'})), LAYOUT)
+  )
+  glossary = index.get('/docs/rules_glossary')
+  assert glossary.items == [
+    ('fatigue', 'Fatigue', '/docs/rules_glossary/fatigue'),
+    ('ranger_token', 'Ranger Token', '/docs/rules_glossary/ranger_token'),
+  ]
+  assert (
+    index.get('/docs/rules_glossary/fatigue').resource_id == 'rules_glossary/fatigue'
+  )
+
+  # A sidebar with the category collapsed again keeps what is known
+  index.merge(nav.parse_sidebar(util.parse_html(sidebar(SITE, {'/docs/faq'})), LAYOUT))
+  assert index.get('/docs/rules_glossary') == glossary
+
+
+def test_unknown_urls():
+  index = nav.NavIndex()
+  assert not index.known('/docs/faq')
+  with pytest.raises(ValueError, match='/docs/faq is not in the sidebar'):
+    index.get('/docs/faq')
@@ -0,0 +1,109 @@
+import pathlib
+
+import pytest
+
+from app import pagecache, profiles, util
+from app.main import Scraper
+
+from .conftest import site_scraper
+
+URL = '/docs/rules_glossary/fatigue'
+
+
+def test_key(tmp_path: pathlib.Path):
+  cache = pagecache.PageCache(tmp_path, 'v1')
+  key = cache.key('<p>Über</p>')
+  assert key == cache.key('<p>Über</p>')
+  assert len(key) == 40
+  assert cache.path(key) == tmp_path / key[:2] / f'{key}.pickle'
+
+  assert cache.key('<p>Uber</p>') != key
+  assert pagecache.PageCache(tmp_path, 'v2').key('<p>Über</p>') != key
+
+
+def test_parser_version(tmp_path: pathlib.Path):
+  source = tmp_path / 'parser.py'
+  source.write_text('PARSER = 1\n', 'utf8')
+  version = pagecache.parser_version('https://example.com', 'layout', [source])
+  assert version == pagecache.parser_version('https://example.com', 'layout', [source])
+  assert version != pagecache.parser_version('https://example.org', 'layout', [source])
+  assert version != pagecache.parser_version(
+    'https://example.com', 'other layout', [source]
+  )
+
+  source.write_text('PARSER = 2\n', 'utf8')
+  assert version != pagecache.parser_version('https://example.com', 'layout', [source])
+
+
+def test_unchanged_pages_are_reused(tmp_path: pathlib.Path, site_cache: pathlib.Path):
+  first = site_scraper(tmp_path, site_cache, 'first')
+  first.scrape()
+  assert (first.page_cache.misses, first.page_cache.hits) == (8, 0)
+
+  second = site_scraper(tmp_path, site_cache, 'second')
+  second.scrape()
+  assert (second.page_cache.misses, second.page_cache.hits) == (0, 8)
+  assert second.stats() == first.stats()
+  assert second.RESOURCE_NARRATION_IDS == first.RESOURCE_NARRATION_IDS
+
+
+def test_changed_html_is_parsed_again(tmp_path: pathlib.Path, site_cache: pathlib.Path):
+  site_scraper(tmp_path, site_cache, 'first').load_page(URL)
+
+  path = util.cache_path(site_cache, URL)
+  path.write_text(path.read_text('utf8').replace('trail', 'path'), 'utf8')
+  second = site_scraper(tmp_path, site_cache, 'second')
+  page = second.load_page(URL)
+  assert (second.page_cache.misses, second.page_cache.hits) == (1, 0)
+  assert 'path' in repr(page.content)
+
+
+def test_a_new_parser_version_parses_again(
+  tmp_path: pathlib.Path, site_cache: pathlib.Path
+):
+  site_scraper(tmp_path, site_cache, 'first').load_page(URL)
+
+  # The layout is part of the version
+  layout = profiles.SiteLayout(text_colors={'blue_text': 'blue'})
+  second = site_scraper(tmp_path, site_cache, 'second', layout)
+  second.load_page(URL)
+  assert (second.page_cache.misses, second.page_cache.hits) == (1, 0)
+
+  third = site_scraper(tmp_path, site_cache, 'third', layout)
+  third.load_page(URL)
+  assert (third.page_cache.misses, third.page_cache.hits) == (0, 1)
+
+
+def test_failed_pages_are_not_reused(
+  tmp_path: pathlib.Path, site_cache: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+  failing = site_scraper(tmp_path, site_cache, 'failing')
+  with monkeypatch.context() as patch:
+
+    def parse_page(*args: object):
+      raise ValueError('bad page')
+
+    patch.setattr(Scraper, 'parse_page', parse_page)
+    with pytest.raises(ValueError, match='bad page'):
+      failing.load_page(URL)
+  assert list(failing.page_cache.directory.rglob('*.pickle')) == []
+  # What the failed parse had seen is left out of the site's stats
+  assert failing.stats() == site_scraper(tmp_path, site_cache, 'new').stats()
+
+  second = site_scraper(tmp_path, site_cache, 'second')
+  second.load_page(URL)
+  assert (second.page_cache.misses, second.page_cache.hits) == (1, 0)
+
+
+def test_broken_pickles_are_parsed_again(
+  tmp_path: pathlib.Path, site_cache: pathlib.Path
+):
+  first = site_scraper(tmp_path, site_cache, 'first')
+  page = first.load_page(URL)
+  (path,) = first.page_cache.directory.rglob('*.pickle')
+  path.write_bytes(path.read_bytes()[:10])
+
+  second = site_scraper(tmp_path, site_cache, 'second')
+  assert second.load_page(URL) == page
+  assert (second.page_cache.misses, second.page_cache.hits) == (1, 0)
+  assert second.page_cache.get(path.stem) is not None
@@ -0,0 +1,65 @@
+import asyncio
+import random
+import time
+
+from app import pipeline
+
+
+def test_dependencies():
+  dependencies = pipeline.Dependencies[str]()
+  assert dependencies.add('a', ['b', 'c', 'a']) == []
+  assert dependencies.add('b', ['c']) == []
+  assert dependencies.add('d', ['b']) == ['d']
+  # The new item first, then the ones that were waiting in the order they
+  # were added
+  assert dependencies.add('c', []) == ['c', 'a', 'b']
+  assert dependencies.waiting == {}
+
+
+def test_missing_dependencies_keep_waiting():
+  dependencies = pipeline.Dependencies[str]()
+  assert dependencies.add('a', ['missing']) == []
+  assert dependencies.waiting == {'a': {'missing'}}
+
+
+def test_ordered_keeps_the_order():
+  def work(item: int):
+    time.sleep(random.random() / 100)
+    return item * 2
+
+  async def run(stage: pipeline.Stage[int, int]):
+    return [
+      result async for result in pipeline.ordered(stage, pipeline.iterate(range(40)), 8)
+    ]
+
+  stage = pipeline.Stage('double', work, 4)
+  try:
+    assert asyncio.run(run(stage)) == [item * 2 for item in range(40)]
+  finally:
+    stage.close()
+
+  stats = stage.stats(1.0)
+  assert stats['items'] == 40
+  assert stats['workers'] == 4
+  assert 0 < stats['utilization'] <= 1
+
+
+def test_queue_size_holds_the_stage_back():
+  started = list[int]()
+
+  async def run(stage: pipeline.Stage[int, int]):
+    results = pipeline.ordered(stage, pipeline.iterate(range(20)), 3)
+    first = await anext(results)
+    await asyncio.sleep(0.05)
+    # The one consumed, the ones queued and the one waiting to be queued
+    assert len(started) <= 5
+    await results.aclose()
+    return first
+
+  stage = pipeline.Stage[int, int](
+    'record', lambda item: started.append(item) or item, 2
+  )
+  try:
+    assert asyncio.run(run(stage)) == 0
+  finally:
+    stage.close()
@@ -0,0 +1,35 @@
+import pathlib
+
+import pytest
+
+from app import constants, profiles
+
+
+def test_default_site_keeps_its_title():
+  profile = profiles.read_profile(
+    {'name': 'living_valley_fr', 'page_urls': ['/fr/docs/rules_glossary']}
+  )
+  assert profile.title == constants.SITE_TITLE
+  assert profile.output_dir == pathlib.Path('sites', 'living_valley_fr', 'output')
+
+
+def test_other_sites_are_titled_by_name():
+  profile = profiles.read_profile(
+    {'name': 'other_game', 'base_url': 'https://rules.example.com'}
+  )
+  assert profile.title == 'other_game'
+  assert profile.cache_dir == pathlib.Path('cache', 'rules.example.com')
+
+  profile = profiles.read_profile(
+    {
+      'name': 'other_game',
+      'base_url': 'https://rules.example.com',
+      'title': 'Other Game',
+    }
+  )
+  assert profile.title == 'Other Game'
+
+
+def test_unknown_fields_are_refused():
+  with pytest.raises(ValueError, match='unknown profile fields: titel'):
+    profiles.read_profile({'name': 'other_game', 'titel': 'Other Game'})
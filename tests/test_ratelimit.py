@@ -0,0 +1,157 @@
+import pathlib
+import time
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+from app import ratelimit, util
+from bench.server import MockSite, ServerConfig
+
+
+def session_for(controller: ratelimit.RateController, throttle_retries: int = 5):
+  session = requests.Session()
+  adapter = ratelimit.new_adapter(controller)
+  adapter.throttle_retries = throttle_retries
+  session.mount('http://', adapter)
+  return session
+
+
+@pytest.fixture
+def site_dir(tmp_path: pathlib.Path):
+  directory = tmp_path / 'site'
+  (directory / 'docs').mkdir(parents=True)
+  (directory / 'docs' / 'page.html').write_text('<html>page</html>', 'utf8')
+  return directory
+
+
+def test_parse_retry_after():
+  assert ratelimit.parse_retry_after('3') == 3
+  assert ratelimit.parse_retry_after('-1') == 0
+  assert ratelimit.parse_retry_after(None) is None
+  assert ratelimit.parse_retry_after('soon') is None
+
+  later = format_datetime(datetime.now(UTC) + timedelta(seconds=30), usegmt=True)
+  assert 25 < (ratelimit.parse_retry_after(later) or 0) <= 30
+
+
+def test_burst_then_rate():
+  controller = ratelimit.RateController(rate=20, burst=2, max_rate=20)
+  start = time.monotonic()
+  controller.acquire()
+  controller.acquire()
+  assert time.monotonic() - start < 0.02
+
+  controller.acquire()
+  assert time.monotonic() - start >= 0.04
+
+
+def test_fast_responses_raise_the_rate():
+  controller = ratelimit.RateController(rate=4, max_rate=6)
+  for _ in range(50):
+    controller.record(time.monotonic(), 200, 0.01, None)
+  assert controller.rate == 6
+
+
+def test_throttled_response_slows_down_once_per_burst():
+  controller = ratelimit.RateController(rate=8, min_rate=1)
+  sent_at = time.monotonic()
+  controller.record(sent_at, 429, 0.01, 2)
+  assert controller.rate == 4
+  assert controller.throttled == 1
+  assert controller.blocked_until >= time.monotonic() + 1.9
+
+  # Sent before the first one was answered, so it doesn't count again
+  controller.record(sent_at, 503, 0.01, None)
+  assert controller.rate == 4
+  assert controller.throttled == 2
+
+
+def test_slow_responses_slow_down():
+  controller = ratelimit.RateController(rate=8, target_latency=0.5)
+  controller.record(time.monotonic(), 200, 1, None)
+  assert controller.rate < 8
+
+
+def test_latencies_are_bounded():
+  controller = ratelimit.RateController()
+  for i in range(ratelimit.LATENCY_SAMPLES + 10):
+    controller.record(time.monotonic(), 200, i, None)
+  assert len(controller.latencies) == ratelimit.LATENCY_SAMPLES
+  assert controller.latencies[-1] == ratelimit.LATENCY_SAMPLES + 9
+
+
+def test_urllib3_leaves_throttling_to_the_controller():
+  retry = ratelimit.new_adapter(ratelimit.RateController()).max_retries
+  assert not retry.respect_retry_after_header
+  assert not set(ratelimit.THROTTLE_STATUSES) & set(retry.status_forcelist or ())
+
+
+def test_throttled_requests_are_retried_by_the_adapter(site_dir: pathlib.Path):
+  config = ServerConfig(latency=0, jitter=0, throttle_rate=0.5, retry_after=0, seed=4)
+  with MockSite(site_dir, config) as mock:
+    controller = ratelimit.RateController(rate=100, min_rate=50)
+    response = session_for(controller, throttle_retries=20).get(
+      f'{mock.base_url}/docs/page'
+    )
+
+  assert response.status_code == 200
+  assert mock.stats.throttled > 0
+  assert controller.requests == mock.stats.requests
+  assert controller.throttled == mock.stats.throttled
+
+
+def test_get_content_caches_pages(site_dir: pathlib.Path, tmp_path: pathlib.Path):
+  cache_dir = tmp_path / 'cache'
+  with MockSite(site_dir, ServerConfig(latency=0, jitter=0)) as mock:
+    session = session_for(ratelimit.RateController(rate=100))
+    assert (
+      util.get_content(session, mock.base_url, cache_dir, '/docs/page')
+      == '<html>page</html>'
+    )
+    assert (
+      util.get_content(session, mock.base_url, cache_dir, '/docs/page')
+      == '<html>page</html>'
+    )
+
+  assert mock.stats.requests == 1
+  assert (
+    util.cache_path(cache_dir, '/docs/page').read_text('utf8') == '<html>page</html>'
+  )
+
+
+def test_get_content_never_caches_errors(
+  site_dir: pathlib.Path, tmp_path: pathlib.Path
+):
+  cache_dir = tmp_path / 'cache'
+  config = ServerConfig(latency=0, jitter=0, throttle_rate=1, retry_after=0)
+  with MockSite(site_dir, config) as mock:
+    session = session_for(
+      ratelimit.RateController(rate=100, min_rate=50), throttle_retries=2
+    )
+    with pytest.raises(requests.HTTPError):
+      util.get_content(session, mock.base_url, cache_dir, '/docs/page')
+  assert mock.stats.throttled == 3
+
+  with MockSite(site_dir, ServerConfig(latency=0, jitter=0)) as mock:
+    session = session_for(ratelimit.RateController(rate=100))
+    with pytest.raises(requests.HTTPError):
+      util.get_content(session, mock.base_url, cache_dir, '/docs/missing')
+
+  assert not any(cache_dir.rglob('*.html'))
+
+
+def test_retries_are_counted(site_dir: pathlib.Path):
+  config = ServerConfig(
+    latency=0, jitter=0, throttle_rate=0.2, error_rate=0.2, retry_after=0, seed=4
+  )
+  with MockSite(site_dir, config) as mock:
+    controller = ratelimit.RateController(rate=100, min_rate=50)
+    session = session_for(controller, throttle_retries=20)
+    for _ in range(10):
+      assert session.get(f'{mock.base_url}/docs/page').status_code == 200
+
+  assert mock.stats.errors > 0
+  assert controller.retries == mock.stats.throttled + mock.stats.errors
+  assert controller.retries == mock.stats.requests - 10
@@ -0,0 +1,54 @@
+import pathlib
+
+import pytest
+
+from app import shard
+
+from .conftest import SITE_ROOTS, site_scraper
+
+
+def read_tree(directory: pathlib.Path):
+  return {
+    path.relative_to(directory): path.read_bytes()
+    for path in sorted(directory.rglob('*'))
+    if path.is_file()
+  }
+
+
+def test_merged_shards_are_the_full_build(
+  tmp_path: pathlib.Path, site_cache: pathlib.Path
+):
+  full = site_scraper(tmp_path, site_cache, 'full')
+  full.scrape()
+
+  glossary_root, *other_roots = reversed(SITE_ROOTS)
+  site_scraper(tmp_path, site_cache, 'a').shard(
+    tmp_path / 'a.shard', [glossary_root], set()
+  )
+  site_scraper(tmp_path, site_cache, 'b').shard(
+    tmp_path / 'b.shard',
+    other_roots,
+    {'/docs/campaign_guides/lure_of_the_valley/1_02'},
+  )
+  site_scraper(tmp_path, site_cache, 'c').shard(
+    tmp_path / 'c.shard', ['/docs/campaign_guides/lure_of_the_valley/1_02'], set()
+  )
+  merged = site_scraper(tmp_path, site_cache, 'merged')
+  # Shards can be given in any order
+  merged.merge([tmp_path / 'c.shard', tmp_path / 'b.shard', tmp_path / 'a.shard'])
+
+  assert read_tree(full.output_dir) == read_tree(merged.output_dir)
+  assert len(read_tree(full.output_dir)) > 10
+
+
+def test_merge_needs_every_page(tmp_path: pathlib.Path, site_cache: pathlib.Path):
+  site_scraper(tmp_path, site_cache, 'a').shard(
+    tmp_path / 'a.shard', SITE_ROOTS, {'/docs/rules_glossary/fatigue'}
+  )
+  part = shard.read_shard(tmp_path / 'a.shard')
+  assert '/docs/rules_glossary/fatigue' not in [page.url for page in part.pages]
+
+  with pytest.raises(
+    ValueError, match='no shard contains /docs/rules_glossary/fatigue'
+  ):
+    site_scraper(tmp_path, site_cache, 'merged').merge([tmp_path / 'a.shard'])
@@ -0,0 +1,121 @@
+import pathlib
+
+import pytest
+
+from app import snapshots
+
+
+@pytest.fixture
+def output(tmp_path: pathlib.Path):
+  directory = tmp_path / 'output'
+  (directory / 'data').mkdir(parents=True)
+  (directory / 'data' / 'fatigue.json').write_text('{"title": "Fatigue"}', 'utf8')
+  (directory / 'data' / 'copy.json').write_text('{"title": "Fatigue"}', 'utf8')
+  (directory / 'lookup.json').write_text('{}', 'utf8')
+  (directory / 'lookup.json.tmp').write_text('{', 'utf8')
+  return directory
+
+
+def blobs(store: snapshots.SnapshotStore):
+  return sorted(path for path in store.objects_dir.rglob('*') if path.is_file())
+
+
+def test_save_stores_each_content_once(tmp_path: pathlib.Path, output: pathlib.Path):
+  store = snapshots.SnapshotStore(tmp_path / 'store')
+  first = store.save(
+    [('output', output, '*'), ('data', output / 'data', '*.json')], '1'
+  )
+  assert sorted(first['files']) == [
+    'data/copy.json',
+    'data/fatigue.json',
+    'output/data/copy.json',
+    'output/data/fatigue.json',
+    'output/lookup.json',
+  ]
+  fatigue = first['files']['output/data/fatigue.json']
+  assert fatigue['size'] == len('{"title": "Fatigue"}')
+  assert store.blob(fatigue['hash']).read_text('utf8') == '{"title": "Fatigue"}'
+  assert len(blobs(store)) == 2
+  assert store.read('1') == first
+
+  (output / 'lookup.json').write_text('{"a": 1}', 'utf8')
+  store.save([('output', output, '*')], '2')
+  assert len(blobs(store)) == 3
+  assert [info[:3] for info in store.history()] == [
+    ('1', first['created'], 5),
+    ('2', store.read('2')['created'], 3),
+  ]
+  assert [info.added for info in store.history()] == [
+    len('{"title": "Fatigue"}') + len('{}'),
+    len('{"a": 1}'),
+  ]
+
+  with pytest.raises(ValueError, match='snapshot 2 already exists'):
+    store.save([('output', output, '*')], '2')
+  with pytest.raises(ValueError, match='no snapshot named 3'):
+    store.read('3')
+
+
+def test_materialize_hardlinks_blobs(tmp_path: pathlib.Path, output: pathlib.Path):
+  store = snapshots.SnapshotStore(tmp_path / 'store')
+  snapshot = store.save([('output', output, '*')], '1')
+
+  target = tmp_path / 'restored'
+  assert store.materialize('1', target) == snapshot
+  for file, entry in snapshot['files'].items():
+    path = target / file
+    assert path.read_bytes() == (output / file.removeprefix('output/')).read_bytes()
+    assert path.stat().st_ino == store.blob(entry['hash']).stat().st_ino
+    # Shared with the store, so it can't be written to
+    assert path.stat().st_mode & 0o222 == 0
+  assert not (target / 'output' / 'lookup.json.tmp').exists()
+
+  with pytest.raises(ValueError, match='is not empty'):
+    store.materialize('1', target)
+
+
+def test_materialize_copies_across_filesystems(
+  tmp_path: pathlib.Path, output: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+  store = snapshots.SnapshotStore(tmp_path / 'store')
+  snapshot = store.save([('output', output, '*')], '1')
+
+  def hardlink_to(self: pathlib.Path, target: pathlib.Path):
+    raise OSError('cross-device link')
+
+  monkeypatch.setattr(pathlib.Path, 'hardlink_to', hardlink_to)
+  target = tmp_path / 'restored'
+  store.materialize('1', target)
+  for file, entry in snapshot['files'].items():
+    path = target / file
+    assert path.read_bytes() == store.blob(entry['hash']).read_bytes()
+    assert path.stat().st_ino != store.blob(entry['hash']).stat().st_ino
+
+
+def test_gc_keeps_what_snapshots_reference(
+  tmp_path: pathlib.Path, output: pathlib.Path
+):
+  store = snapshots.SnapshotStore(tmp_path / 'store')
+  assert store.gc() == snapshots.GcStats(0, 0, 0)
+
+  first = store.save([('output', output, '*')], '1')
+  (output / 'lookup.json').write_text('{"a": 1}', 'utf8')
+  second = store.save([('output', output, '*')], '2')
+  # Left behind by an interrupted save
+  orphan = store.put(b'orphan')
+  assert store.gc() == snapshots.GcStats(3, 1, len(b'orphan'))
+  assert not store.blob(orphan['hash']).exists()
+
+  store.remove('1')
+  assert store.names() == ['2']
+  assert store.gc() == snapshots.GcStats(2, 1, len('{}'))
+  assert not store.blob(first['files']['output/lookup.json']['hash']).exists()
+  assert {path.parent.name + path.name for path in blobs(store)} == {
+    entry['hash'] for entry in second['files'].values()
+  }
+  # Directories left empty are removed
+  assert all(any(directory.iterdir()) for directory in store.objects_dir.iterdir())
+
+  restored = tmp_path / 'restored'
+  store.materialize('2', restored)
+  assert (restored / 'output' / 'lookup.json').read_text('utf8') == '{"a": 1}'
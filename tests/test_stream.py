@@ -0,0 +1,59 @@
+import json
+import pathlib
+
+import pytest
+
+from app import stream, util
+
+
+def page(url: str, items: list[str] | None = None):
+  return util.Page(
+    url, url.strip('/'), url, [(item, item, item) for item in items or []], None
+  )
+
+
+def urls(pages: list[util.Page]):
+  return [page.url for page in pages]
+
+
+def test_pages_wait_for_their_links():
+  queue = stream.ResourceQueue()
+  assert urls(queue.add(page('/a'), ['/b', '/a'], False)) == []
+  assert urls(queue.add(page('/c'), [], False)) == ['/c']
+  assert urls(queue.add(page('/b'), ['/a'], False)) == ['/a', '/b']
+
+
+def test_groups_wait_for_every_member():
+  queue = stream.ResourceQueue()
+  assert urls(queue.add(page('/g', ['/g/a', '/g/b']), [], True)) == []
+  assert urls(queue.add(page('/g/a', ['/g/a/1']), [], False)) == ['/g/a']
+  assert urls(queue.add(page('/g/b'), [], False)) == ['/g/b']
+  assert urls(queue.add(page('/g/a/1'), [], False)) == ['/g', '/g/a/1']
+
+
+def test_rest_is_what_links_elsewhere():
+  queue = stream.ResourceQueue()
+  queue.add(page('/a'), ['/img/map.png'], False)
+  # Loaded pages count as soon as they are added, waiting or not
+  assert urls(queue.add(page('/b'), ['/a'], False)) == ['/b']
+  queue.add(page('/c'), ['/d'], False)
+  assert urls(queue.rest()) == ['/a', '/c']
+  assert queue.rest() == []
+
+
+def test_records_are_written_one_per_line(tmp_path: pathlib.Path):
+  path = tmp_path / 'records.ndjson'
+  with stream.RecordStream(str(path)) as records:
+    records.write({'type': 'resource', 'title': 'Über'})
+    records.write({'type': 'narration', 'id': 'a.b'})
+
+  assert records.records == 2
+  lines = path.read_bytes().splitlines()
+  assert [json.loads(line) for line in lines] == [
+    {'type': 'resource', 'title': 'Über'},
+    {'type': 'narration', 'id': 'a.b'},
+  ]
+  assert 'Über'.encode() in lines[0]
+  # Closed again once the with block is left
+  with pytest.raises(ValueError, match='not open'):
+    records.write({'type': 'resource'})
@@ -0,0 +1,152 @@
+import json
+import pathlib
+import zipfile
+
+import pytest
+
+from app import sync, writer
+
+
+def build(
+  root: pathlib.Path, files: dict[str, str], old: sync.SyncManifest | None = None
+):
+  with writer.OutputWriter(root) as output:
+    for name, text in files.items():
+      output.write_text(pathlib.PurePosixPath(name), text)
+    output.flush()
+    manifest = sync.written_manifest(output, old)
+  patch = sync.diff_manifests(old, manifest)
+  return manifest, patch
+
+
+def write_delta(path: pathlib.Path, patch: sync.SyncPatch, root: pathlib.Path):
+  path.write_bytes(sync.build_delta(patch, root))
+  return path
+
+
+def copy_files(root: pathlib.Path, files: dict[str, str]):
+  for name, text in files.items():
+    (root / name).parent.mkdir(parents=True, exist_ok=True)
+    (root / name).write_text(text, 'utf8')
+
+
+def read_tree(root: pathlib.Path):
+  return {
+    path.relative_to(root).as_posix(): path.read_text('utf8')
+    for path in root.rglob('*')
+    if path.is_file()
+  }
+
+
+OLD = {'data/a.json': 'a', 'data/b.json': 'b', 'lookup.json': 'lookup'}
+NEW = {
+  'data/a.json': 'a',
+  'data/b.json': 'b2',
+  'data/c/d.json': 'd',
+  'lookup.json': 'lookup2',
+}
+
+
+@pytest.fixture
+def builds(tmp_path: pathlib.Path):
+  old, _ = build(tmp_path / 'output', OLD)
+  new, patch = build(tmp_path / 'output', NEW, old)
+  return old, new, patch
+
+
+def test_patch_lists_the_changes(
+  builds: tuple[sync.SyncManifest, sync.SyncManifest, sync.SyncPatch],
+):
+  old, new, patch = builds
+  assert patch['old'] == old['hash']
+  assert patch['new'] == new['hash']
+  assert {change['path']: change['status'] for change in patch['changes']} == {
+    'data/b.json': 'changed',
+    'data/c/d.json': 'added',
+    'lookup.json': 'changed',
+  }
+
+
+def test_apply_delta(
+  tmp_path: pathlib.Path,
+  builds: tuple[sync.SyncManifest, sync.SyncManifest, sync.SyncPatch],
+):
+  _, new, patch = builds
+  delta = write_delta(tmp_path / 'delta.zip', patch, tmp_path / 'output')
+  local = tmp_path / 'local'
+  copy_files(local, OLD)
+
+  assert sync.apply_delta(local, delta)[1] == 3
+  assert read_tree(local) == NEW
+  assert sync.verify(local, new) == []
+
+  # Already up to date, applying it again changes nothing
+  assert sync.apply_delta(local, delta)[1] == 0
+
+
+def test_apply_delta_with_prefix(
+  tmp_path: pathlib.Path,
+  builds: tuple[sync.SyncManifest, sync.SyncManifest, sync.SyncPatch],
+):
+  _, new, patch = builds
+  delta = write_delta(tmp_path / 'delta.zip', patch, tmp_path / 'output')
+  local = tmp_path / 'local'
+  copy_files(local, {'a.json': 'a', 'b.json': 'b'})
+
+  assert sync.apply_delta(local, delta, 'data/')[1] == 2
+  assert read_tree(local) == {'a.json': 'a', 'b.json': 'b2', 'c/d.json': 'd'}
+  assert sync.verify(local, new, 'data/') == []
+
+
+def test_mismatched_copy_is_left_alone(
+  tmp_path: pathlib.Path,
+  builds: tuple[sync.SyncManifest, sync.SyncManifest, sync.SyncPatch],
+):
+  _, new, patch = builds
+  delta = write_delta(tmp_path / 'delta.zip', patch, tmp_path / 'output')
+  local = tmp_path / 'local'
+  copy_files(local, {**OLD, 'lookup.json': 'edited'})
+
+  with pytest.raises(ValueError, match='does not match'):
+    sync.apply_delta(local, delta)
+  assert read_tree(local) == {**OLD, 'lookup.json': 'edited'}
+  assert sorted(sync.verify(local, new)) == [
+    'data/b.json',
+    'data/c/d.json',
+    'lookup.json',
+  ]
+
+
+def test_removed_files_are_deleted(tmp_path: pathlib.Path):
+  old, _ = build(tmp_path / 'output', OLD)
+  _, patch = build(tmp_path / 'output', {'lookup.json': 'lookup'}, old)
+  delta = write_delta(tmp_path / 'delta.zip', patch, tmp_path / 'output')
+  local = tmp_path / 'local'
+  copy_files(local, OLD)
+
+  sync.apply_delta(local, delta)
+  assert read_tree(local) == {'lookup.json': 'lookup'}
+
+
+@pytest.mark.parametrize(
+  'name', ['../outside.json', 'data/../../outside.json', '/tmp/outside.json', '.']
+)
+def test_paths_outside_the_copy_are_refused(tmp_path: pathlib.Path, name: str):
+  change = sync.SyncChange(path=name, status='added', old=None, hash='0' * 64, size=1)
+  patch = sync.SyncPatch(
+    version=sync.SYNC_VERSION, old=None, new='', size=1, changes=[change]
+  )
+  delta = tmp_path / 'delta.zip'
+  with zipfile.ZipFile(delta, 'w') as archive:
+    archive.writestr(sync.PATCH_NAME, json.dumps(patch))
+    archive.writestr(name, 'x')
+  local = tmp_path / 'local'
+  local.mkdir()
+
+  with pytest.raises(ValueError, match='outside'):
+    sync.apply_delta(local, delta)
+  with pytest.raises(ValueError, match='outside'):
+    sync.verify(
+      local, sync.build_manifest({name: sync.SyncFile(hash='0' * 64, size=1)})
+    )
+  assert not (tmp_path / 'outside.json').exists()
@@ -0,0 +1,102 @@
+import os
+import pathlib
+from typing import Any
+
+from app import nav, tags, util, watch
+
+
+def page(
+  url: str,
+  resource_id: str,
+  title: str,
+  text: str = '',
+  items: list[tuple[str, str, str]] | None = None,
+):
+  content: list[tags.Tag[Any]] = [tags.TagText('text', text)]
+  return util.Page(url, resource_id, title, items or [], content)
+
+
+def lookup_group(resource_id: str):
+  parts = resource_id.split('/')
+  return '/'.join(parts[:2]) if len(parts) > 1 else None
+
+
+GROUP = page(
+  '/docs/g', 'g', 'Group', items=[('a', 'A', '/docs/g/a'), ('b', 'B', '/docs/g/b')]
+)
+A = page('/docs/g/a', 'g/a', 'A', 'a')
+B = page('/docs/g/b', 'g/b', 'B', 'b')
+OLD = {p.url: p for p in (GROUP, A, B)}
+
+
+def test_cache_watcher(tmp_path: pathlib.Path):
+  for url in ('/docs/g/a', '/docs/g/b'):
+    util.cache_path(tmp_path, url).parent.mkdir(parents=True, exist_ok=True)
+    util.cache_path(tmp_path, url).write_text(url, 'utf8')
+  cache = watch.CacheWatcher(tmp_path, ['/docs/g/a', '/docs/g/b'])
+  assert cache.changed() == []
+
+  path = util.cache_path(tmp_path, '/docs/g/b')
+  os.utime(path, ns=(0, 0))
+  assert cache.changed() == ['/docs/g/b']
+  cache.reset(['/docs/g/a', '/docs/g/b'])
+  assert cache.changed() == []
+
+  path.unlink()
+  assert cache.changed() == ['/docs/g/b']
+
+
+def test_reload_urls():
+  nav_index = nav.NavIndex()
+  nav_index.merge(
+    [
+      nav.NavItem(
+        'G',
+        '/docs/g',
+        [
+          nav.NavItem('A', '/docs/g/a', []),
+          nav.NavItem('Bee', '/docs/g/b', []),
+          nav.NavItem('C', '/docs/g/c', []),
+        ],
+      ),
+    ]
+  )
+  urls = ['/docs/g', '/docs/g/a', '/docs/g/b', '/docs/g/c']
+  # The group lists another page, b has a new id and c is new
+  assert watch.reload_urls(urls, [], OLD, nav_index) == [
+    '/docs/g',
+    '/docs/g/b',
+    '/docs/g/c',
+  ]
+  assert watch.reload_urls(urls, ['/docs/g/a'], OLD, nav_index) == urls
+
+
+def test_same_parse_is_left_alone():
+  pages = {**OLD, A.url: page(A.url, 'g/a', 'A', 'a')}
+  changes = watch.diff_pages(OLD, pages, [A.url], lookup_group)
+  assert changes == watch.PageChanges(set(), {}, {}, set(), False)
+
+
+def test_changed_content():
+  pages = {**OLD, A.url: page(A.url, 'g/a', 'A', 'changed')}
+  changes = watch.diff_pages(OLD, pages, [A.url], lookup_group)
+  assert changes == watch.PageChanges({A.url}, {}, {}, {'g/a'}, False)
+
+
+def test_renamed_and_removed_pages():
+  group = page(GROUP.url, 'g', 'Group', items=[('aa', 'AA', '/docs/g/a')])
+  renamed = page(A.url, 'g/aa', 'AA', 'a')
+  pages = {GROUP.url: group, A.url: renamed}
+  changes = watch.diff_pages(OLD, pages, [GROUP.url, A.url], lookup_group)
+  assert changes.affected == {GROUP.url, A.url}
+  assert changes.moved == {A.url: 'g/a'}
+  assert changes.removed == {B.url: 'g/b'}
+  assert changes.lookup_groups == {'g/a', 'g/aa', 'g/b'}
+  assert changes.index_changed
+
+
+def test_retitled_page_changes_the_index():
+  pages = {**OLD, B.url: page(B.url, 'g/b', 'Bee', 'b')}
+  changes = watch.diff_pages(OLD, pages, [B.url], lookup_group)
+  assert changes.affected == {B.url}
+  assert changes.index_changed
@@ -0,0 +1,84 @@
+import os
+import pathlib
+
+import pytest
+
+from app import writer
+
+
+def read_tree(root: pathlib.Path):
+  return {
+    path.relative_to(root).as_posix(): path.read_text('utf8')
+    for path in root.rglob('*')
+    if path.is_file()
+  }
+
+
+def test_commit_replaces_the_output(tmp_path: pathlib.Path):
+  root = tmp_path / 'output'
+  (root / 'old').mkdir(parents=True)
+  (root / 'old' / 'stale.json').write_text('{}', 'utf8')
+
+  with writer.OutputWriter(root) as output:
+    output.write_text(pathlib.Path('a', 'b.txt'), 'b')
+    output.write_json(pathlib.Path('c.json'), {'c': 1})
+
+  assert read_tree(root) == {'a/b.txt': 'b', 'c.json': '{\n  "c": 1\n}'}
+  assert set(output.written) == {'a/b.txt', 'c.json'}
+  assert not list(tmp_path.glob('.output.*'))
+
+
+def test_failed_write_keeps_the_old_output(tmp_path: pathlib.Path):
+  root = tmp_path / 'output'
+  root.mkdir()
+  (root / 'kept.txt').write_text('kept', 'utf8')
+
+  def fail() -> bytes:
+    raise ValueError('broken')
+
+  with pytest.raises(ValueError), writer.OutputWriter(root) as output:
+    output.submit(pathlib.Path('broken.txt'), fail)
+
+  assert read_tree(root) == {'kept.txt': 'kept'}
+  assert not list(tmp_path.glob('.output.*'))
+
+
+def test_files_and_directories_are_synced(
+  tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+  synced = list[int]()
+  fsync = os.fsync
+
+  def record(fd: int):
+    synced.append(fd)
+    fsync(fd)
+
+  monkeypatch.setattr(os, 'fsync', record)
+
+  with writer.OutputWriter(tmp_path / 'output') as output:
+    output.write_text(pathlib.Path('a', 'b.txt'), 'b')
+    output.write_text(pathlib.Path('c.txt'), 'c')
+
+  # Both files, the staging directory, a/ and the directory it was renamed in
+  assert len(synced) == 5
+
+
+def test_in_place_removals_wait_for_the_workers(tmp_path: pathlib.Path):
+  root = tmp_path / 'output'
+  (root / 'pages' / 'old').mkdir(parents=True)
+  (root / 'pages' / 'old' / 'page.json').write_text('old', 'utf8')
+  (root / 'kept.json').write_text('kept', 'utf8')
+
+  with writer.OutputWriter(root, in_place=True) as output:
+    output.remove(pathlib.Path('pages', 'old', 'page.json'))
+    # Written, then removed before a worker got to it
+    output.write_text(pathlib.Path('pages', 'new', 'gone.json'), 'gone')
+    output.remove(pathlib.Path('pages', 'new', 'gone.json'))
+    # Removed, then written again
+    output.remove(pathlib.Path('kept.json'))
+    output.write_text(pathlib.Path('kept.json'), 'new')
+
+  assert read_tree(root) == {'kept.json': 'new'}
+  assert set(output.written) == {'kept.json'}
+  assert output.removed == {'pages/old/page.json', 'pages/new/gone.json'}
+  assert not (root / 'pages').exists()